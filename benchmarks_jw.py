@@ -0,0 +1,303 @@
+"""
+Title: Benchmarks for the finger tapping and word learning tasks
+Author: Julia Wood, the University of Queensland, Australia
+Run from the script directory, e.g. python benchmarks_jw.py scoring
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import argparse
+import io
+import contextlib
+import random
+import time
+import numpy as np
+
+# Function to generate a synthetic tap stream: a typist who mostly types the target sequence, with occasional random errors
+def syntheticStream(targetSequence, n_taps, error_rate, rng):
+    targ = list(map(int, list(targetSequence)))
+    stream = []
+    pos = 0 # position within the target sequence the typist is currently typing
+    while len(stream) < n_taps:
+        if rng.random() < error_rate:
+            stream.append(rng.randint(1, 4)) # wrong (or accidentally right) key
+        else:
+            stream.append(targ[pos])
+        pos = (pos + 1) % len(targ)
+    return stream
+
+# Benchmark the vectorised batch scorer against the original patternDetect loop
+def benchScoring(args):
+    from tapping_analysis_jw import patternDetect, batchPatternDetect
+
+    rng = random.Random(args.seed)
+    streams = [syntheticStream(args.sequence, rng.randint(args.min_taps, args.max_taps), args.error_rate, rng) for s in range(args.n_streams)]
+    print('Scoring %i streams of %i-%i key presses with target sequence %s' % (args.n_streams, args.min_taps, args.max_taps, args.sequence))
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # patternDetect prints a warning for every stream with n_correct == 0
+        loop_res = [patternDetect(stream_in=s, targetSequence_in=args.sequence) for s in streams]
+    t_loop = time.perf_counter() - t0
+
+    t_batch = []
+    for r in range(args.repeats):
+        t0 = time.perf_counter()
+        batch_res = batchPatternDetect(streams, args.sequence)
+        t_batch.append(time.perf_counter() - t0)
+    t_batch = min(t_batch)
+
+    # check that the results are identical
+    for key in ['n_correct', 'errors', 'accuracy']:
+        expected = np.array([r[key] for r in loop_res])
+        if not np.array_equal(expected, batch_res[key], equal_nan=True):
+            raise SystemExit('Batch scorer does not match patternDetect for %s' % key)
+
+    print('patternDetect loop:   %.4f s (%.1f us per stream)' % (t_loop, 1e6 * t_loop / args.n_streams))
+    print('batchPatternDetect:   %.4f s (%.1f us per stream)' % (t_batch, 1e6 * t_batch / args.n_streams))
+    print('speedup: %.1fx, results identical' % (t_loop / t_batch))
+
+# Benchmark frame times while markers are toggled on every refresh: one visual.Circle per marker vs a single MarkerArray
+def benchMarkers(args):
+    from psychopy import visual, core
+    from task_components_jw import MarkerArray
+
+    win = visual.Window(size=(args.width, args.height), fullscr=args.fullscr, screen=0, allowGUI=False, monitor='testMonitor',
+                        color=(-1, -1, -1), colorSpace='rgb', units='pix')
+    win.setColor('#89ba00', colorSpace='hex')  # green background, as in the tapping trials
+    refresh = win.getActualFrameRate(nIdentical=20, nMaxFrames=240) or 60.0
+    print('Measured refresh rate: %.1f Hz' % refresh)
+
+    positions = [[i + 25, 0] for i in range(int(-args.width / 2), int(args.width / 2), int(args.width / 40))] # as in the task
+    circles = [visual.Circle(win, radius=15, edges=32, pos=p, fillColor='white') for p in positions]
+    markerArray = MarkerArray(win, positions, radius=15, color='white')
+
+    def setCircle(k, visible):
+        circles[k].setAutoDraw(visible)
+
+    def setArray(k, visible):
+        markerArray.setVisible(k, visible)
+
+    for name, setMarker, setup, cleanup in [
+            ('visual.Circle list', setCircle, lambda: None, lambda: [c.setAutoDraw(False) for c in circles]),
+            ('MarkerArray', setArray, lambda: markerArray.setAutoDraw(True), lambda: (markerArray.hideAll(), markerArray.setAutoDraw(False)))]:
+        setup()
+        for f in range(30):  # warm up
+            win.flip()
+        win.frameIntervals = []
+        win.recordFrameIntervals = True
+        update_times = []
+        k = 0
+        step = 1
+        for f in range(args.n_frames):  # toggle one marker on every refresh, sweeping back and forth as in the task
+            t0 = time.perf_counter()
+            setMarker(k, step == 1)
+            k += step
+            if k == len(positions) - 1 or k == 0:
+                step = -step
+            win.flip()
+            update_times.append(time.perf_counter() - t0)
+        win.recordFrameIntervals = False
+        cleanup()
+        win.flip()
+        intervals = np.array(win.frameIntervals[1:]) * 1000
+        dropped = np.sum(intervals > 1.5 * 1000 / refresh)
+        print('%-20s frame interval mean %.2f ms, 99th percentile %.2f ms, max %.2f ms; %i dropped frames of %i; update + flip mean %.2f ms'
+              % (name, intervals.mean(), np.percentile(intervals, 99), intervals.max(), dropped, len(intervals), 1000 * np.mean(update_times)))
+    win.close()
+    core.quit()
+
+# Report the start up cost of every import of the task scripts (which are imported before the first dialogue box, in the background, or after)
+def benchStartup(args):
+    from startup_jw import startupReport
+    for script in args.scripts:
+        startupReport(script, top=args.top)
+        print('')
+
+# Benchmark loading the word lists: parsing wordlists_audio.xlsx with openpyxl (as each task used to) vs the cached word bank
+def benchWordBank(args):
+    import os
+    import shutil
+    import tempfile
+    import openpyxl
+    from word_bank_jw import cachePath, loadWordBank, readWorkbook
+
+    # work on a copy of the workbook, so the benchmark does not touch the cache file used by the task
+    tmpDir = tempfile.mkdtemp(prefix='wordbank_bench_')
+    workbook = os.path.join(tmpDir, os.path.basename(args.workbook))
+    shutil.copy2(args.workbook, workbook)
+
+    def original():  # load the whole workbook and read one word list and its dummy word pairs (as wordLearning did)
+        book = openpyxl.load_workbook(workbook)
+        for sheet, n_items in [(0, 46), (3, 8)]:
+            [(row[0].value, row[1].value) for row in book.worksheets[sheet].iter_rows(max_row=n_items)]
+
+    def cold():  # cache missing: parse the workbook and save the cache
+        os.remove(cachePath(workbook))
+        loadWordBank(workbook)
+
+    def warm():  # cache up to date: load it
+        bank = loadWordBank(workbook)
+        assert bank.fromCache
+        bank.words(0, 46), bank.words(3, 8)
+
+    bank = loadWordBank(workbook)
+    if [bank.words(s) for s in range(len(bank))] != [readWorkbook(workbook).words(s) for s in range(len(bank))]:
+        raise SystemExit('Cached word bank does not match the workbook')
+    print('Loading the word lists of %s (%i worksheets), median of %i repeats:' % (args.workbook, len(bank), args.repeats))
+    for name, func in [('openpyxl.load_workbook', original), ('word bank, no cache', cold), ('word bank, cached', warm)]:
+        times = []
+        for r in range(args.repeats):
+            t0 = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - t0)
+        print('  %-24s %9.2f ms' % (name, 1000 * np.median(times)))
+    shutil.rmtree(tmpDir)
+
+# Benchmark drawing the word lists of a participant from a large synthetic word store (SQLite), with matched lists
+def benchWordStore(args):
+    import os
+    import shutil
+    import tempfile
+    from session_plan_jw import SHEETS, MATCHED_LISTS
+    from word_bank_jw import WordStore, participantSeed
+
+    rng = random.Random(args.seed)
+    tmpDir = tempfile.mkdtemp(prefix='wordstore_bench_')
+    store = WordStore(os.path.join(tmpDir, 'wordbank.sqlite'))
+    t0 = time.perf_counter()
+    store.addPairs('synthetic', [('CUE%i' % i, 'RECALL%i' % i, round(rng.lognormvariate(2, 1), 2), round(rng.uniform(1, 7), 2), round(rng.random(), 3))
+                                 for i in range(args.n_pairs)])
+    print('Word store of %i pairs built in %.2f s' % (args.n_pairs, time.perf_counter() - t0))
+
+    times = []
+    diffs = []
+    for participant in range(1, args.participants + 1):
+        t0 = time.perf_counter()
+        bank = store.sampleBank(SHEETS, participantSeed(participant), matched=MATCHED_LISTS)
+        times.append(time.perf_counter() - t0)
+        means = []
+        for name in MATCHED_LISTS:  # norms of the matched lists (looked up afterwards, not part of the timing)
+            cues = bank.words(name)[0]
+            rows = store.db.execute('SELECT frequency, concreteness, association FROM pairs WHERE cue IN (%s)' % ', '.join('?' * len(cues)), cues).fetchall()
+            means.append(np.mean(rows, axis=0))
+        diffs.append(np.abs(means[0] - means[1]))
+    store.close()
+    shutil.rmtree(tmpDir)
+    print('sampleBank: median %.1f ms, max %.1f ms per participant (%i participants)' % (1000 * np.median(times), 1000 * np.max(times), len(times)))
+    print('mean difference between the matched lists: frequency %.3f, concreteness %.3f, association %.3f' % tuple(np.mean(diffs, axis=0)))
+
+# Benchmark waiting for the mouse clicks of the recall task: the busy loop (getPressed, mic.poll and getKeys back to back, as wordRecall
+# did) vs ClickWaiter. A thread clicks the mouse after a random delay, and the CPU time used while waiting and the time from each click to
+# its detection are measured. With --display null the window is the null display of headless_harness_jw.py, in real time
+def benchClicks(args):
+    import threading
+    if args.display == 'null':
+        import headless_harness_jw as harness
+        harness.backend.clock = harness.HarnessClock(simulated=False)
+        harness.installNullDisplay()
+    from psychopy import visual, event
+    from task_components_jw import ClickWaiter
+
+    win = visual.Window(size=(800, 600), fullscr=False)
+    handle = win.winHandle
+    post = getattr(handle, 'post_event', handle.dispatch_event)  # the null display dispatches events posted by other threads itself
+    micBuffer, micSamples = np.zeros(960, dtype=np.float32), np.random.default_rng(args.seed).normal(size=960).astype(np.float32)
+    def poll():  # stands in for mic.poll(): copy 20ms of samples
+        micBuffer[:] = micSamples
+
+    def busyWait(mouse):
+        buttons = mouse.getPressed(getTime=False)
+        while buttons == [0,0,0]:
+            buttons = mouse.getPressed(getTime=False)
+            poll()
+            if buttons != [0,0,0]:
+                break
+            if event.getKeys(['end']):
+                break
+
+    waiter = ClickWaiter(win, maxLatency=args.max_latency)
+    rng = random.Random(args.seed)
+    print('%i clicks %.1f to %.1f s after each wait starts (%s display):' % (args.clicks, args.min_delay, args.max_delay, args.display))
+    for name in ['busy loop', 'ClickWaiter']:
+        mouse = event.Mouse(win=win)
+        waiting, clickTimes, latencies = threading.Event(), [], []
+        def clicker():
+            for k in range(args.clicks):
+                waiting.wait()
+                waiting.clear()
+                time.sleep(rng.uniform(args.min_delay, args.max_delay))
+                clickTimes.append(time.perf_counter())
+                post('on_mouse_press', 0, 0, 1, 0)
+                time.sleep(0.02)
+                post('on_mouse_release', 0, 0, 1, 0)
+        thread = threading.Thread(target=clicker, daemon=True)
+        thread.start()
+        wall = cpu = 0.0
+        for k in range(args.clicks):
+            t0, cpu0 = time.perf_counter(), time.process_time()
+            waiting.set()
+            if name == 'busy loop':
+                busyWait(mouse)
+            else:
+                waiter.wait(tasks=[(0.02, poll)])
+            detected = time.perf_counter()
+            wall += detected - t0
+            cpu += time.process_time() - cpu0
+            latencies.append(detected - clickTimes[k])
+            time.sleep(0.1)  # the blank screen after each cue word
+        thread.join()
+        latencies = 1000 * np.array(latencies)
+        print('  %-12s CPU while waiting %5.1f%%; click to detection median %.2f ms, 95th percentile %.2f ms, max %.2f ms'
+              % (name, 100 * cpu / wall, np.median(latencies), np.percentile(latencies, 95), latencies.max()))
+    print('  ClickWaiter: %s' % waiter.report())
+    win.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks for the finger tapping and word learning tasks')
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    p = sub.add_parser('scoring', help='batchPatternDetect vs the patternDetect loop')
+    p.add_argument('--n-streams', type=int, default=5000)
+    p.add_argument('--min-taps', type=int, default=20)
+    p.add_argument('--max-taps', type=int, default=120)
+    p.add_argument('--error-rate', type=float, default=0.05)
+    p.add_argument('--sequence', default='41324')
+    p.add_argument('--repeats', type=int, default=5)
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=benchScoring)
+
+    p = sub.add_parser('markers', help='frame times with visual.Circle markers vs MarkerArray (opens a window)')
+    p.add_argument('--n-frames', type=int, default=1200)
+    p.add_argument('--width', type=int, default=1920)
+    p.add_argument('--height', type=int, default=1080)
+    p.add_argument('--fullscr', action='store_true')
+    p.set_defaults(func=benchMarkers)
+
+    p = sub.add_parser('startup', help='start up cost of each import of the task scripts (-X importtime)')
+    p.add_argument('scripts', nargs='*', default=['finger_tapping_task_jw.py', 'word_learning_task_audio_jw.py'])
+    p.add_argument('--top', type=int, default=15, help='number of slowest modules to list')
+    p.set_defaults(func=benchStartup)
+
+    p = sub.add_parser('wordbank', help='loading the word lists: openpyxl vs the cached word bank')
+    p.add_argument('--workbook', default='wordlists_audio.xlsx')
+    p.add_argument('--repeats', type=int, default=20)
+    p.set_defaults(func=benchWordBank)
+
+    p = sub.add_parser('wordstore', help='drawing matched word lists from a large word store')
+    p.add_argument('--n-pairs', type=int, default=100000)
+    p.add_argument('--participants', type=int, default=20)
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=benchWordStore)
+
+    p = sub.add_parser('clicks', help='CPU use and click detection latency: busy loop vs ClickWaiter')
+    p.add_argument('--clicks', type=int, default=20)
+    p.add_argument('--min-delay', type=float, default=0.5, help='shortest time from the start of a wait to the click (seconds)')
+    p.add_argument('--max-delay', type=float, default=1.5, help='longest time from the start of a wait to the click (seconds)')
+    p.add_argument('--max-latency', type=float, default=0.005, help='ClickWaiter bound on the click detection latency (seconds)')
+    p.add_argument('--display', choices=['null', 'real'], default='null', help='null display (no window) or a real psychopy window')
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=benchClicks)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -6,53 +6,55 @@ Developed in Psychopy v2022.1.1
 See my GitHub for further details: https://github.com/jrwood21
 """
 import time
-import pandas as pd
-import numpy as np
 import sys
 import os
-from psychopy import visual, event, core, gui, data
-from pyglet.window import key
-from num2words import num2words
+from psychopy import core, gui
+from startup_jw import warmImports
+from session_plan_jw import compileTappingPlan, makeDirs, uniq_path # the counter-balancing schedule and output files of each session
+# only the modules needed for the dialogue boxes are imported before they are shown. The data modules are imported in the background
+# while the operator fills in the dialogue boxes, and the display and keyboard modules once the session details are known (see below)
+warmImports(['numpy', 'pandas', 'tapping_analysis_jw', 'task_io_jw', 'num2words'])
 
 os.chdir(os.path.abspath(''))  # change working directory to script directory
 globalClock = core.Clock()  # create timer to track the time since experiment started
 
-# define sequences for finger tapping task
-targ_seq_1 = '41324'
-targ_seq_2 = '42314'
-prac_seq = '12344'
-
 ### set up some useful functions ###
 # Function to save messages to a log file 
-def saveToLog(logString, timeStamp=1):
-    f = open(logFile, 'a')  # open our log file in append mode so don't overwrite with each new log
-    f.write(logString)  # write the string they typed
-    if timeStamp != 0:  # if timestamp has not been turned off
-        f.write('// logged at %iseconds' % globalClock.getTime())  # write a timestamp (very coarse)
-    f.write('\n')  # create new line
-    f.close()  # close and "save" the log file
+def saveToLog(logString, timeStamp=1, phase=None, trial=None):
+    taskLog.log(logString, timeStamp, phase, trial)  # written to the log file by a background thread, so the task never waits for the disk
 
 # An exit function to initiate if the 'end' key is pressed
 def quitExp():
-    if 'logFile' in globals():  # if a log file has been created
+    if 'trialWorker' in globals():  # finish saving the completed trials (the worker logs each trial it saves)
+        try:
+            trialWorker.close()
+        except Exception as e:  # a trial could not be saved: log it and carry on quitting
+            saveToLog('Problem saving trial data: %r' % e)
+    if 'journal' in globals():  # if a data journal has been created
+        journal.close()  # make sure all data collected so far is written to disk
+    if 'frameTimer' in globals() and frameTimer.enabled:  # if frame timing was recorded, save it
+        frameTimer.save(uniq_path(plan['paths']['frame_timing']))
+    if 'taskLog' in globals():  # if a log file has been created
         saveToLog('User aborted experiment')
         saveToLog('..........................................', 0)
+        taskLog.close()  # closed last, so everything logged so far (including by the trial worker) is written to the log file
     if 'win' in globals():  # if a window has been created
         win.close()  # close the window
     core.quit()  # quit the program
 
-# define function to check if filename exists, then create the next available version number
-def uniq_path(path):
-    fn, ext = os.path.splitext(path)
-    counter = 2
-    while os.path.exists(path):
-        path = fn + "_" + str(counter) + ext
-        counter += 1
-    return path
-
-# Finger tapping task function
-def fingerTapping(n_trials, tap_targetSequence, sequenceType):
+# Function called by the trial worker (in its own thread) once a trial has been saved. The message is logged with the
+# phase and trial it is about, as the next rest period has started by then
+def trialSaved(trial, seconds):
+    saveToLog('Trial %i complete: %i key presses, %s correct sequences. Saved during the rest period in %.3f seconds'
+              % (trial['trial'], len(trial['stream']), trial['n_correct'], seconds),
+              phase='tapping', trial=trial['trial'])
+
+# Finger tapping task function. Runs one block of the session plan (see compileTappingPlan in session_plan_jw.py)
+def fingerTapping(block):
+    tap_targetSequence = block['target_sequence']
+    sequenceType = block['sequence_type']
     ## Intro screen ##
+    taskLog.setPhase('introduction')  # phase recorded with each log message
     saveToLog('Presenting introduction screen') # save info to log
     win.setColor('#000000', colorSpace='hex')  # set background colour to black
     win.flip()  # display
@@ -64,160 +66,104 @@ def fingerTapping(n_trials, tap_targetSequence, sequenceType):
     event.clearEvents()  # clear the event buffer
 
     win.flip()  # blank the screen first
-    trials = range(1, n_trials + 1)
+    trials = block['trials']
+    scorer = OnlineScorer(tap_targetSequence)  # scores each key press as it arrives, so results are ready when the trial ends
+    taps = TapBuffer()  # stores each key press and its time. Allocated once here, so nothing is allocated while the participant is tapping
     saveToLog('Running finger tapping task. %i trials with target sequence %s' % (len(trials), tap_targetSequence))  # save info to log
 
-    for thisTrial in trials: # begin rest block
+    for trial in trials: # begin rest block
+        thisTrial = trial['trial']
+        taskLog.setPhase('rest', thisTrial)
         win.setColor('#ff0000', colorSpace='hex')  # set background colour to red
         win.flip()  # display
-        if thisTrial == 1:  # if this is first trial
-            restClock = core.CountdownTimer(10) # start timer counting down from 10
-        else:  # for all other trials
+        if thisTrial > 1:  # for all but the first trial
             saveToLog('Resting')  # save info to log
-            restClock = core.CountdownTimer(30)  # start timer counting down from 30
+        restClock = core.CountdownTimer(trial['rest_seconds'])  # start timer counting down (10 seconds before the first trial, 30 before the others)
         sequenceText.setText(tap_targetSequence)  # set up sequence text
         sequenceText.setAutoDraw(True)  # display sequence text continuously
-        timerText.setAutoDraw(True)  #  display timer text continuously
+        timerText.setAutoDraw(False)  # the countdown is shown by the countdown display instead
+        countdown.start(restClock.getTime())  # display countdown text continuously
         win.flip() 
+        frameTimer.startPhase('rest', thisTrial)  # record the timing of each refresh (if selected)
         while restClock.getTime() > 0:  # loop continues until trial timer ends
-            count = restClock.getTime()  # get current time from clock
-            timerText.setText(num2words(np.ceil(count)))  # set timer text to the current time
-            win.flip()  # display timer text
+            countdown.update(restClock.getTime())  # set countdown text to the current time (only changes once per second)
+            frameTimer.flip()  # display timer text
             if event.getKeys(['end']):  # checks for the key 'end' on every refresh so user can quit at any point
                 quitExp()  # initiate quit routine
+        frameTimer.endPhase()
+        countdown.stop()  # turn off the countdown text
+        saveToLog('Rest period: %s' % countdown.report())  # save info to log
+        waited = trialWorker.wait()  # make sure the previous trial has been saved before the next one starts
+        if waited > 0.001:  # only if the work was not finished during the rest period
+            saveToLog('Waited %.3f seconds for the previous trial to be saved' % waited)  # save info to log
+
 
         # begin tapping task
+        taskLog.setPhase('tapping', thisTrial)
         saveToLog('Trial: %i' % thisTrial) # save info to log
         win.setColor('#89ba00', colorSpace='hex')  # set background colour to green
         win.flip()  # display the green background
         tap_stream = []  # clear previous sequence keypresses from the stream 
+        scorer.reset()  # clear the scores from the previous trial
+        taps.reset()  # clear the key presses and times from the previous trial
         event.clearEvents()  # this makes sure the key buffer is cleared, otherwise old key presses might be recorded
-        trialClock = core.CountdownTimer(30)  # start timer counting down from 30
+        tapDispatcher.clearEvents()
+        trialClock = core.CountdownTimer(trial['tapping_seconds'])  # start timer counting down from 30
         timerText.setText('Tap as fast as you can!')  # set timer text to the current time
+        timerText.setAutoDraw(True)  # display timer text continuously
+        win.callOnFlip(kb.clock.reset)  # key press times are measured from the flip that shows the text
         win.flip()  # display the text
 
+        markers.setAutoDraw(True)  # draw the markers (all hidden to start with) on every refresh
         k = 0  # set up marker index
-        endTrial = False  # a trigger to end the trial when True (deployed when the timer runs out)
-        while endTrial == False:  # while trigger has not been deployed
-            # display incremental markers across the screen from left to right as the user presses accepted keys
-            if k == 0:  # start at beginning of marker index
-                # start markers incrementing from left to right and append key presses to tap_stream
-                while k < len(listOfMarkers) - 1 and endTrial == False:  # until the markers reach the far side of the screen
-                    if trialClock.getTime() <= 0:  # if timer has run out
-                        endTrial = True  # deploy the trigger to end the trial
-                        break  # and break out of this loop
-                    elif event.getKeys(['end']):  # if user presses end key
-                        if thisTrial == 1 and not metaData['practice mode']: # during trial 1: save partial data collected from trial 1
-                            quit_dict = {'stream': [tap_stream],
-                                         'trial': thisTrial}
-                            quit_df = pd.DataFrame(quit_dict, index=[0])
-                            fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_quitExp_trial1' + '.csv'
-                            if os.path.exists(fileName):
-                                fileName = uniq_path(fileName)
-                            quit_df.to_csv(fileName)
-                            saveToLog('User pressed end key during trial 1. Experiment aborted with %s seconds of trial 1 remaining' % trialClock.getTime())
-                            saveToLog('Trial 1 data saved with filename: %s' %fileName)
-                        elif thisTrial > 1 and not metaData['practice mode']: # or during a later trial: save partial and complete trial data collected
-                            quit_dict = {'stream': [tap_stream],
-                                         'trial': thisTrial}
-                            quit_df = pd.DataFrame(quit_dict, index=[0])
-                            fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_quitExp' + '.csv'
-                            if os.path.exists(fileName):
-                                fileName = uniq_path(fileName)
-                            quit_df.to_csv(fileName)
-                            saveToLog('User pressed end key during trial %s' % thisTrial)
-                            saveToLog('Experiment aborted with %s seconds of this trial remaining' % trialClock.getTime())
-                            saveToLog('Partial trial data saved with filename: %s' %fileName)
-                            fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_quitExp_trials' + '.csv'
-                            if os.path.exists(fileName):
-                                fileName = uniq_path(fileName)
-                            store_out.to_csv(fileName)
-                            saveToLog('Data from complete trials saved with filename: %s' %fileName)
-                        quitExp()  # AND quit the program
-                    elif event.getKeys('1'):  # checks for key on every refresh
-                        listOfMarkers[k].setAutoDraw(True)  # turn this marker on
-                        win.flip()  # display
-                        tap_stream.append(1)  # record the key press
-                        k += 1  # move on to the next marker
-                    elif event.getKeys('2'):  # checks for key on every refresh
-                        listOfMarkers[k].setAutoDraw(True)  # turn this marker on
-                        win.flip()  # display
-                        tap_stream.append(2)  # record the key press
-                        k += 1  # move on to the next marker
-                    elif event.getKeys('3'):  # checks for key on every refresh
-                        listOfMarkers[k].setAutoDraw(True)  # turn this marker on
-                        win.flip()  # display
-                        tap_stream.append(3)  # record the key press
-                        k += 1  # move on to the next marker
-                    elif event.getKeys('4'):  # checks for key on every refresh
-                        listOfMarkers[k].setAutoDraw(True)  # turn this marker on
-                        win.flip()  # display
-                        tap_stream.append(4)  # record the key press
-                        k += 1  # move on to the next marker
-
-            # start markers incrementing from right to left and append keypresses to tap_stream:
-            elif k == len(listOfMarkers) - 1 and endTrial == False:
-                while k > 0:
-                    if trialClock.getTime() <= 0:  # if timer has run out
-                        endTrial = True  # deploy the trigger to end the trial
-                        break  # and break out of this loop
-                    elif event.getKeys(['end']):   # if user presses end key
-                        if thisTrial == 1 and not metaData['practice mode']: # during trial 1: save partial data collected from trial 1
-                            quit_dict = {'stream': [tap_stream],
-                                         'trial': thisTrial}
-                            quit_df = pd.DataFrame(quit_dict, index=[0])
-                            fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_quitExp_trial1' + '.csv'
-                            if os.path.exists(fileName):
-                                fileName = uniq_path(fileName)
-                            quit_df.to_csv(fileName)
-                            saveToLog('User pressed end key during trial 1. Experiment aborted with %s seconds of trial 1 remaining' % trialClock.getTime())
-                            saveToLog('Trial 1 data saved with filename: %s' %fileName)
-                        elif thisTrial > 1 and not metaData['practice mode']: # or during a later trial: save partial and complete trial data collected
-                            quit_dict = {'stream': [tap_stream],
-                                         'trial': thisTrial}
-                            quit_df = pd.DataFrame(quit_dict, index=[0])
-                            fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_quitExp' + '.csv'
-                            if os.path.exists(fileName):
-                                fileName = uniq_path(fileName)
-                            quit_df.to_csv(fileName)
-                            saveToLog('User pressed end key during trial %s' % thisTrial)
-                            saveToLog('Experiment aborted with %s seconds of this trial remaining' % trialClock.getTime())
-                            saveToLog('Partial trial data saved with filename: %s' %fileName)
-                            fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_quitExp_trials' + '.csv'
-                            if os.path.exists(fileName):
-                                fileName = uniq_path(fileName)
-                            store_out.to_csv(fileName)
-                            saveToLog('Data from complete trials saved with filename: %s' %fileName)
-                        quitExp()  # AND quit the program
-                    elif event.getKeys('1'):  # checks for key on every refresh
-                        listOfMarkers[k].setAutoDraw(False)  # turn this marker off
-                        win.flip()  # display contents of video buffer
-                        tap_stream.append(1)  # record the key press
-                        k -= 1  # move on to the next marker
-                    elif event.getKeys('2'): #checks for key on every refresh
-                        listOfMarkers[k].setAutoDraw(False)  # turn this marker off
-                        win.flip()  # display contents of video buffer
-                        tap_stream.append(2)  # record the key press
-                        k -= 1  # move on to the next marker
-                    elif event.getKeys('3'): #checks for key on every refresh
-                        listOfMarkers[k].setAutoDraw(False)  # turn this marker off
-                        win.flip()  # display contents of video buffer
-                        tap_stream.append(3)  # record the key press
-                        k -= 1  # move on to the next marker
-                    elif event.getKeys('4'): #checks for key on every refresh
-                        listOfMarkers[k].setAutoDraw(False)  # turn this marker off
-                        win.flip()  # display contents of video buffer
-                        tap_stream.append(4)  # record the key press
-                        k -= 1  # move on to the next marker
+        markerStep = 1  # markers are turned on from left to right (1), then off from right to left (-1)
+        checkpointed = 0  # number of key presses saved to the journal so far
+        checkpointTimer = core.CountdownTimer(0.5)
+        frameTimer.startPhase('tapping', thisTrial, eventDriven=True)  # the screen is only flipped when there are new key presses
+        while trialClock.getTime() > 0:  # loop continues until trial timer ends
+            # collect ALL key presses since the last refresh, in the order they were pressed, so fast presses are never lost or re-ordered
+            presses = tapDispatcher.poll()
+            if not presses:
+                continue
+            for keyName, tapTime in presses:
+                if keyName == 'end':  # if user presses end key
+                    journal.append({'type': 'quit', 'sequence_type': sequenceType, 'trial': thisTrial, 'time_left': trialClock.getTime(), # key presses since the last checkpoint
+                                    'stream': tap_stream[checkpointed:], 'tap_times': taps.tapTimes(checkpointed).round(6).tolist()})
+                    saveToLog('User pressed end key during trial %s. Experiment aborted with %s seconds of this trial remaining' % (thisTrial, trialClock.getTime()))
+                    if not metaData['practice mode']:  # save complete and partial trial data collected so far
+                        journal.close()  # make sure everything is written to the journal file
+                        quitFileName = uniq_path(plan['paths']['quit'])
+                        compactJournal(journalFile, includePartial=True).to_csv(quitFileName)
+                        saveToLog('Complete and partial trial data saved with filename: %s' % quitFileName)
+                    quitExp()  # AND quit the program
+                tap = int(keyName)
+                tap_stream.append(tap)  # record the key press
+                scorer.addTap(tap)  # score the key press as it arrives
+                taps.add(tap, tapTime)  # record the time of the key press (from the keyboard event, not the screen refresh)
+                # display incremental markers across the screen from left to right, then remove them from right to left
+                markers.setVisible(k, markerStep == 1)  # turn this marker on (or off)
+                k += markerStep  # move on to the next marker
+                if k == len(markers) - 1 or k == 0:  # markers have reached the side of the screen, so change direction
+                    markerStep = -markerStep
+            frameTimer.flip()  # display all the new markers in a single refresh
+            tapDispatcher.frameShown(len(presses))  # keep count of how many key presses were shown in each refresh
+            if checkpointTimer.getTime() <= 0:  # save the new key presses to the journal every half second, in case the experiment crashes
+                journal.append({'type': 'taps', 'sequence_type': sequenceType, 'trial': thisTrial, 'stream': tap_stream[checkpointed:], 'tap_times': taps.tapTimes(checkpointed).round(6).tolist()})
+                checkpointed = len(tap_stream)
+                checkpointTimer.reset()
+        frameTimer.endPhase()
 
         # turn off all markers during the rest block
-        for marker in listOfMarkers:  # for each marker
-            marker.setAutoDraw(False)  # turn off
+        markers.hideAll()
+        markers.setAutoDraw(False)
 
         win.setColor('#ff0000', colorSpace='hex')  # set background colour to red
         win.flip()  # display red background
 
-        output = patternDetect(stream_in=tap_stream, targetSequence_in=tap_targetSequence)  # run the pattern detector to calculate correct sequences, errors and accuracy
+        saveToLog('Key presses: %s' % tapDispatcher.report())  # save info to log
+        output = scorer.score()  # get correct sequences, errors and accuracy (identical to running patternDetect on tap_stream)
+        if output['n_correct'] == 0:  # integrity check
+            print('Issue with this stream - n_correct is zero')
     
         #  gather all relevant data for this trial
         newRow = {'participant': metaData['participant'], 
@@ -227,104 +173,20 @@ def fingerTapping(n_trials, tap_targetSequence, sequenceType):
                   'target_sequence': tap_targetSequence,
                   'sequence_type': sequenceType,
                   'trial': thisTrial, # record which trial number
-                  'stream': [tap_stream], # stream of key presses entered by participant
-                  'n_correct': output['n_correct']}
-#                  'errors': output['errors'], # Unhash these lines if you want them to be reported in the csv output file.
-#                  'accuracy': output['accuracy']}
+                  'stream': tap_stream, # stream of key presses entered by participant
+                  'tap_times': taps.tapTimes().round(6).tolist()} # time of each key press (seconds from the start of the trial)
 
-        # store all trial data in df. Each trial is stored in a new row
-        if thisTrial == 1:
-            store_out = pd.DataFrame(newRow, index=[0])
-        elif thisTrial > 1:
-            store_out = store_out.append(newRow, ignore_index=True)
+        # store the trial and save it to the journal in the background while the rest screen is showing.
+        # The scores (n_correct) are added to the trial by the worker, see scoreColumns below
+        trialWorker.submit(newRow, output)
 
     # after all trials are complete:
+    trialWorker.wait()  # make sure the last trial has been saved
     sequenceText.setAutoDraw(False)  # turn off the sequence text
     timerText.setAutoDraw(False)  # turn off the timer text
     win.flip()  # clear the display
 
-    return store_out
-
-# Function for analysing the response stream
-def patternDetect(stream_in, targetSequence_in):
-    # pre-load some variables
-    det_targetSequence = list(map(int, list(targetSequence_in))) # convert target sequence to list of integers
-    det_stream = list(stream_in) # convert stream of key presses to a list
-    n_correct = float(0) # store for number of correct sequences per trial
-    '''
-    Define stores for error tracking. I did not use these metrics in my study design, but I have left them in the code, in case
-    they are appropriate for other experimental designs. Redefine, remove or ignore them as necessary for your study design.
-    '''
-    contiguousError = 0 # store for cumulative errors
-    errors = float(0) # store for errors
-    # note that n_correct + errors = total sequences
-
-    i = 0  # start pattern detection at first element of keypress stream:
-    while i < len(det_stream):  # search through every item in stream
-        # for all key presses up to the final 5 (or any other target sequence length)
-        if i <= len(det_stream) - len(det_targetSequence):
-            # for any value in the stream where it + the next 4 keypresses match the target sequence:
-            if det_stream[i:(i + len(det_targetSequence))] == det_targetSequence:
-                n_correct += 1  # record a correct pattern completed
-                i += len(det_targetSequence)  # adjust position to skip forward by length of targetSequence
-
-                # Then add any accumulated errors to the total error count and clear the contiguous error count
-                if contiguousError >= 1:  # check if there are contiguous errors we have not yet accounted for
-                    errors += 1 # add an error to the total count
-                    contiguousError = 0 # reset contiguous error count
-
-            # otherwise, if the next sequence length of items in the stream does not match the target sequence:
-            elif det_stream[i:(i + len(det_targetSequence))] != det_targetSequence:
-                contiguousError += 1  # record a 'contiguous error'
-                i += 1  # adjust index forward by 1
-
-                # when contiguous error count reaches 5 incorrect keypresses in a row (i.e., the correct sequence doesn't follow 5 keypresses in a row) 
-                # OR if the final item of the stream does not match the target sequence:
-                if contiguousError == 5 or i == len(det_stream):
-                    errors += 1 # add an error to the total count
-                    contiguousError = 0 # reset contiguous error count
-
-        # now deal with last items of the stream (a special case, see 'method' above)
-        else:
-            # get last items
-            lastItems = det_stream[i:]
-            # get subset of target sequence of same length as last items
-            sequenceSubset = det_targetSequence[:len(lastItems)]
-
-            # Addition of PARTIAL correct sequences at end of stream:
-            while lastItems != None:  # while there are additional items left to check
-                if lastItems == sequenceSubset:  # if lastItems match target sequence subset
-                    n_correct += float(len(lastItems)) / float(len(det_targetSequence))  # record fractional sequence
-
-                    if contiguousError >= 1:  # check if there are errors we have not yet recorded
-                        errors += 1  # add an error to total
-                        contiguousError = 0  # reset contiguous error count
-                    lastItems = None  # force failure of inner while loop by updating lastItems
-                    i = len(det_stream)  # force failure of outer while loop by updating i
-                else:  # if lastItems do not match target sequence
-                    contiguousError += 1  # add 1 to contiguous error count
-
-                    # when contiguous error count reaches 5 incorrect keypresses in a row or if this is final item
-                    if contiguousError == 5 or len(lastItems) == 1:
-                        errors += 1  # add an error to total
-                        contiguousError = 0  # reset contiguous error count
-                    if len(lastItems) == 1:  # if this is the final item
-                        lastItems = None  # force failure of inner while loop by updating lastItems
-                        i = len(det_stream)  # force failure of outer while loop by updating i
-                    else:  # else if there are still items left to check
-                        lastItems = lastItems[1:]  # drop the first item from lastItems
-                        sequenceSubset = sequenceSubset[:-1]  # drop the last item from the sequence subset
-
-    # integrity check
-    if n_correct == 0:
-        print('Issue with this stream - n_correct is zero')
-        accuracy = float('nan')
-    else:
-        accuracy = 1 - errors / n_correct  # calculate accuracy 
-        # NOTE: this accuracy definition matches Hardwicke et al. 2016. I did not use this metric in my study design, but I have
-        # left the code in the script case it is suitable for other study designs. Remove, redefine or ignore as necessary.
-        
-    return {'n_correct': n_correct, 'errors': errors, 'accuracy': accuracy}
+    return trialWorker.frame()  # all trial data, one row per trial
 
 ### Collect and store meta-data about the experiment session ###
 expName = 'Explicit finger tapping sequence task'  # define experiment name
@@ -334,23 +196,18 @@ metaData = {'participant': '',
             'session time': ['pm-a', 'pm-b', 'am'],
             'practice mode': False,
             'use automated counter-balancing': True,
+            'save binary stream file': False,
+            'record frame timing': False,
             'researcher': 'JW',
             'location': '304, Seddon North, UQ, Brisbane'}  # set up info for infoBox gui
 infoBox = gui.DlgFromDict(dictionary=metaData,
                           title=expName,
                           order=['participant', 'session number', 'session time',
-                                 'practice mode','use automated counter-balancing'])  # display gui to get info from user
+                                 'practice mode','use automated counter-balancing', 'save binary stream file', 'record frame timing'])  # display gui to get info from user
 if not infoBox.OK:  # if user hit cancel
     quitExp()  # quit
 
-# check if participant dir exists, and if not, create one:
-if not os.path.isdir('data'):
-    os.mkdir('data')
-if not os.path.isdir('data' + os.path.sep + 'fingertapping'):
-    os.mkdir('data' + os.path.sep + 'fingertapping')
-p_dir = 'data' + os.path.sep + 'fingertapping' + os.path.sep + 'P' + str(metaData['participant'])
-if not os.path.isdir(p_dir):
-    os.mkdir(p_dir)
+from task_io_jw import TrialJournal, TrialWorker, TaskLog, compactJournal, saveStreams
 
 if not metaData['practice mode']:  # if this is not practice mode:
     if metaData['use automated counter-balancing']:  # and user has chosen to use automated counter-balancing:
@@ -361,6 +218,7 @@ if not metaData['practice mode']:  # if this is not practice mode:
         metaData.update({'participant allocation': cb['participant allocation']})
         if not infoBox.OK:  # if user hit cancel
             quitExp()  # quit
+        planOptions = {}  # the sequence and number of trials come from the counter-balancing schedule
     
     elif not metaData['use automated counter-balancing']: # or if user has chosen to manually select sequence type:
         seq_dict = {'use sequence': ['sequence_1', 'sequence_2'],
@@ -372,86 +230,59 @@ if not metaData['practice mode']:  # if this is not practice mode:
                          'number of trials': '%s' % seq_dict['number of trials']})
         if not infoBox.OK:  # if user hit cancel
             quitExp()  # quit
-    
-    # build filename for this participant's data
-    fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '.csv'
-
-    # is this an existing participant? If so we will create a new file name to store the data under
-    if os.path.exists(fileName):  # if they are an existing participant
-        # confirm that user knows sessions already exist for this participant's current session and time and advise filename will be different:
-        myDlg = gui.Dlg()
-        myDlg.addText(
-            "This participant has existing files for this session time in the directory! Click ok to continue or cancel to abort. \n\n NOTE: if you choose to continue, files will be stored under a different file name.")
-        myDlg.show()  # show dialog and wait for OK or Cancel
-        if not myDlg.OK:  # if the user pressed cancel
-            quitExp()
-        
-        # redefine file name by iteratively appending a number so that existing files are not overwritten
-        fileName = uniq_path(fileName)
-
-    metaData.update({'expName': expName, 'date': date})  # record the experiment date and name in the metaData
-    
-    # check if logfile exists for this participant. If not, create one:
-    logFile = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) +'_log.txt'
-    if not os.path.exists(logFile):
-        with open(logFile, 'w') as fp:
-            pass
-
-    # save metaData to log
-    saveToLog('..........................................', 0)
-    saveToLog('experiment: %s' % (metaData['expName']), 0)
-    saveToLog('researcher: %s' % (metaData['researcher']), 0)
-    saveToLog('location: %s' % (metaData['location']), 0)
-    saveToLog('date: %s' % (metaData['date']), 0)
-    saveToLog('participant: %s' % (metaData['participant']), 0)
-    saveToLog('session: %s' % (metaData['session number']), 0)
-    saveToLog('session time: %s' % (metaData['session time']), 0)
-    saveToLog('participant allocation: %s' % (metaData['participant allocation']), 0)
-    saveToLog('                                            ', 0)
+        planOptions = {'sequenceType': seq_dict['use sequence'], 'nTrials': seq_dict['number of trials']}
 
 else:  # otherwise, if it is practice mode:
-    logFile = p_dir + os.path.sep + 'P' + str(metaData['participant']) + '_practice_log.txt'
-    if not os.path.exists(logFile):
-        with open(logFile, 'w') as fp:
-            pass
-    
     # ask user to define number of trials
     prac_dict = {'number of trials': ''}
     infoBox = gui.DlgFromDict(dictionary=prac_dict,
                               title='enter number of trials')  # display gui to get info from user
     if not infoBox.OK:  # if user hit cancel
         quitExp()  # quit
-
-    # build filename for this participant's practice data
-    fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_PRACTICE' + '.csv'
-    # is this an existing participant? If so we will create a new file name to store the data under
-    if os.path.exists(fileName):  # if existing participant
-        # check user knows sessions already exist for this participant's current session and time:
-        myDlg = gui.Dlg()
-        myDlg.addText(
-            "This participant has existing files for this session time in the directory! Click ok to continue or cancel to abort. \n\n NOTE: if you choose to continue, files will be stored under a different file name.")
-        myDlg.show()  # show dialog and wait for OK or Cancel
-        if not myDlg.OK:  # if the user pressed cancel
-            quitExp()
-        
-        # redefine file name by iteratively appending a number so that the original files are not overwritten
-        fileName = uniq_path(fileName)
-    
     metaData.update({'participant allocation': 'practice'})
+    planOptions = {'nTrials': prac_dict['number of trials']}
+
+# work out the whole session (sequence, trials and output files) before the window opens, so nothing is looked up during the task
+plan = compileTappingPlan(metaData, **planOptions)
+makeDirs(plan)  # check if participant dir exists, and if not, create one
+
+# is this an existing participant? If so we will create a new file name to store the data under
+if os.path.exists(plan['paths']['data']):  # if they are an existing participant
+    # confirm that user knows sessions already exist for this participant's current session and time and advise filename will be different:
+    myDlg = gui.Dlg()
+    myDlg.addText(
+        "This participant has existing files for this session time in the directory! Click ok to continue or cancel to abort. \n\n NOTE: if you choose to continue, files will be stored under a different file name.")
+    myDlg.show()  # show dialog and wait for OK or Cancel
+    if not myDlg.OK:  # if the user pressed cancel
+        quitExp()
     
-    # save metaData to log
-    saveToLog('..........................................', 0)
-    saveToLog('experiment: %s' % (expName), 0)
-    saveToLog('researcher: %s' % (metaData['researcher']), 0)
-    saveToLog('location: %s' % (metaData['location']), 0)
-    saveToLog('date: %s' % (date), 0)
-    saveToLog('participant: %s' % (metaData['participant']), 0)
-    saveToLog('session: %s' % (metaData['session number']), 0)
-    saveToLog('session time: %s' % (metaData['session time']), 0)
-    saveToLog('participant allocation: %s' % (metaData['participant allocation']), 0)
-    saveToLog('                                            ', 0)
+    # redefine file name by iteratively appending a number so that existing files are not overwritten
+    plan = compileTappingPlan(metaData, dataFile=uniq_path(plan['paths']['data']), **planOptions)
+fileName = plan['paths']['data']
+
+metaData.update({'expName': expName, 'date': date})  # record the experiment date and name in the metaData
+
+# check if logfile exists for this participant. If not, create one:
+taskLog = TaskLog(plan['paths']['log'], globalClock)  # open the log file (created if it does not exist)
+
+# save metaData to log
+saveToLog('..........................................', 0)
+saveToLog('experiment: %s' % (metaData['expName']), 0)
+saveToLog('researcher: %s' % (metaData['researcher']), 0)
+saveToLog('location: %s' % (metaData['location']), 0)
+saveToLog('date: %s' % (metaData['date']), 0)
+saveToLog('participant: %s' % (metaData['participant']), 0)
+saveToLog('session: %s' % (metaData['session number']), 0)
+saveToLog('session time: %s' % (metaData['session time']), 0)
+saveToLog('participant allocation: %s' % (metaData['participant allocation']), 0)
+saveToLog('                                            ', 0)
 
 ### Prepare stimuli etc ###
+from psychopy import visual, event, data
+from psychopy.hardware import keyboard
+from tapping_analysis_jw import OnlineScorer, TapBuffer # scoring functions are kept in a separate file so they can be reused for offline analysis
+from task_components_jw import KeyDispatcher, MarkerArray, CountdownDisplay, FrameTimer
+
 win = visual.Window(size=(1920, 1080), fullscr=True, screen=0, allowGUI=False, allowStencil=False, ## UPDATE SIZE TO MATCH YOUR CURRENT MONITOR SETTINGS
                     monitor='testMonitor', color=(-1,-1,-1), colorSpace='rgb', units='pix') # setup the Window
 generalText = visual.TextStim(win=win, ori=0, name='generalText', text='', font=u'Arial', pos=[0, 0], height=35,
@@ -460,67 +291,45 @@ sequenceText = visual.TextStim(win=win, ori=0, name='sequenceText', text='', fon
                                wrapWidth=None, color=(1,1,1), colorSpace='rgb', opacity=1, depth=0.0)  # sequence text
 timerText = visual.TextStim(win=win, ori=0, name='sequenceText', text='', font=u'Arial', pos=[0, -130], height=40,
                             wrapWidth=800, color=(1,1,1), colorSpace='rgb', opacity=1, depth=0.0)  # timer text
+countdown = CountdownDisplay(win, seconds=30, ori=0, name='countdownText', font=u'Arial', pos=[0, -130], height=40,
+                             wrapWidth=800, color=(1,1,1), colorSpace='rgb', opacity=1, depth=0.0)  # countdown timer text ('thirty' to 'one')
 
 # set up the markers that increment across the screen - generate enough so that they cover the full range of the window
-listOfMarkers = []  # store for white markers
+markerPositions = []  # store for marker positions
 windowSize = list(win.size) # get window size
 for i in range(int(-windowSize[0] / 2), int(windowSize[0] / 2), int(windowSize[0] / 40)):  # generate markers to cover whole screen
     i += 25  # add a slight horizontal adjustment to ensure markers do not go off screen
-    listOfMarkers.append(visual.Circle(win, radius=15, edges=32, pos=[i, 0], fillColor='white'))  # generate the markers
+    markerPositions.append([i, 0])
+markers = MarkerArray(win, markerPositions, radius=15, color='white')  # white markers, all drawn together as one stimulus
+
+# psychtoolbox keyboard, which timestamps each key press when it happens rather than when the screen is next refreshed
+kb = keyboard.Keyboard()
+
+# for monitoring key state and collecting all key presses in order (only need this if using markers)
+tapDispatcher = KeyDispatcher(win, kb, keyList=['end', '1', '2', '3', '4'])
 
-# for monitoring key state (only need this if using markers)
-keys = key.KeyStateHandler()
-win.winHandle.push_handlers(keys)
+# records the time of every refresh during the rest periods and trials, if selected in the first dialogue box
+frameTimer = FrameTimer(win, enabled=metaData['record frame timing'])
+
+# all data is saved to a journal file as it is collected, so that nothing is lost if the experiment is quit or crashes
+journalFile = uniq_path(plan['paths']['journal'])
+journal = TrialJournal(journalFile)
+journal.append(dict(metaData, type='session'))
+# stores and saves each trial in a background thread during the following rest period, so the task itself only has to score the key presses and draw the screen.
+# Add 'errors' and 'accuracy' to scoreColumns if you want them to be reported in the csv output file
+trialWorker = TrialWorker(journal, scoreColumns=['n_correct'], onDone=trialSaved)
 
 saveToLog('Set up complete') # save info to log
 ### set-up complete ###
 
 
 ### run the experiment ###
-if metaData['practice mode']:  # if user has chosen practice mode
-    res = fingerTapping(n_trials=int(prac_dict['number of trials']), tap_targetSequence = prac_seq, sequenceType ='practice')  # run practice sequence
-
-elif not metaData['practice mode']: # if it is not practice mode
-    if not metaData['use automated counter-balancing']: # AND the user has chosen to manually select the sequence type:
-        if seq_dict['use sequence'] == 'sequence_1': # EITHER run task with sequence 1:
-            res = fingerTapping(n_trials=int(seq_dict['number of trials']), tap_targetSequence = targ_seq_1, sequenceType = 'sequence_1')
-        elif seq_dict['use sequence'] == 'sequence_2': # OR run task with sequence 2:
-            res = fingerTapping(n_trials=int(seq_dict['number of trials']), tap_targetSequence = targ_seq_2, sequenceType = 'sequence_2') 
-
-    elif metaData['use automated counter-balancing']: # OR if user has selected to use automated counter balancing:
-        # NOTE: these allocations are specific to my study (each letter represents one type of grouping/randomisation variable). Adapt groupings to suit individual experiments
-        ####### X ORDER 
-        if ((metaData['participant allocation'] == 'AJX') or (metaData['participant allocation'] == 'BJX') or (metaData['participant allocation'] == 'AKX') or (metaData['participant allocation'] == 'BKX')):
-            # session 1
-            if int(metaData['session number']) == 1:
-                if metaData['session time'] == 'pm-a':
-                    res = fingerTapping(n_trials = 12, tap_targetSequence = targ_seq_1, sequenceType='sequence_1')  # sequence 1 
-                elif metaData['session time'] == 'pm-b' or 'am':
-                    res = fingerTapping(n_trials = 4, tap_targetSequence = targ_seq_1, sequenceType='sequence_1') # wordlist 1 
-            # session 2
-            elif int(metaData['session number']) == 2:
-                if metaData['session time'] == 'pm-a':
-                    res = fingerTapping(n_trials = 12, tap_targetSequence = targ_seq_2, sequenceType='sequence_2')  # sequence 2 
-                elif metaData['session time'] == 'pm-b' or 'am':
-                    res = fingerTapping(n_trials = 4, tap_targetSequence = targ_seq_2, sequenceType='sequence_2')  # sequence 2 
-
-        ####### Y ORDER
-        elif ((metaData['participant allocation'] == 'AJY') or (metaData['participant allocation'] == 'BJY') or (metaData['participant allocation'] == 'AKY') or (metaData['participant allocation'] == 'BKY')):
-            # session 1
-            if int(metaData['session number']) == 1:
-                if metaData['session time'] == 'pm-a':
-                    res = fingerTapping(n_trials = 12, tap_targetSequence = targ_seq_2, sequenceType='sequence_2')  # sequence 2 
-                elif metaData['session time'] == 'pm-b' or 'am':
-                    res = fingerTapping(n_trials = 4, tap_targetSequence = targ_seq_2, sequenceType='sequence_2')  # sequence 2 
-            # session 2
-            elif int(metaData['session number']) == 2:
-                if metaData['session time'] == 'pm-a':
-                    res = fingerTapping(n_trials = 12, tap_targetSequence = targ_seq_1, sequenceType='sequence_1')  # sequence 1 
-                elif metaData['session time'] == 'pm-b' or 'am':
-                    res = fingerTapping(n_trials = 4, tap_targetSequence= targ_seq_1, sequenceType='sequence_1')  # sequence 1 
+for block in plan['blocks']:  # the blocks, sequences and number of trials of this session were worked out by compileTappingPlan
+    res = fingerTapping(block)
 
 
 ## End screen ##
+taskLog.setPhase('end')
 saveToLog('Presenting end screen')  # save info to log
 win.setColor('#000000', colorSpace='hex')  # set background colour to black
 win.flip()
@@ -536,6 +345,9 @@ saveToLog('Experiment presentation over')  # save info to log
 
 ### Save and clean up ###
 win.close()
+trialWorker.close()  # stop the trial worker (every trial was saved at the end of its block)
+journal.close()  # make sure all trial data is written to the journal file
+res = compactJournal(journalFile)  # build the final data (one row per complete trial) from the journal
 
 '''
 Save the data as a csv file. The loop below also checks if saving is not possible, usually because the file is already open, and asks user to close if this is the case
@@ -553,7 +365,7 @@ while True:
                 "Unable to store data. Try closing open excel files and then click ok. Press cancel to attempt data storage to new file.")
         myDlg.show()  # show dialog and wait for OK or Cancel
         if not myDlg.OK:  # if the user pressed cancel
-            fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_ProblemSaving_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '.csv'
+            fileName = plan['paths']['problem']
             saveToLog('Attempting to save data with different filename: %s' %fileName) # save info to log
             try:
                 res.to_csv(fileName)
@@ -564,9 +376,20 @@ while True:
                 saveToLog('Major error: Data could not be saved') # save info to log
                 quitExp() # quit the experiment
 
+if metaData['save binary stream file']:  # also save the streams in a compact binary file (see saveStreams in task_io_jw.py)
+    streamFileName = uniq_path(plan['paths']['streams'])
+    saveStreams(streamFileName, res, metaData)
+    saveToLog('Streams saved in binary format with file name: %s' % streamFileName) # save info to log
+
+if frameTimer.enabled:  # save the frame timing summary (one row for the rest period and the tapping of each trial)
+    timingFileName = uniq_path(plan['paths']['frame_timing'])
+    frameTimer.save(timingFileName)
+    saveToLog('Frame timing saved with file name: %s' % timingFileName) # save info to log
+
 t = globalClock.getTime() # get run time of experiment
 saveToLog('Total experiment runtime was %i seconds' % t) # record runtime to log
 saveToLog('..........................................', 0)
+taskLog.close()  # make sure everything is written to the log file
 
 # Shut down:
 core.quit()
@@ -0,0 +1,580 @@
+"""
+Title: Headless harness for the finger tapping task
+Author: Julia Wood, the University of Queensland, Australia
+Runs finger_tapping_task_jw.py end to end without a participant. A synthetic typist reads the target sequence from the screen and
+types it from the moment the screen turns green until it turns red, at a chosen rate and with a chosen probability of errors.
+The dialogue boxes are answered automatically and the data is saved to a temporary folder.
+With --display null (the default) there is no window at all: psychopy and pyglet are replaced by a null backend with a simulated
+clock. Time only moves on when the task does something (runs its own code, waits for a refresh, or waits for a key press), so each
+30 second trial takes well under a second, while the time spent in the task's own code is still counted.
+With --display real, a real psychopy window is used (e.g. on a machine with no monitor: xvfb-run -a python headless_harness_jw.py
+--display real) and only the keyboard and dialogue boxes are simulated. The task then runs in real time.
+For every tap rate, it reports the tapping loop iterations per second (of real time), the latency from each key press to the task
+collecting it and to the refresh that showed it, key presses that were dropped or re-ordered in the saved data, and whether the
+saved n_correct matches patternDetect on the key presses that were actually typed.
+Usage: python headless_harness_jw.py [--rates 2 4 8 16 32 64] [--error-rate 0.05] [--trials 1] [--mode practice] [--display null]
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import queue
+import runpy
+import sys
+import tempfile
+import time
+import types
+import weakref
+import numpy as np
+import pandas as pd
+
+TASK_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'finger_tapping_task_jw.py')
+RED = '#ff0000' # background colour of the rest periods (the typist stops tapping)
+
+# Class for the time source of the harness
+class HarnessClock:
+    '''
+    In simulated mode, time moves on by the real time spent running code, plus any waiting the task asks for: a refresh waits until the
+    next simulated vertical blank, and a keyboard check that finds no key presses skips ahead to the next key press or to the moment a
+    countdown timer runs out, instead of spinning. Otherwise it is just the real time (time.perf_counter, as used by psychopy).
+    '''
+    def __init__(self, simulated=True, frameRate=60.0):
+        self.simulated = simulated
+        self.framePeriod = 1.0 / frameRate
+        self.t = 0.0
+        self.lastReal = time.perf_counter()
+        self.timers = weakref.WeakSet() # countdown timers, so that an idle wait can skip to when one runs out
+
+    def now(self):
+        real = time.perf_counter()
+        if not self.simulated:
+            return real
+        self.t += real - self.lastReal  # time spent running code since the last check
+        self.lastReal = real
+        return self.t
+
+    # wait until time t
+    def waitUntil(self, t):
+        now = self.now()
+        if t <= now:
+            return
+        if self.simulated:
+            self.t = t
+        else:
+            time.sleep(t - now)
+
+    # time of the next vertical blank
+    def nextFlip(self):
+        return (np.floor(self.now() / self.framePeriod) + 1) * self.framePeriod
+
+    # time the next countdown timer runs out (inf if none)
+    def nextTimerEnd(self):
+        now = self.now()
+        ends = [timer._end for timer in list(self.timers) if timer._end > now]
+        return min(ends, default=np.inf)
+
+# Class for the synthetic participant
+class SyntheticTypist:
+    '''
+    Types the target sequence over and over, starting reactionTime seconds after start(). The intervals between key presses follow a
+    gamma distribution with a mean of 1 / rate seconds and a coefficient of variation of jitter. Each key press is a wrong key
+    (chosen at random from the other keys 1-4) with probability errorRate.
+    '''
+    def __init__(self, rate, errorRate=0.05, jitter=0.25, reactionTime=0.25, seed=0):
+        self.rate = rate
+        self.errorRate = errorRate
+        self.shape = 1.0 / jitter ** 2
+        self.scale = 1.0 / (rate * self.shape)
+        self.reactionTime = reactionTime
+        self.rng = np.random.default_rng(seed)
+        self.nextTime = np.inf # time of the next key press (inf when not tapping)
+
+    def start(self, t0, sequence):
+        self.sequence = [int(c) for c in sequence]
+        self.pos = 0
+        self.nextTime = t0 + self.reactionTime
+
+    def stop(self):
+        self.nextTime = np.inf
+
+    # all key presses up to time t, as a list of (time, key name)
+    def pressesUntil(self, t):
+        presses = []
+        while self.nextTime <= t:
+            key = self.sequence[self.pos % len(self.sequence)]
+            if self.rng.random() < self.errorRate:
+                key = int(self.rng.choice([k for k in (1, 2, 3, 4) if k != key]))
+            presses.append((self.nextTime, str(key)))
+            self.pos += 1
+            self.nextTime += self.rng.gamma(self.shape, self.scale)
+        return presses
+
+# Class connecting the task, the simulated keyboard and the typist, and recording what happens to every key press
+class HarnessBackend:
+    def __init__(self, clock):
+        self.clock = clock
+        self.answers = {}
+        self.newRun(None)
+
+    def newRun(self, typist, answers=None):
+        self.typist = typist
+        self.answers = answers or {}
+        self.sequence = None # the target sequence shown on the screen
+        self.buffer = [] # key presses waiting to be collected by the keyboard
+        self.undispatched = [] # key presses not yet sent to the window as pyglet events
+        self.shown = [] # key presses collected since the last refresh
+        self.trials = []
+        self.trial = None
+        self.kbClock = None
+
+    # called when a stimulus text is set: the typist reads the target sequence (the only text made of digits) from the screen
+    def textSet(self, stim, text):
+        if str(text).isdigit():
+            self.sequence = str(text)
+
+    # called when the window colour is set: the typist stops tapping when the screen turns red
+    def colorSet(self, color):
+        if str(color).lower() == RED and self.trial is not None:
+            self.typist.stop()
+            self.trial = None
+
+    # called when the keyboard clock is reset at the start of a trial (on the flip that shows 'Tap as fast as you can!')
+    def trialStarted(self, kbClock):
+        self.kbClock = kbClock
+        self.trial = {'t0': kbClock._start, 'sequence': self.sequence, 'pressed': [], 'collected': [], 'shown': [],
+                      'n_polls': 0, 'last_poll': None, 'real_start': time.perf_counter(), 'real_end': None}
+        self.trials.append(self.trial)
+        self.typist.start(self.clock.now(), self.sequence)
+
+    def _type(self, t):
+        if self.trial is None:
+            return
+        presses = self.typist.pressesUntil(t)
+        self.trial['pressed'].extend(presses)
+        self.buffer.extend(presses)
+        self.undispatched.extend(presses)
+
+    # keyboard check: all key presses since the last check, in the order they were pressed
+    def pollKeys(self, keyList=None):
+        now = self.clock.now()
+        self._type(now)
+        if not self.buffer and self.clock.simulated:  # nothing pressed yet: skip ahead instead of spinning
+            self.clock.waitUntil(min(self.typist.nextTime if self.trial else np.inf, self.clock.nextTimerEnd(), now + self.clock.framePeriod))
+            now = self.clock.now()
+            self._type(now)
+        presses = [p for p in self.buffer if keyList is None or p[1] in keyList]
+        self.buffer = []
+        if self.trial is not None:
+            self.trial['n_polls'] += 1
+            self.trial['last_poll'] = now
+            self.trial['real_end'] = time.perf_counter()
+            self.trial['collected'].extend((t, name, now) for t, name in presses)
+            self.shown.extend(presses)
+        return presses
+
+    def clearKeys(self):
+        self.buffer = []
+
+    # called after every refresh of the window
+    def flipped(self, win):
+        t = self.clock.now()
+        self._type(t)
+        if self.trial is not None:
+            self.trial['shown'].extend((p[0], t) for p in self.shown)
+        self.shown = []
+        handle = getattr(win, 'winHandle', None)
+        for pressTime, name in self.undispatched:  # key presses reach the window as pyglet events when it processes its events
+            if handle is not None:
+                symbol = ord(name) if name.isdigit() else name
+                handle.dispatch_event('on_key_press', symbol, 0)
+                handle.dispatch_event('on_key_release', symbol, 0)
+        self.undispatched = []
+
+backend = HarnessBackend(HarnessClock())
+
+### simulated keyboard and dialogue boxes (used with both displays) ###
+class KeyPress:
+    def __init__(self, name, rt, tDown):
+        self.name = name
+        self.rt = rt
+        self.tDown = tDown
+        self.duration = None
+
+class TrialClock:
+    '''Clock of the simulated keyboard. Resetting it starts a trial (the task resets it on the flip that shows the green screen)'''
+    def __init__(self):
+        self._start = backend.clock.now()
+
+    def getTime(self):
+        return backend.clock.now() - self._start
+
+    def reset(self, newT=0.0):
+        self._start = backend.clock.now() + newT
+        backend.trialStarted(self)
+
+class Keyboard:
+    def __init__(self, device=-1, bufferSize=10000, waitForStart=False, **kwargs):
+        self.clock = TrialClock()
+
+    def getKeys(self, keyList=None, waitRelease=True, clear=True):
+        return [KeyPress(name, t - self.clock._start, t) for t, name in backend.pollKeys(keyList)]
+
+    def clearEvents(self, eventType=None):
+        backend.clearKeys()
+
+class Dlg:
+    def __init__(self, title='', **kwargs):
+        self.OK = True
+        self.data = []
+
+    def addText(self, text, **kwargs):
+        pass
+
+    def addField(self, label, initial='', **kwargs):
+        self.data.append(backend.answers.get(label, initial[0] if isinstance(initial, list) else initial))
+
+    def show(self):
+        return self.data
+
+class DlgFromDict:
+    '''Fills in the dictionary with the harness answers (or the first choice of each list), as if OK was pressed'''
+    def __init__(self, dictionary, title='', order=(), **kwargs):
+        for key, value in dictionary.items():
+            if key in backend.answers:
+                dictionary[key] = backend.answers[key]
+            elif isinstance(value, list):
+                dictionary[key] = value[0]
+        self.OK = True
+
+def _eventGetKeys(keyList=None, timeStamped=False, **kwargs):
+    return [] # the typist never presses the end key
+
+def _eventWaitKeys(maxWait=float('inf'), keyList=None, **kwargs):
+    backend.clock.waitUntil(backend.clock.now() + 1.0) # the researcher / participant presses the key after a second
+    return [keyList[0]] if keyList else ['space']
+
+def _eventClearEvents(eventType=None):
+    pass
+
+class _MouseState:
+    '''State of the mouse buttons, updated by the mouse events of the windows (as psychopy does)'''
+    def __init__(self):
+        self.buttons = [0, 0, 0]
+
+    def on_mouse_press(self, x, y, button, modifiers):
+        self.buttons[{1: 0, 2: 1, 4: 2}.get(button, 0)] = 1
+
+    def on_mouse_release(self, x, y, button, modifiers):
+        self.buttons[{1: 0, 2: 1, 4: 2}.get(button, 0)] = 0
+
+_mouse = _MouseState()
+
+class Mouse:
+    '''Without a win, the button is always pressed (the participant clicks straight away). With a win, the buttons of its mouse events'''
+    def __init__(self, win=None, *args, **kwargs):
+        self.win = win
+
+    def getPressed(self, *args, **kwargs):
+        if self.win is None:
+            return [1, 0, 0]
+        self.win.winHandle.dispatch_events()
+        return list(_mouse.buttons)
+
+    def clickReset(self, *args, **kwargs):
+        pass
+
+def _quit():
+    raise SystemExit(0) # so the next run can start (psychopy's core.quit may stop the interpreter)
+
+### null display (no window, simulated clock) ###
+class _WinHandle:
+    def __init__(self):
+        self.handlers = []
+        self.posted = queue.Queue() # events posted from other threads, e.g. the clicks of benchmarks_jw.py clicks
+        self.push_handlers(_mouse)
+
+    def push_handlers(self, *handlers, **namedHandlers):
+        self.handlers.extend(handlers)
+        if namedHandlers:
+            self.handlers.append(types.SimpleNamespace(**namedHandlers))
+
+    def dispatch_event(self, event, *args):
+        for h in self.handlers:
+            if hasattr(h, event):
+                getattr(h, event)(*args)
+
+    # post an event from another thread. It is dispatched when the window processes its events (dispatch_events)
+    def post_event(self, event, *args):
+        self.posted.put((event, args))
+
+    def dispatch_events(self):
+        while not self.posted.empty():
+            event, args = self.posted.get()
+            self.dispatch_event(event, *args)
+
+class Window:
+    def __init__(self, size=(800, 600), **kwargs):
+        self.size = np.array(size)
+        self.winHandle = _WinHandle()
+        self.frameIntervals = []
+        self.recordFrameIntervals = False
+        self.refreshThreshold = 1.2 * backend.clock.framePeriod
+        self.monitorFramePeriod = backend.clock.framePeriod
+        self.lastFrameT = backend.clock.now()
+        self.autoDraw = []
+        self._toCall = []
+
+    def setColor(self, color, colorSpace=None, operation='', log=None):
+        self.color = color
+        backend.colorSet(color)
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._toCall.append((function, args, kwargs))
+
+    def flip(self, clearBuffer=True):
+        for stim in self.autoDraw:
+            stim.draw()
+        t = backend.clock.nextFlip()
+        backend.clock.waitUntil(t)
+        if self.recordFrameIntervals:
+            self.frameIntervals.append(t - self.lastFrameT)
+        self.lastFrameT = t
+        for function, args, kwargs in self._toCall:
+            function(*args, **kwargs)
+        self._toCall = []
+        backend.flipped(self)
+        return t
+
+    def getActualFrameRate(self, *args, **kwargs):
+        return 1.0 / backend.clock.framePeriod
+
+    def close(self):
+        pass
+
+class _NullStim:
+    '''A stimulus that is never drawn. Any setX(value) method just sets the attribute'''
+    def __init__(self, win=None, **kwargs):
+        self.win = win
+        self.autoDraw = False
+        self.__dict__.update(kwargs)
+
+    def setText(self, text, log=None):
+        self.text = text
+        backend.textSet(self, text)
+
+    def setAutoDraw(self, value, log=None):
+        if value and not self.autoDraw:
+            self.win.autoDraw.append(self)
+        elif not value and self.autoDraw:
+            self.win.autoDraw.remove(self)
+        self.autoDraw = value
+
+    def draw(self, win=None):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('set') and len(name) > 3:
+            attr = name[3].lower() + name[4:]
+            return lambda value, *args, **kwargs: setattr(self, attr, value)
+        raise AttributeError(name)
+
+class TextStim(_NullStim):
+    pass
+
+class Circle(_NullStim):
+    pass
+
+class Rect(_NullStim):
+    pass
+
+class ImageStim(_NullStim):
+    pass
+
+class ElementArrayStim(_NullStim):
+    pass
+
+class Clock:
+    def __init__(self):
+        self._start = backend.clock.now()
+
+    def getTime(self, applyZero=True):
+        return backend.clock.now() - self._start
+
+    def reset(self, newT=0.0):
+        self._start = backend.clock.now() + newT
+
+class CountdownTimer:
+    def __init__(self, start=0):
+        self._countdown = start
+        self._end = backend.clock.now() + start
+        backend.clock.timers.add(self)
+
+    def getTime(self):
+        return self._end - backend.clock.now()
+
+    def reset(self, t=None):
+        if t is not None:
+            self._countdown = t
+        self._end = backend.clock.now() + self._countdown
+
+    def add(self, t):
+        self._end += t
+
+def _wait(secs, hogCPUperiod=0.2):
+    backend.clock.waitUntil(backend.clock.now() + secs)
+
+class KeyStateHandler(dict):
+    def on_key_press(self, symbol, modifiers):
+        self[symbol] = True
+
+    def on_key_release(self, symbol, modifiers):
+        self[symbol] = False
+
+    def __getitem__(self, key):
+        return self.get(key, False)
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+# replace psychopy and pyglet with the null backend
+def installNullDisplay():
+    keyModule = _module('pyglet.window.key', KeyStateHandler=KeyStateHandler, END=65367, SPACE=ord(' '),
+                        **{'_%i' % n: ord(str(n)) for n in range(10)})
+    _module('pyglet', window=_module('pyglet.window', key=keyModule))
+    psychopy = _module('psychopy', __version__='2022.1.1 (null display)')
+    psychopy.visual = _module('psychopy.visual', Window=Window, TextStim=TextStim, Circle=Circle, Rect=Rect, ImageStim=ImageStim,
+                              ElementArrayStim=ElementArrayStim)
+    psychopy.core = _module('psychopy.core', Clock=Clock, MonotonicClock=Clock, CountdownTimer=CountdownTimer, wait=_wait, quit=_quit,
+                            getTime=backend.clock.now)
+    psychopy.data = _module('psychopy.data')
+    _installInput(psychopy)
+
+# replace only the keyboard, event and gui modules, for use with a real window
+def installRealDisplay():
+    import psychopy
+    from psychopy import visual, core
+    backend.clock = HarnessClock(simulated=False)
+    setColor, flip, setText = visual.Window.setColor, visual.Window.flip, visual.TextStim.setText
+
+    def _setColor(win, color, *args, **kwargs):
+        setColor(win, color, *args, **kwargs)
+        backend.colorSet(color)
+
+    def _flip(win, *args, **kwargs):
+        t = flip(win, *args, **kwargs)
+        backend.flipped(win)
+        return t
+
+    def _setText(stim, text, *args, **kwargs):
+        setText(stim, text, *args, **kwargs)
+        backend.textSet(stim, text)
+
+    visual.Window.setColor, visual.Window.flip, visual.TextStim.setText = _setColor, _flip, _setText
+    core.quit = _quit
+    _installInput(psychopy)
+
+def _installInput(psychopy):
+    psychopy.event = _module('psychopy.event', getKeys=_eventGetKeys, waitKeys=_eventWaitKeys, clearEvents=_eventClearEvents, Mouse=Mouse)
+    psychopy.gui = _module('psychopy.gui', Dlg=Dlg, DlgFromDict=DlgFromDict)
+    keyboard = _module('psychopy.hardware.keyboard', Keyboard=Keyboard, KeyPress=KeyPress)
+    psychopy.hardware = _module('psychopy.hardware', keyboard=keyboard)
+
+# Function to run the task once, with a typist tapping at the given rate, and compare the saved data with what was typed
+def runTask(rate, args):
+    from tapping_analysis_jw import patternDetect, parseStream
+
+    answers = {'participant': '999', 'session number': 1, 'session time': 'pm-a', 'practice mode': args.mode == 'practice',
+               'use automated counter-balancing': False, 'use sequence': args.mode, 'number of trials': str(args.trials),
+               'record frame timing': args.frame_timing}
+    backend.newRun(SyntheticTypist(rate, args.error_rate, args.jitter, seed=args.seed), answers)
+    workDir = tempfile.mkdtemp(prefix='tapping_harness_')
+    cwd = os.getcwd()
+    os.chdir(workDir)
+    t0 = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO() if not args.verbose else sys.stdout):
+            runpy.run_path(TASK_SCRIPT, run_name='__main__')
+    except SystemExit:
+        pass
+    finally:
+        os.chdir(cwd)
+    runTime = time.perf_counter() - t0
+
+    outFiles = [f for f in glob.glob(os.path.join(workDir, 'data', 'fingertapping', 'P*', 'P*_S*_*.csv')) if '_quitExp' not in f]
+    if not outFiles:
+        raise SystemExit('The task did not save any data (see %s)' % workDir)
+    saved = pd.read_csv(outFiles[0], index_col=0, dtype={'target_sequence': str})
+
+    typed = collected = dropped = reordered = extra = score_ok = 0
+    recordLatency, displayLatency, loopRates = [], [], []
+    for trial, (_, row) in zip(backend.trials, saved.iterrows()):
+        expected = [(t, name) for t, name in trial['pressed'] if t <= trial['last_poll']] # key presses typed while the task was checking
+        expectedTimes = np.round(np.array([t for t, name in expected]) - trial['t0'], 6)
+        savedTimes = np.asarray(json.loads(row['tap_times']), dtype=np.float64)
+        savedStream = parseStream(row['stream'])
+        typed += len(expected)
+        collected += len(trial['collected'])
+        dropped += int(np.sum(~np.isin(expectedTimes, savedTimes)))
+        extra += int(np.sum(~np.isin(savedTimes, expectedTimes)))
+        reordered += int(np.sum(np.diff(savedTimes) < 0))
+        keyOf = dict(zip(expectedTimes, (int(name) for t, name in expected)))
+        reordered += sum(keyOf.get(t, k) != k for t, k in zip(savedTimes, savedStream)) # key saved with the wrong time
+        with contextlib.redirect_stdout(io.StringIO()):
+            n_correct = patternDetect(stream_in=[int(name) for t, name in expected], targetSequence_in=row['target_sequence'])['n_correct']
+        score_ok += bool(np.isclose(n_correct, row['n_correct']))
+        recordLatency += [now - t for t, name, now in trial['collected']]
+        displayLatency += [shown - t for t, shown in trial['shown']]
+        if trial['real_end'] is not None and trial['real_end'] > trial['real_start']:
+            loopRates.append(trial['n_polls'] / (trial['real_end'] - trial['real_start']))
+    recordLatency = 1000 * np.array(recordLatency or [np.nan])
+    displayLatency = 1000 * np.array(displayLatency or [np.nan])
+    return {'rate': rate, 'trials': len(saved), 'typed': typed, 'collected': collected, 'dropped': dropped, 'reordered': reordered,
+            'extra': extra, 'loop_per_s': np.mean(loopRates) if loopRates else np.nan,
+            'record_ms_mean': np.nanmean(recordLatency), 'record_ms_p95': np.nanpercentile(recordLatency, 95), 'record_ms_max': np.nanmax(recordLatency),
+            'display_ms_mean': np.nanmean(displayLatency), 'display_ms_p95': np.nanpercentile(displayLatency, 95),
+            'score_ok': '%i/%i' % (score_ok, len(saved)), 'run_s': runTime, 'data_dir': workDir}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the finger tapping task with a synthetic typist and report loop throughput and key press latency.')
+    parser.add_argument('--rates', type=float, nargs='+', default=[2, 4, 8, 16, 32, 64], help='tap rates to test (key presses per second)')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='probability that each key press is a wrong key')
+    parser.add_argument('--jitter', type=float, default=0.25, help='coefficient of variation of the intervals between key presses')
+    parser.add_argument('--trials', type=int, default=1, help='number of trials in each run')
+    parser.add_argument('--mode', choices=['practice', 'sequence_1', 'sequence_2'], default='practice', help='practice mode or a manually selected sequence')
+    parser.add_argument('--display', choices=['null', 'real'], default='null', help='no window with a simulated clock (null), or a real psychopy window')
+    parser.add_argument('--frame-rate', type=float, default=60.0, help='refresh rate of the null display')
+    parser.add_argument('--frame-timing', action='store_true', help='select \'record frame timing\' in the task (saved in the data folder)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='also save the results to this csv file')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the task')
+    args = parser.parse_args(argv)
+    if os.path.dirname(TASK_SCRIPT) not in sys.path:  # the task imports its modules from the script folder
+        sys.path.insert(0, os.path.dirname(TASK_SCRIPT))
+
+    if args.display == 'null':
+        backend.clock = HarnessClock(simulated=True, frameRate=args.frame_rate)
+        installNullDisplay()
+    else:
+        installRealDisplay()
+
+    results = []
+    print('%7s %6s %6s %7s %9s %9s %10s %22s %17s %8s' % ('rate Hz', 'typed', 'saved', 'dropped', 'reordered', 'loop it/s',
+                                                       'score ok', 'record ms mean/p95/max', 'display ms mean/p95', 'run s'))
+    for rate in args.rates:
+        r = runTask(rate, args)
+        results.append(r)
+        print('%7.1f %6i %6i %7i %9i %9.0f %10s %8.2f/%5.2f/%7.2f %9.2f/%6.2f %8.2f' % (
+            r['rate'], r['typed'], r['typed'] - r['dropped'] + r['extra'], r['dropped'], r['reordered'], r['loop_per_s'], r['score_ok'],
+            r['record_ms_mean'], r['record_ms_p95'], r['record_ms_max'], r['display_ms_mean'], r['display_ms_p95'], r['run_s']))
+    if args.output:
+        pd.DataFrame(results).to_csv(args.output, index=False)
+        print('Results saved to %s' % args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Title: Continuous recording of the word recall task
+Author: Julia Wood, the University of Queensland, Australia
+Records a whole recall block into one memory-mapped file, with a marker at every cue word onset and mouse click, instead of starting
+and stopping the microphone for every cue word. The clip of each cue word is cut from the recording between its markers.
+To cut the clips of a recording again afterwards: python recording_jw.py RECORDING_FILE [OUTPUT_DIR]
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import os
+import struct
+import sys
+import wave
+import numpy as np
+import pandas as pd
+
+HEADER_SIZE = 128 # bytes of the .npy file before the samples. The header is padded to this size, so it can be rewritten with a new length
+
+# Function to write the header of a .npy file of float32 samples with shape (n, channels), padded to HEADER_SIZE bytes
+def _writeHeader(f, n, channels):
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': (%i, %i), }" % (n, channels)
+    header = header.ljust(HEADER_SIZE - 11) + '\n'
+    f.seek(0)
+    f.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+
+# Class for a recording of a whole block, written straight into a memory-mapped .npy file
+class SessionRecording:
+    '''
+    The file starts with room for growSeconds of samples, and grows by growSeconds whenever the recording needs more room (up to
+    maxSeconds, after which samples are dropped), so a recording of any length uses no memory and at most growSeconds of unused disk
+    space, and everything recorded so far is on disk if psychopy crashes. close() cuts the file down to the samples recorded.
+    write() puts each chunk of samples at its position in the recording (the sample number counted from the start of the capture).
+    mark() stores a marker (e.g. the cue onset of an item) as the sample recorded at that time, counted from startTime (the time the
+    first sample was captured, on the psychopy clock).
+    clip() returns the samples between two sample numbers as a view of the file, so nothing is copied.
+    close() saves the markers to a csv file (one row per marker: item, label, time, sample), with the sample rate and the length of
+    the recording in every row, so the recording can be read back with SessionRecording.open().
+    '''
+    def __init__(self, path, sampleRate=48000, channels=1, growSeconds=60, maxSeconds=3600, markersPath=None, samples=None):
+        self.path = path
+        self.markersPath = markersPath or os.path.splitext(path)[0] + '_markers.csv'
+        self.sampleRate = sampleRate
+        self.channels = channels
+        self.growSamples = int(growSeconds * sampleRate)
+        self.maxSamples = int(maxSeconds * sampleRate)
+        if samples is None:
+            samples = self._map(min(self.growSamples, self.maxSamples), mode='w+')
+        self.samples = samples
+        self.n = 0 # samples recorded so far
+        self.startTime = None
+        self.markers = [] # (item, label, time, sample)
+        self.n_dropped = 0 # samples that did not fit in the file
+
+    # read a recording saved by close(), without loading the samples into memory
+    @classmethod
+    def open(cls, path, markersPath=None):
+        recording = cls(path, markersPath=markersPath, samples=np.load(path, mmap_mode='r'))
+        markers = pd.read_csv(recording.markersPath)
+        recording.sampleRate = int(markers['sample_rate'].iloc[0])
+        recording.channels = recording.samples.shape[1]
+        recording.n = int(markers['n_samples'].iloc[0])
+        start = markers[markers['label'] == 'recording_start']
+        recording.startTime = float(start['time'].iloc[0]) if len(start) else None
+        recording.markers = [(None if pd.isna(m.item) else int(m.item), m.label, m.time, int(m.sample)) for m in markers.itertuples()
+                             if m.label not in ('recording_start', 'recording_end')]
+        return recording
+
+    # memory-map the file with room for capacity samples (the file is created, or made longer, to fit them)
+    def _map(self, capacity, mode='r+'):
+        samples = np.memmap(self.path, dtype=np.float32, mode=mode, offset=HEADER_SIZE, shape=(capacity, self.channels))
+        with open(self.path, 'r+b') as f:
+            _writeHeader(f, capacity, self.channels)
+        return samples
+
+    # write a chunk of samples (n x channels) recorded from sample number position
+    def write(self, chunk, position=None):
+        position = self.n if position is None else int(position)
+        chunk = np.asarray(chunk, dtype=np.float32).reshape(-1, self.channels)
+        end = min(position + len(chunk), self.maxSamples)
+        self.n_dropped += len(chunk) - max(end - position, 0)
+        if end > len(self.samples):  # grow the file by growSeconds (or more, to fit the chunk)
+            self.samples.flush()
+            self.samples = self._map(min(-(-end // self.growSamples) * self.growSamples, self.maxSamples))
+        if end > position:
+            self.samples[position:end] = chunk[:end - position]
+            self.n = max(self.n, end)
+
+    # the sample number recorded at time t (psychopy clock)
+    def sampleAt(self, t):
+        return int(round((t - self.startTime) * self.sampleRate))
+
+    # store a marker at time t (psychopy clock), e.g. mark(1, 'cue_onset', flipTime). Returns its sample number
+    def mark(self, item, label, t):
+        sample = self.sampleAt(t)
+        self.markers.append((item, label, t, sample))
+        return sample
+
+    # the samples from start to stop (sample numbers) as a view of the file
+    def clip(self, start, stop):
+        return RecordingClip(self.samples[max(start, 0):stop], self.sampleRate)
+
+    # the samples of an item from its startLabel marker to its stopLabel marker, e.g. from the cue onset to the mouse click
+    def itemClip(self, item, startLabel='cue_onset', stopLabel='click'):
+        samples = {label: sample for i, label, t, sample in self.markers if i == item}
+        return self.clip(samples[startLabel], samples[stopLabel])
+
+    # the markers as a dataframe (one row per marker)
+    def markerFrame(self):
+        rows = [(None, 'recording_start', self.startTime, 0)] + self.markers + [(None, 'recording_end', np.nan, self.n)]
+        frame = pd.DataFrame(rows, columns=['item', 'label', 'time', 'sample'])
+        frame['sample_rate'] = self.sampleRate
+        frame['n_samples'] = self.n
+        return frame
+
+    # write the samples to disk, cut the file down to the samples recorded, and save the markers
+    def close(self):
+        if isinstance(self.samples, np.memmap) and self.samples.mode != 'r':
+            self.samples.flush()
+            self.samples = None  # (on Windows, a file can only be cut down once it is no longer memory-mapped)
+            try:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(HEADER_SIZE + self.n * self.channels * 4)
+                    _writeHeader(f, self.n, self.channels)
+            except OSError:  # still mapped by a clip (the unused samples are left at the end of the file, see n_samples in the markers)
+                pass
+            self.samples = np.load(self.path, mmap_mode='r')
+        self.markerFrame().to_csv(self.markersPath, index=False)
+
+# Class for a clip of a recording (a view of its samples), with the save(path) method of psychopy's AudioClip, e.g. for AudioWriter
+class RecordingClip:
+    def __init__(self, samples, sampleRate):
+        self.samples = samples
+        self.sampleRate = sampleRate
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sampleRate
+
+    # save the clip to a 16 bit .wav file
+    def save(self, path):
+        pcm = (np.clip(self.samples, -1, 1) * 32767).astype('<i2')
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(pcm.shape[1] if pcm.ndim > 1 else 1)
+            f.setsampwidth(2)
+            f.setframerate(self.sampleRate)
+            f.writeframes(pcm.tobytes())
+
+# Class for recording a microphone into a SessionRecording for a whole block, with psychtoolbox (the audio library psychopy's
+# Microphone uses). The microphone is started once, so no cue word waits for it to start and no response is clipped at the start
+class ContinuousRecorder:
+    '''
+    poll() copies the samples captured since the last poll into the recording, and must be called at least every bufferSecs (e.g.
+    in the loop waiting for the mouse click). mark() stores a marker at a time on the psychopy clock (e.g. the flip time of a cue word).
+    saveClip() cuts a clip out of the recording and hands it to the writer (e.g. an AudioWriter) once every sample of the clip has
+    been captured, so the clip of a response is not cut short by the latency of the microphone.
+    '''
+    def __init__(self, recording, device=None, bufferSecs=10, writer=None):
+        from psychtoolbox import audio
+        self.recording = recording
+        self.writer = writer
+        self.stream = audio.Stream(mode=2, device_id=-1 if device is None else device, freq=recording.sampleRate, channels=recording.channels)
+        self.stream.get_audio_data(bufferSecs)  # allocate the capture buffer once
+        self.pending = [] # (stop sample, clip start, path, info) of the clips waiting for their last samples
+        self.n_overflows = 0
+        self.started = False
+
+    def start(self):
+        self.recording.startTime = self.stream.start(0, 0, 1)  # record until stopped, and wait for the capture to start
+        self.started = True
+
+    # copy the new samples into the recording, and hand on the clips that are complete. Returns the number of samples recorded
+    def poll(self):
+        if not self.started:
+            return self.recording.n
+        data, position, overflow, captureStart = self.stream.get_audio_data()
+        if captureStart:
+            self.recording.startTime = captureStart  # the time the first sample was captured
+        self.n_overflows += bool(overflow)
+        if len(data):
+            self.recording.write(data, position)
+        self._handOn()
+        return self.recording.n
+
+    def mark(self, item, label, t):
+        return self.recording.mark(item, label, t)
+
+    # save the recording from sample start to sample stop to path (once the samples up to stop are recorded). info is passed on to the writer
+    def saveClip(self, start, stop, path, info=None):
+        self.pending.append((stop, start, path, info))
+        self._handOn()
+
+    def _handOn(self, flush=False):
+        ready = [p for p in self.pending if flush or p[0] <= self.recording.n]
+        for p in ready:
+            stop, start, path, info = p
+            clip = self.recording.clip(start, min(stop, self.recording.n))
+            if self.writer is not None:
+                self.writer.submit(clip, path, info)
+            else:
+                clip.save(path)
+            self.pending.remove(p)
+
+    # stop the microphone, record the last samples, save the clips still waiting and the markers
+    def close(self):
+        if self.started:
+            self.stream.stop()
+            self.poll()
+            self.started = False
+            self._handOn(flush=True)
+            self.stream.close()
+            if self.writer is not None:  # the clips are views of the file, which can only be cut down once they are written
+                self.writer.flush()
+            self.recording.close()
+
+    def report(self):
+        return ('%.1f seconds recorded, %i markers, %i buffer overflows, %i samples dropped'
+                % (self.recording.n / self.recording.sampleRate, len(self.recording.markers), self.n_overflows, self.recording.n_dropped))
+
+# Function to cut the clip of every item of a recording (from its cue onset to its mouse click) into .wav files
+def cutClips(path, outDir=None, startLabel='cue_onset', stopLabel='click'):
+    recording = SessionRecording.open(path)
+    outDir = outDir or os.path.dirname(os.path.abspath(path))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    paths = []
+    for item in sorted({i for i, label, t, sample in recording.markers if i is not None}):
+        try:
+            clip = recording.itemClip(item, startLabel, stopLabel)
+        except KeyError:  # e.g. the last item, if the task was quit before the mouse click
+            continue
+        paths.append(os.path.join(outDir, '%s_item%02i.wav' % (stem, item)))
+        clip.save(paths[-1])
+    return paths
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for p in cutClips(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None):
+        print(p)
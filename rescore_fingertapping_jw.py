@@ -0,0 +1,148 @@
+"""
+Title: Re-score all finger tapping task output files [replication of Walker et al. 2002]
+Author: Julia Wood, the University of Queensland, Australia
+Finds every P*/P*_S*_*.csv file written by finger_tapping_task_jw.py, re-scores every stream and writes one summary csv.
+Rows where the re-scored n_correct differs from the value stored by the task are flagged in the n_correct_mismatch column.
+Files that have not changed since the last run are not parsed again (use --full to re-score everything).
+With --streams-file, the streams of every scored trial are also saved in one compact binary file (see saveStreams in task_io_jw.py).
+Usage: python rescore_fingertapping_jw.py [--data-dir data/fingertapping] [--output FILE] [--jobs N] [--full] [--streams-file FILE]
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import argparse
+import glob
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from tapping_analysis_jw import batchPatternDetect, parseStream
+from task_io_jw import saveStreams
+from word_bank_jw import fileHash # the same check as for the word bank cache: the hash of a file whose mtime has changed
+
+# columns copied from the task output files into the summary (if present)
+INFO_COLUMNS = ['participant', 'allocation', 'session', 'session_time', 'target_sequence', 'sequence_type', 'trial']
+
+# the other csv files the task saves next to the output files (e.g. P1_A_S1_AM_quitExp_2.csv), which are not re-scored
+OTHER_FILES = re.compile(r'_(quitExp|frame_timing)(_[0-9]+)?\.csv$')
+
+# Function to find all finger tapping output files in the data directory
+def findOutputFiles(data_dir):
+    return sorted(p for p in glob.glob(os.path.join(data_dir, 'P*', 'P*_S*_*.csv')) if not OTHER_FILES.search(p))
+
+# Function to parse and re-score a single output file (run in a worker process)
+def rescoreFile(path, file_hash):
+    stat = os.stat(path)
+    df = pd.read_csv(path, index_col=0, dtype={'target_sequence': str})  # keep target sequences as strings, e.g. '41324'
+    if 'stream' not in df.columns or 'target_sequence' not in df.columns:
+        # e.g. the _quitExp files only store the partial stream, so there is no target sequence to score against
+        return pd.DataFrame({'source_file': [path], 'source_mtime_ns': [stat.st_mtime_ns], 'source_size': [stat.st_size],
+                             'source_hash': [file_hash], 'status': ['not scored: no stream/target_sequence columns']})
+
+    out = pd.DataFrame({col: df[col].values for col in INFO_COLUMNS if col in df.columns})
+    streams = [parseStream(s) if isinstance(s, str) else np.zeros(0, dtype=np.int8) for s in df['stream']]
+    out['n_taps'] = [len(s) for s in streams]
+    out['n_correct_stored'] = df['n_correct'].values if 'n_correct' in df.columns else np.nan
+    out['n_correct'] = np.nan
+    out['errors'] = np.nan
+    out['accuracy'] = np.nan
+    for targ in out['target_sequence'].dropna().unique():  # score all streams with the same target sequence in one batch
+        rows = np.flatnonzero(out['target_sequence'].values == targ)
+        res = batchPatternDetect([streams[r] for r in rows], targ)
+        for col in ['n_correct', 'errors', 'accuracy']:
+            out.loc[rows, col] = res[col]
+    out.insert(0, 'source_file', path)
+    out['source_mtime_ns'] = stat.st_mtime_ns
+    out['source_size'] = stat.st_size
+    out['source_hash'] = file_hash
+    out['status'] = 'scored'
+    return out
+
+# Function to read the trials of an output file, for the cohort streams file (run in a worker process)
+def readTrials(path):
+    df = pd.read_csv(path, index_col=0, dtype={'target_sequence': str})
+    df.insert(0, 'source_file', path)
+    return df
+
+# worker wrapper: hash the file in the worker process too, so that reading files is spread across all cores
+def rescoreFileWorker(path_and_hash):
+    path, file_hash = path_and_hash
+    if file_hash is None:
+        file_hash = fileHash(path)
+    return rescoreFile(path, file_hash)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-score all finger tapping task output files and write a summary csv.')
+    parser.add_argument('--data-dir', default='data' + os.path.sep + 'fingertapping', help='folder containing the P* participant folders')
+    parser.add_argument('--output', default=None, help='summary csv to write (default: rescored_summary.csv in the data folder)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--full', action='store_true', help='re-score every file, even if it has not changed since the last run')
+    parser.add_argument('--streams-file', default=None, help='also save the streams of all scored trials to this .npz file')
+    parser.add_argument('--packing', choices=['uint8', '2bit'], default='uint8', help='key press storage in the streams file')
+    args = parser.parse_args(argv)
+    output = args.output or os.path.join(args.data_dir, 'rescored_summary.csv')
+    t0 = time.perf_counter()
+
+    files = findOutputFiles(args.data_dir)
+
+    # re-use the rows from the previous summary for files that have not changed
+    previous = {}  # previous summary rows for each file
+    if os.path.exists(output) and not args.full:
+        old_summary = pd.read_csv(output, dtype={'target_sequence': str, 'source_hash': str})
+        previous = {path: rows for path, rows in old_summary.groupby('source_file', sort=False)}
+    keep = []  # summary rows that can be re-used
+    todo = []  # (path, hash) of files to parse. The hash is None if it still needs to be calculated
+    for path in files:
+        old = previous.get(path)
+        if old is None:
+            todo.append((path, None))
+            continue
+        stat = os.stat(path)
+        if old['source_mtime_ns'].iloc[0] == stat.st_mtime_ns and old['source_size'].iloc[0] == stat.st_size:
+            keep.append(old)  # unchanged: skip
+            continue
+        file_hash = fileHash(path)
+        if old['source_hash'].iloc[0] == file_hash:  # only the mtime changed (e.g. file was copied): skip, but record new mtime
+            old = old.copy()
+            old['source_mtime_ns'] = stat.st_mtime_ns
+            keep.append(old)
+        else:
+            todo.append((path, file_hash))
+
+    # parse and re-score the new and changed files in parallel
+    results = []
+    if todo:
+        if args.jobs > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                results = list(pool.map(rescoreFileWorker, todo, chunksize=max(1, len(todo) // (4 * args.jobs))))
+        else:
+            results = [rescoreFileWorker(t) for t in todo]
+
+    frames = [f for f in keep + results if len(f)]
+    if not frames:
+        print('No finger tapping output files found in %s' % args.data_dir)
+        return
+    summary = pd.concat(frames, ignore_index=True)
+    for col in ['participant', 'session', 'trial', 'n_taps']:  # keep whole-number columns as integers alongside the unscored (blank) rows
+        if col in summary.columns:
+            summary[col] = summary[col].astype('Int64')
+    summary['n_correct_mismatch'] = (summary['status'] == 'scored') & ~np.isclose(summary['n_correct_stored'].astype(float), summary['n_correct'].astype(float), rtol=0, atol=1e-9, equal_nan=True)
+    summary.to_csv(output, index=False)
+
+    print('%i files found: %i re-scored, %i unchanged since last run' % (len(files), len(todo), len(files) - len(todo)))
+    print('%i trials in summary, %i with n_correct different from the stored value' % ((summary['status'] == 'scored').sum(), summary['n_correct_mismatch'].sum()))
+    print('Summary saved to %s (%.2f s)' % (output, time.perf_counter() - t0))
+
+    if args.streams_file:  # save the streams of all scored trials in one binary file
+        scored = list(summary.loc[summary['status'] == 'scored', 'source_file'].unique())
+        if args.jobs > 1 and len(scored) > 1:
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                cohort = list(pool.map(readTrials, scored, chunksize=max(1, len(scored) // (4 * args.jobs))))
+        else:
+            cohort = [readTrials(path) for path in scored]
+        cohort = pd.concat(cohort, ignore_index=True)
+        saveStreams(args.streams_file, cohort, {'data_dir': args.data_dir, 'created': time.strftime("%d %b %Y %H:%M:%S", time.localtime())}, packing=args.packing)
+        print('Streams of %i trials saved to %s' % (len(cohort), args.streams_file))
+
+if __name__ == '__main__':
+    main()
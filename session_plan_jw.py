@@ -0,0 +1,243 @@
+"""
+Title: Session plans for the finger tapping and word learning tasks
+Author: Julia Wood, the University of Queensland, Australia
+The counter-balancing schedule of both tasks is kept in the tables below. compileTappingPlan and compileWordPlan turn the session details
+from the dialogue boxes into a session plan: everything the task needs (blocks, trials, sequences, word order, output files and folders),
+worked out before the window opens, so the task itself only has to run it.
+To check a plan before a session, e.g.:
+    python session_plan_jw.py fingertapping --participant 12 --allocation AJX --session 1 --time pm-a
+    python session_plan_jw.py wordlearning --participant 12 --allocation AJX --session 1 --time pm-a
+    python session_plan_jw.py schedule     (the whole counter-balancing schedule)
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import argparse
+import json
+import os
+import random
+
+# finger tapping target sequences
+SEQUENCES = {'sequence_1': '41324', 'sequence_2': '42314', 'practice': '12344'}
+
+# word lists: worksheet of wordlists_audio.xlsx, number of word pairs, worksheet of the dummy word pairs, and word list type
+WORDLISTS = {'wordlist_1': {'sheet': 0, 'n_items': 46, 'dummy_sheet': 3, 'wordlist_type': 'one'},
+             'wordlist_2': {'sheet': 1, 'n_items': 46, 'dummy_sheet': 4, 'wordlist_type': 'two'},
+             'wordlist_prac': {'sheet': 2, 'n_items': 8, 'dummy_sheet': 2, 'wordlist_type': 'practice'}}
+N_DUMMY = 8 # dummy word pairs: 4 shown before and 4 after the word list
+# the worksheets of wordlists_audio.xlsx as (name, number of word pairs). Word lists drawn from a word store have the same layout
+SHEETS = [('wordlist_1', 46), ('wordlist_2', 46), ('wordlist_prac', 8), ('wordlist1_dummy', N_DUMMY), ('wordlist2_dummy', N_DUMMY)]
+MATCHED_LISTS = ['wordlist_1', 'wordlist_2'] # word lists matched on their norms when drawn from a word store
+# set to a word store file (e.g. 'wordbank.sqlite', see word_bank_jw.py) to draw a balanced sample of word pairs for each participant
+# from a large word bank, instead of using the same word lists of wordlists_audio.xlsx for everyone
+WORD_STORE = None
+
+# NOTE: these allocations are specific to my study (each letter represents one type of grouping/randomisation variable). Adapt groupings to suit individual experiments
+# the last letter of the participant allocation is the order of the sequences / word lists across the two sessions
+ALLOCATIONS = {'AJX': 'X', 'AJY': 'Y', 'AKX': 'X', 'AKY': 'Y', 'BJX': 'X', 'BJY': 'Y', 'BKX': 'X', 'BKY': 'Y'}
+SESSION_TIMES = ['pm-a', 'pm-b', 'am']
+
+# finger tapping schedule: (order, session number, session time): (sequence, number of trials)
+TAPPING_SCHEDULE = {('X', 1, 'pm-a'): ('sequence_1', 12), ('X', 1, 'pm-b'): ('sequence_1', 4), ('X', 1, 'am'): ('sequence_1', 4),
+                    ('X', 2, 'pm-a'): ('sequence_2', 12), ('X', 2, 'pm-b'): ('sequence_2', 4), ('X', 2, 'am'): ('sequence_2', 4),
+                    ('Y', 1, 'pm-a'): ('sequence_2', 12), ('Y', 1, 'pm-b'): ('sequence_2', 4), ('Y', 1, 'am'): ('sequence_2', 4),
+                    ('Y', 2, 'pm-a'): ('sequence_1', 12), ('Y', 2, 'pm-b'): ('sequence_1', 4), ('Y', 2, 'am'): ('sequence_1', 4)}
+REST_SECONDS_FIRST = 10 # rest before the first trial
+REST_SECONDS = 30 # rest before every other trial
+TAPPING_SECONDS = 30
+
+# word learning schedule: (order, session number, session time): tasks run, in order, as (task type, word list)
+WORD_SCHEDULE = {('X', 1, 'pm-a'): [('learning', 'wordlist_1'), ('recall', 'wordlist_1')],
+                 ('X', 1, 'pm-b'): [('recall', 'wordlist_1')], ('X', 1, 'am'): [('recall', 'wordlist_1')],
+                 ('X', 2, 'pm-a'): [('learning', 'wordlist_2'), ('recall', 'wordlist_2')],
+                 ('X', 2, 'pm-b'): [('recall', 'wordlist_2')], ('X', 2, 'am'): [('recall', 'wordlist_2')],
+                 ('Y', 1, 'pm-a'): [('learning', 'wordlist_2'), ('recall', 'wordlist_2')],
+                 ('Y', 1, 'pm-b'): [('recall', 'wordlist_2')], ('Y', 1, 'am'): [('recall', 'wordlist_2')],
+                 ('Y', 2, 'pm-a'): [('learning', 'wordlist_1'), ('recall', 'wordlist_1')],
+                 ('Y', 2, 'pm-b'): [('recall', 'wordlist_1')], ('Y', 2, 'am'): [('recall', 'wordlist_1')]}
+
+# define function to check if filename exists, then create the next available version number
+def uniq_path(path):
+    fn, ext = os.path.splitext(path)
+    counter = 2
+    while os.path.exists(path):
+        path = fn + "_" + str(counter) + ext
+        counter += 1
+    return path
+
+# Function to look up the counter-balancing order of an allocation
+def _order(allocation, sessionTime):
+    if allocation not in ALLOCATIONS:
+        raise ValueError('Unknown participant allocation %r (expected one of %s)' % (allocation, ', '.join(ALLOCATIONS)))
+    if sessionTime not in SESSION_TIMES:
+        raise ValueError('Unknown session time %r (expected one of %s)' % (sessionTime, ', '.join(SESSION_TIMES)))
+    return ALLOCATIONS[allocation]
+
+# Function to compile the plan of a finger tapping session. sequenceType and nTrials are needed for practice mode and manual selection.
+# dataFile replaces the default output file name (e.g. with a numbered one if the file already exists); the other files are named after it
+def compileTappingPlan(metaData, sequenceType=None, nTrials=None, dataFile=None):
+    participant = 'P' + str(metaData['participant'])
+    session, sessionTime = int(metaData['session number']), metaData['session time']
+    if metaData['practice mode']:
+        allocation, sequenceType = 'practice', 'practice'
+    elif not metaData['use automated counter-balancing']:
+        allocation = 'manual_selection'
+    else:
+        allocation = metaData['participant allocation']
+        sequenceType, nTrials = TAPPING_SCHEDULE[(_order(allocation, sessionTime), session, sessionTime)]
+    if sequenceType not in SEQUENCES or not nTrials or int(nTrials) < 1:
+        raise ValueError('A sequence and a number of trials are needed (got %r, %r)' % (sequenceType, nTrials))
+
+    p_dir = os.path.join('data', 'fingertapping', participant)
+    if metaData['practice mode']:
+        defaultFile = os.path.join(p_dir, '%s_S%i_%s_PRACTICE.csv' % (participant, session, sessionTime))
+        logFile = os.path.join(p_dir, participant + '_practice_log.txt')
+    else:
+        defaultFile = os.path.join(p_dir, '%s_%s_S%i_%s.csv' % (participant, allocation, session, sessionTime))
+        logFile = os.path.join(p_dir, '%s_%s_log.txt' % (participant, allocation))
+    dataFile = dataFile or defaultFile
+    base = os.path.splitext(dataFile)[0]
+    trials = [{'trial': t, 'rest_seconds': REST_SECONDS_FIRST if t == 1 else REST_SECONDS, 'tapping_seconds': TAPPING_SECONDS}
+              for t in range(1, int(nTrials) + 1)]
+    return {'task': 'fingertapping', 'participant': str(metaData['participant']), 'allocation': allocation, 'session': session,
+            'session_time': sessionTime, 'practice': bool(metaData['practice mode']),
+            'dirs': [os.path.join('data'), os.path.join('data', 'fingertapping'), p_dir],
+            'paths': {'data': dataFile, 'log': logFile, 'journal': base + '_journal.jsonl', 'quit': base + '_quitExp.csv',
+                      'streams': base + '_streams.npz', 'frame_timing': base + '_frame_timing.csv',
+                      'problem': os.path.join(p_dir, '%s_ProblemSaving_%s_S%i_%s.csv' % (participant, allocation, session, sessionTime))},
+            'blocks': [{'sequence_type': sequenceType, 'target_sequence': SEQUENCES[sequenceType], 'trials': trials}]}
+
+# Function to compile the plan of a word learning session. taskType ('word learning' or 'word recall') is needed for practice mode and
+# manual selection, and wordlist for manual selection. With a workbook (a file name or a WordBank), the word order of every block is also
+# worked out (see shuffleWords)
+def compileWordPlan(metaData, taskType=None, wordlist=None, dataFile=None, workbook=None):
+    participant = 'P' + str(metaData['participant'])
+    session, sessionTime = int(metaData['session number']), metaData['session time']
+    if metaData['practice mode']:
+        allocation, tasks = 'practice session', [(taskType.replace('word ', ''), 'wordlist_prac')]
+    elif not metaData['use automated counter-balancing']:
+        allocation, tasks = 'manual_selection', [(taskType.replace('word ', ''), wordlist)]
+    else:
+        allocation = metaData['participant allocation']
+        tasks = WORD_SCHEDULE[(_order(allocation, sessionTime), session, sessionTime)]
+
+    p_dir = os.path.join('data', 'wordlearning', participant)
+    prefix = '%s_%s_S%i_%s' % (participant, allocation, session, sessionTime)
+    audio_dir = os.path.join(p_dir, 'audio_recall_files', 'S%i_%s' % (session, sessionTime))
+    if metaData['practice mode']:
+        dataFile = None # practice sessions only save the word order and audio files
+        logFile = os.path.join(p_dir, participant + '_practice_log.txt')
+        timingFile = os.path.join(p_dir, '%s_S%i_%s_PRACTICE_frame_timing.csv' % (participant, session, sessionTime))
+    else:
+        dataFile = dataFile or os.path.join(p_dir, prefix + '.csv')
+        logFile = os.path.join(p_dir, '%s_%s_log.txt' % (participant, allocation))
+        timingFile = os.path.splitext(dataFile)[0] + '_frame_timing.csv'
+    blocks = []
+    for task, wl in tasks:
+        block = dict(WORDLISTS[wl], task=task, wordlist=wl)
+        if task == 'learning':
+            block['paths'] = {'word_order': os.path.join(p_dir, prefix + '_LEARNING_WORD_ORDER.csv')}
+        else:
+            block['paths'] = {'word_order': os.path.join(audio_dir, prefix + '_RECALL_WORD_ORDER.csv'),
+                              'word_order_quit': os.path.join(audio_dir, prefix + '_RECALL_WORD_ORDER_quitExp.csv'),
+                              'audio_prefix': os.path.join(audio_dir, prefix),
+                              'recording': os.path.join(audio_dir, prefix + '_RECALL_RECORDING.npy')} # if the whole block is recorded
+            block['feedback'] = sessionTime == 'pm-a' # the recall word is shown after each cue word in the pm-a (learning) session only
+        blocks.append(block)
+    plan = {'task': 'wordlearning', 'participant': str(metaData['participant']), 'allocation': allocation, 'session': session,
+            'session_time': sessionTime, 'practice': bool(metaData['practice mode']),
+            'dirs': [os.path.join('data'), os.path.join('data', 'wordlearning'), p_dir] + ([os.path.dirname(audio_dir), audio_dir] if any(t == 'recall' for t, wl in tasks) else []),
+            'paths': {'data': dataFile, 'log': logFile, 'frame_timing': timingFile,
+                      'problem': os.path.join(p_dir, '%s_ProblemSaving_%s_S%i_%s.csv' % (participant, allocation, session, sessionTime))},
+            'blocks': blocks}
+    if workbook is not None:
+        shuffleWords(plan, workbook)
+    return plan
+
+# Function to shuffle word pairs (the pairs remain matched)
+def randomWordLists(cue_words, recall_words, rng=random):
+    stim_order = list(range(len(cue_words)))
+    rng.shuffle(stim_order) # shuffle number list to randomise order of presentation
+    return [cue_words[i] for i in stim_order], [recall_words[i] for i in stim_order]
+
+# Function to get the word lists of a participant: the worksheets of the workbook, or if wordStore is given, word lists drawn for this
+# participant from the word store (the same lists in every session of the participant)
+def participantWordBank(participant, workbook='wordlists_audio.xlsx', wordStore=WORD_STORE):
+    from word_bank_jw import WordStore, loadWordBank, participantSeed
+    if wordStore is None:
+        return loadWordBank(workbook) # parsed once, then loaded from its cache file
+    store = WordStore(wordStore)
+    bank = store.sampleBank(SHEETS, participantSeed(participant), matched=MATCHED_LISTS)
+    store.close()
+    return bank
+
+# Function to work out the (random) word order of every block of a word learning plan, and the name of every audio file of the recall
+# blocks. Called when the plan is compiled, and again before each repeat of the tasks (a new random order each time)
+def shuffleWords(plan, workbook, rng=None):
+    rng = rng or random.Random() # seeded from the system, as random.seed() was before
+    book = workbook if not isinstance(workbook, str) else participantWordBank(plan['participant'], workbook)
+    for block in plan['blocks']:
+        cue_words, recall_words = book.words(block['sheet'], block['n_items'])
+        block['cue_words'], block['recall_words'] = randomWordLists(cue_words, recall_words, rng)
+        if block['task'] == 'learning':
+            dummy_cue, dummy_recall = book.words(block['dummy_sheet'], N_DUMMY)
+            block['dummy_cue_words'], block['dummy_recall_words'] = randomWordLists(dummy_cue, dummy_recall, rng)
+        else:
+            block['audio_paths'] = [uniq_path('%s_%s_%s.wav' % (block['paths']['audio_prefix'], cue, recall))
+                                    for cue, recall in zip(block['cue_words'], block['recall_words'])]
+    return plan
+
+# Function to create the output folders of a plan
+def makeDirs(plan):
+    for d in plan['dirs']:
+        if not os.path.isdir(d):
+            os.mkdir(d)
+
+# the plan as text, to check before a session
+def dumpPlan(plan):
+    return json.dumps(plan, indent=2)
+
+# Function to print the whole counter-balancing schedule of both tasks
+def printSchedule():
+    print('%-10s %-7s %-7s %-10s %-8s %s' % ('allocation', 'session', 'time', 'sequence', 'trials', 'word tasks'))
+    for allocation, order in ALLOCATIONS.items():
+        for (o, session, sessionTime), (sequenceType, nTrials) in TAPPING_SCHEDULE.items():
+            if o == order:
+                words = ', '.join('%s %s' % t for t in WORD_SCHEDULE[(o, session, sessionTime)])
+                print('%-10s %-7i %-7s %-10s %-8i %s' % (allocation, session, sessionTime, SEQUENCES[sequenceType], nTrials, words))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print the session plan of the finger tapping or word learning task.')
+    sub = parser.add_subparsers(dest='task', required=True)
+    for task in ['fingertapping', 'wordlearning']:
+        p = sub.add_parser(task)
+        p.add_argument('--participant', required=True)
+        p.add_argument('--allocation', default=None, help='e.g. AJX (automated counter-balancing)')
+        p.add_argument('--session', type=int, choices=[1, 2], default=1)
+        p.add_argument('--time', choices=SESSION_TIMES, default='pm-a')
+        p.add_argument('--practice', action='store_true')
+        if task == 'fingertapping':
+            p.add_argument('--sequence', choices=list(SEQUENCES), default=None, help='manual selection')
+            p.add_argument('--trials', type=int, default=None, help='manual selection or practice mode')
+        else:
+            p.add_argument('--task-type', choices=['word learning', 'word recall'], default=None, help='manual selection or practice mode')
+            p.add_argument('--wordlist', choices=list(WORDLISTS), default=None, help='manual selection')
+            p.add_argument('--workbook', default='wordlists_audio.xlsx', help='word lists, to include the word order in the plan')
+            p.add_argument('--word-store', default=WORD_STORE, help='draw the word lists from this word store (see word_bank_jw.py)')
+    sub.add_parser('schedule')
+    args = parser.parse_args(argv)
+
+    if args.task == 'schedule':
+        printSchedule()
+        return
+    metaData = {'participant': args.participant, 'session number': args.session, 'session time': args.time, 'practice mode': args.practice,
+                'use automated counter-balancing': args.allocation is not None and not args.practice, 'participant allocation': args.allocation}
+    if args.task == 'fingertapping':
+        plan = compileTappingPlan(metaData, sequenceType=args.sequence, nTrials=args.trials)
+    else:
+        workbook = None
+        if args.word_store or os.path.exists(args.workbook):
+            workbook = participantWordBank(args.participant, args.workbook, args.word_store)
+        plan = compileWordPlan(metaData, taskType=args.task_type, wordlist=args.wordlist, workbook=workbook)
+    print(dumpPlan(plan))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Title: Start up helpers for the finger tapping and word learning tasks
+Author: Julia Wood, the University of Queensland, Australia
+Only uses the standard library, so it can be imported before the first dialogue box without slowing down the start of the task.
+To see the start up cost of each import of a task: python benchmarks_jw.py startup
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import importlib
+import os
+import sys
+import threading
+
+# Function to import modules in a background thread, e.g. while the operator fills in the dialogue boxes.
+# When the task imports them itself, they are already loaded (or it waits for the background import to finish)
+def warmImports(modules):
+    def _import():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass  # the error is raised again when the task imports the module itself
+    thread = threading.Thread(target=_import, name='warmImports', daemon=True)
+    thread.start()
+    return thread
+
+# Function to list the import statements of a script in the order they appear, as (line, statement, when), where when is
+# 'before dialogue' (imported before the first dialogue box is shown), 'background' (a module passed to warmImports) or
+# 'after dialogue'. Imports inside functions are included, as they are run when the function is first called
+def scriptImports(path):
+    import ast
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    firstDialog = min((node.lineno for node in ast.walk(tree) if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                       and node.func.attr in ('DlgFromDict', 'Dlg')), default=float('inf'))
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append((node.lineno, ast.unparse(node), 'before dialogue' if node.lineno < firstDialog else 'after dialogue'))
+        elif isinstance(node, ast.Call) and getattr(node.func, 'id', None) == 'warmImports' and node.args and isinstance(node.args[0], ast.List):
+            imports += [(node.lineno, 'import %s' % elt.value, 'background') for elt in node.args[0].elts if isinstance(elt, ast.Constant)]
+    return sorted(imports, key=lambda imp: imp[0])
+
+# Function to measure the time each import statement takes when they are run in order in a fresh python process (so each statement
+# only costs what is not already imported by the statements before it). Also returns the -X importtime output of that process
+def importTimes(statements, cwd=None):
+    import json
+    import subprocess
+    code = ('import json, sys, time\n'
+            'results = []\n'
+            'for statement in json.loads(sys.argv[1]):\n'
+            '    t0 = time.perf_counter()\n'
+            '    try:\n'
+            '        exec(statement)\n'
+            '        error = None\n'
+            '    except Exception as e:\n'
+            '        error = "%s: %s" % (type(e).__name__, e)\n'
+            '    results.append((time.perf_counter() - t0, error))\n'
+            'print(json.dumps(results))\n')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code, json.dumps(statements)], cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'import timing failed')
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+# Function to parse -X importtime output into a list of (module, self seconds, cumulative seconds), slowest (self time) first
+def parseImportTime(stderr):
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        selfTime, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(selfTime) / 1e6, int(cumulative) / 1e6))
+    return sorted(modules, key=lambda m: -m[1])
+
+# Function to print the start up cost of each import of a script
+def startupReport(path, top=15):
+    imports = scriptImports(path)
+    times, stderr = importTimes([statement for line, statement, when in imports], cwd=os.path.dirname(os.path.abspath(path)))
+    print('Start up imports of %s:' % os.path.basename(path))
+    totals = {}
+    for (line, statement, when), (seconds, error) in zip(imports, times):
+        totals[when] = totals.get(when, 0) + seconds
+        print('  line %4i  %-16s %8.1f ms  %s%s' % (line, when, 1000 * seconds, statement, '  (%s)' % error if error else ''))
+    for when in ['before dialogue', 'background', 'after dialogue']:
+        if when in totals:
+            print('  total %-16s %8.1f ms' % (when, 1000 * totals[when]))
+    print('  slowest modules (-X importtime self time):')
+    for name, selfTime, cumulative in parseImportTime(stderr)[:top]:
+        print('    %-40s self %7.1f ms, cumulative %7.1f ms' % (name, 1000 * selfTime, 1000 * cumulative))
@@ -0,0 +1,431 @@
+"""
+Title: Scoring and timing analysis functions for the explicit finger tapping sequence learning task [replication of Walker et al. 2002]
+Author: Julia Wood, the University of Queensland, Australia
+Code adapted from Tom Hardwicke's finger tapping task code: https://github.com/TomHardwicke/finger-tapping-task
+These functions do not depend on psychopy, so they can be imported by the task script and by offline analysis scripts.
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import collections
+import itertools
+import numpy as np
+import pandas as pd
+
+# Function for analysing the response stream
+def patternDetect(stream_in, targetSequence_in):
+    # pre-load some variables
+    det_targetSequence = list(map(int, list(targetSequence_in))) # convert target sequence to list of integers
+    det_stream = list(stream_in) # convert stream of key presses to a list
+    n_correct = float(0) # store for number of correct sequences per trial
+    '''
+    Define stores for error tracking. I did not use these metrics in my study design, but I have left them in the code, in case
+    they are appropriate for other experimental designs. Redefine, remove or ignore them as necessary for your study design.
+    '''
+    contiguousError = 0 # store for cumulative errors
+    errors = float(0) # store for errors
+    # note that n_correct + errors = total sequences
+
+    i = 0  # start pattern detection at first element of keypress stream:
+    while i < len(det_stream):  # search through every item in stream
+        # for all key presses up to the final 5 (or any other target sequence length)
+        if i <= len(det_stream) - len(det_targetSequence):
+            # for any value in the stream where it + the next 4 keypresses match the target sequence:
+            if det_stream[i:(i + len(det_targetSequence))] == det_targetSequence:
+                n_correct += 1  # record a correct pattern completed
+                i += len(det_targetSequence)  # adjust position to skip forward by length of targetSequence
+
+                # Then add any accumulated errors to the total error count and clear the contiguous error count
+                if contiguousError >= 1:  # check if there are contiguous errors we have not yet accounted for
+                    errors += 1 # add an error to the total count
+                    contiguousError = 0 # reset contiguous error count
+
+            # otherwise, if the next sequence length of items in the stream does not match the target sequence:
+            elif det_stream[i:(i + len(det_targetSequence))] != det_targetSequence:
+                contiguousError += 1  # record a 'contiguous error'
+                i += 1  # adjust index forward by 1
+
+                # when contiguous error count reaches 5 incorrect keypresses in a row (i.e., the correct sequence doesn't follow 5 keypresses in a row)
+                # OR if the final item of the stream does not match the target sequence:
+                if contiguousError == 5 or i == len(det_stream):
+                    errors += 1 # add an error to the total count
+                    contiguousError = 0 # reset contiguous error count
+
+        # now deal with last items of the stream (a special case, see 'method' above)
+        else:
+            # get last items
+            lastItems = det_stream[i:]
+            # get subset of target sequence of same length as last items
+            sequenceSubset = det_targetSequence[:len(lastItems)]
+
+            # Addition of PARTIAL correct sequences at end of stream:
+            while lastItems != None:  # while there are additional items left to check
+                if lastItems == sequenceSubset:  # if lastItems match target sequence subset
+                    n_correct += float(len(lastItems)) / float(len(det_targetSequence))  # record fractional sequence
+
+                    if contiguousError >= 1:  # check if there are errors we have not yet recorded
+                        errors += 1  # add an error to total
+                        contiguousError = 0  # reset contiguous error count
+                    lastItems = None  # force failure of inner while loop by updating lastItems
+                    i = len(det_stream)  # force failure of outer while loop by updating i
+                else:  # if lastItems do not match target sequence
+                    contiguousError += 1  # add 1 to contiguous error count
+
+                    # when contiguous error count reaches 5 incorrect keypresses in a row or if this is final item
+                    if contiguousError == 5 or len(lastItems) == 1:
+                        errors += 1  # add an error to total
+                        contiguousError = 0  # reset contiguous error count
+                    if len(lastItems) == 1:  # if this is the final item
+                        lastItems = None  # force failure of inner while loop by updating lastItems
+                        i = len(det_stream)  # force failure of outer while loop by updating i
+                    else:  # else if there are still items left to check
+                        lastItems = lastItems[1:]  # drop the first item from lastItems
+                        sequenceSubset = sequenceSubset[:-1]  # drop the last item from the sequence subset
+
+    # integrity check
+    if n_correct == 0:
+        print('Issue with this stream - n_correct is zero')
+        accuracy = float('nan')
+    else:
+        accuracy = 1 - errors / n_correct  # calculate accuracy
+        # NOTE: this accuracy definition matches Hardwicke et al. 2016. I did not use this metric in my study design, but I have
+        # left the code in the script case it is suitable for other study designs. Remove, redefine or ignore as necessary.
+
+    return {'n_correct': n_correct, 'errors': errors, 'accuracy': accuracy}
+
+# Function to concatenate many tap streams into one flat array plus the start offset of each stream
+def packStreams(streams_in):
+    lengths = np.array([len(s) for s in streams_in], dtype=np.int64) # number of key presses in each stream
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64) # stream s occupies flat[offsets[s]:offsets[s + 1]]
+    np.cumsum(lengths, out=offsets[1:])
+    flat = np.fromiter(itertools.chain.from_iterable(streams_in), dtype=np.int8, count=offsets[-1]) # key presses are 1-4, so int8 is plenty
+    return flat, offsets
+
+# Function for scoring many response streams at once. Returns the same n_correct, errors and accuracy as patternDetect for every stream
+def batchPatternDetect(streams_in, targetSequence_in, offsets=None):
+    '''
+    streams_in is either a list of streams (lists or arrays of key presses, which may all be different lengths), or a flat array of
+    every stream concatenated together with their start positions passed as offsets (e.g. as returned by packStreams).
+
+    Method (equivalent to the while loop in patternDetect, but vectorised across the whole batch):
+    1. Every position in every stream is compared with the target sequence at once, giving a boolean array of full matches.
+    2. patternDetect skips forward by the sequence length after a match, so overlapping matches are not counted twice. The matches it
+       uses are found by hopping from one match to the next match at least one sequence length later - one numpy step per hop for
+       all streams together, so the number of steps is the largest n_correct in the batch, not the number of key presses.
+    3. The key presses between two counted matches are a run of contiguous errors. Every 5 in a row is one error, plus one more for
+       any leftover when the next match arrives, so a gap of g key presses adds ceil(g / 5) errors.
+    4. The final key presses are checked for a PARTIAL sequence (the earliest suffix of the stream that matches the start of the
+       target sequence), which adds a fractional sequence to n_correct. The key presses before it are scored as in step 3.
+    '''
+    targ = np.array(list(map(int, list(targetSequence_in))), dtype=np.int8) # convert target sequence to array of integers
+    seq_len = len(targ)
+    if offsets is None:
+        flat, offsets = packStreams(streams_in)
+    else:
+        flat = np.asarray(streams_in)
+        offsets = np.asarray(offsets, dtype=np.int64)
+    starts = offsets[:-1]
+    ends = offsets[1:]
+    lengths = ends - starts
+    n_streams = len(lengths)
+    n_total = len(flat)
+
+    # 1. windowed comparison: match[q] is True when the target sequence starts at flat[q] and does not run into the next stream
+    is_match = np.zeros(n_total + 1, dtype=bool) # one extra element so that a 'no match' position can be looked up safely
+    n_windows = n_total - seq_len + 1
+    if n_windows > 0:
+        window_match = np.ones(n_windows, dtype=bool)
+        for k in range(seq_len):
+            window_match &= flat[k:k + n_windows] == targ[k]
+        stream_end = np.repeat(ends, lengths)[:n_windows] # end of the stream that each window starts in
+        window_match &= np.arange(n_windows) + seq_len <= stream_end
+        is_match[:n_windows] = window_match
+
+    # next_match[q] is the first match at or after position q (or n_total if there is none before the end of that stream)
+    next_match = np.where(is_match, np.arange(n_total + 1), n_total)
+    next_match = np.minimum.accumulate(next_match[::-1])[::-1]
+
+    # 2. and 3. hop from each counted match to the next one, for every stream at once
+    n_correct = np.zeros(n_streams, dtype=np.float64)
+    errors = np.zeros(n_streams, dtype=np.float64)
+    resume = starts.copy() # position where patternDetect resumes searching (after the last counted match)
+    current = next_match[starts] if n_streams else starts.copy()
+    active = current < ends
+    while active.any():
+        idx = np.flatnonzero(active)
+        gap = current[idx] - resume[idx] # number of key presses skipped over as errors before this match
+        errors[idx] += (gap + 4) // 5 # every 5 contiguous errors count as 1, plus 1 for any remainder
+        n_correct[idx] += 1
+        resume[idx] = current[idx] + seq_len
+        current[idx] = next_match[np.minimum(resume[idx], n_total)]
+        active[idx] = current[idx] < ends[idx]
+
+    # 4. partial sequence at the end of each stream: find the longest suffix of the stream (starting after the last counted match)
+    # that matches the start of the target sequence
+    partial_len = np.zeros(n_streams, dtype=np.int64)
+    for d in range(seq_len - 1, 0, -1):  # check longest partial sequences first, as patternDetect does
+        check = (partial_len == 0) & (ends - resume >= d)
+        if not check.any():
+            continue
+        idx = np.flatnonzero(check)
+        found = np.ones(len(idx), dtype=bool)
+        for k in range(d):
+            found &= flat[ends[idx] - d + k] == targ[k]
+        partial_len[idx[found]] = d
+    n_correct += partial_len / float(seq_len) # record fractional sequences
+    final_gap = ends - partial_len - resume # key presses after the last counted match that were not part of a partial sequence
+    errors += (final_gap + 4) // 5
+
+    # integrity check
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = np.where(n_correct == 0, np.nan, 1 - errors / n_correct)
+
+    return {'n_correct': n_correct, 'errors': errors, 'accuracy': accuracy}
+
+# Class for scoring a response stream one key press at a time, while the trial is running
+class OnlineScorer:
+    '''
+    Gives exactly the same n_correct, errors and accuracy as patternDetect, but is updated as each key press arrives, so the scores
+    for a trial are ready as soon as the trial ends (and can be checked at any point during the trial).
+
+    patternDetect decides whether each position in the stream starts a correct sequence once it can see the next 5 key presses
+    (or any other target sequence length), so the scorer only needs to keep the key presses that are still undecided - never more
+    than one sequence length. Each key press does at most one check of that short buffer, so the cost per key press does not grow
+    as the stream gets longer.
+    '''
+    def __init__(self, targetSequence_in):
+        self.targetSequence = tuple(map(int, list(targetSequence_in))) # convert target sequence to tuple of integers
+        self.reset()
+
+    # clear all scores before a new trial
+    def reset(self):
+        self.pending = collections.deque() # key presses that have not yet been scored (always fewer than the sequence length)
+        self.n_taps = 0 # number of key presses so far
+        self.n_correct = float(0) # number of complete correct sequences so far
+        self.errors = float(0) # errors so far (not including those still building up in contiguousError)
+        self.contiguousError = 0 # contiguous errors not yet added to the error count
+
+    # score a new key press
+    def addTap(self, tap):
+        self.n_taps += 1
+        self.pending.append(tap)
+        if len(self.pending) == len(self.targetSequence):  # there are now enough key presses to check for a sequence
+            if tuple(self.pending) == self.targetSequence:  # if they match the target sequence
+                self.n_correct += 1  # record a correct pattern completed
+                self.pending.clear()  # skip forward by length of target sequence
+                if self.contiguousError >= 1:  # add any accumulated errors to the total and clear the contiguous error count
+                    self.errors += 1
+                    self.contiguousError = 0
+            else:  # if they do not match the target sequence
+                self.contiguousError += 1  # record a 'contiguous error'
+                self.pending.popleft()  # move forward by 1
+                if self.contiguousError == 5:  # 5 incorrect keypresses in a row
+                    self.errors += 1
+                    self.contiguousError = 0
+
+    # get the scores for the stream so far, as patternDetect would calculate them if the stream ended now
+    def score(self):
+        lastItems = tuple(self.pending)
+        # find the first of the last items that begins a PARTIAL correct sequence running to the end of the stream
+        for j in range(len(lastItems)):
+            if lastItems[j:] == self.targetSequence[:len(lastItems) - j]:
+                n_correct = self.n_correct + float(len(lastItems) - j) / float(len(self.targetSequence))  # record fractional sequence
+                break
+        else:  # no partial sequence, so all the last items are errors
+            j = len(lastItems)
+            n_correct = self.n_correct
+        errors = self.errors + (self.contiguousError + j + 4) // 5  # every 5 contiguous errors count as 1, plus 1 for any remainder
+        if n_correct == 0:
+            accuracy = float('nan')
+        else:
+            accuracy = 1 - errors / n_correct  # calculate accuracy (as for patternDetect)
+        return {'n_correct': n_correct, 'errors': errors, 'accuracy': accuracy}
+
+# Function to convert a stream saved in a csv file (written by pandas as a stringified list, e.g. '[4, 1, 3, 2, 4]') back to an array
+def parseStream(stream_text):
+    items = stream_text.strip().strip('[]').replace(',', ' ').split() # much faster than ast.literal_eval for a list of digits
+    return np.array(items, dtype=np.int8)
+
+# Class for finding several target sequences (of any length) in a stream at once, e.g. to measure interference between sequences
+class SequenceScanner:
+    '''
+    An Aho-Corasick automaton: the target sequences are combined into one tree of sequence prefixes, and every possible key press
+    from every prefix is worked out in advance. Scanning a stream is then one table lookup per key press, however many target
+    sequences there are, and overlapping matches of the same or different targets are all found.
+
+    targetSequences_in is a dict of {name: sequence} (e.g. {'targ_seq_1': '41324', 'prac_seq': '12344'}) or a list of sequences.
+    '''
+    def __init__(self, targetSequences_in):
+        if not isinstance(targetSequences_in, dict):
+            targetSequences_in = {seq: seq for seq in targetSequences_in}
+        self.names = list(targetSequences_in.keys())
+        self.sequences = [tuple(map(int, list(str(targetSequences_in[name])))) for name in self.names]
+        if any(len(seq) == 0 for seq in self.sequences):
+            raise ValueError('Target sequences must contain at least one key')
+        keys = sorted(set(k for seq in self.sequences for k in seq)) # keys used in any of the target sequences
+
+        # build the tree of prefixes: goto[state][key] is the next state, output[state] lists the targets that end at this state
+        goto = [{}]
+        output = [[]]
+        for t, seq in enumerate(self.sequences):
+            state = 0
+            for k in seq:
+                if k not in goto[state]:
+                    goto.append({})
+                    output.append([])
+                    goto[state][k] = len(goto) - 1
+                state = goto[state][k]
+            output[state].append(t)
+
+        # breadth first pass to add failure links, turning the tree into a complete table of transitions
+        fail = [0] * len(goto)
+        self.transitions = [dict() for s in goto]
+        queue = collections.deque()
+        for k in keys:
+            if k in goto[0]:
+                self.transitions[0][k] = goto[0][k]
+                queue.append(goto[0][k])
+            else:
+                self.transitions[0][k] = 0
+        while queue:
+            state = queue.popleft()
+            output[state] = output[state] + output[fail[state]] # a match of a longer target also ends any target that is its suffix
+            for k in keys:
+                if k in goto[state]:
+                    child = goto[state][k]
+                    fail[child] = self.transitions[fail[state]][k]
+                    self.transitions[state][k] = child
+                    queue.append(child)
+                else:
+                    self.transitions[state][k] = self.transitions[fail[state]][k]
+        self.output = output
+
+    # scan a stream of key presses and return the matches for every target sequence
+    def scan(self, stream_in):
+        positions = [[] for t in self.sequences]
+        transitions = self.transitions
+        output = self.output
+        state = 0
+        for i, tap in enumerate(stream_in):
+            state = transitions[state].get(tap, 0) # keys that are not in any target sequence return to the start
+            for t in output[state]:
+                positions[t].append(i - len(self.sequences[t]) + 1) # record where this match started
+        results = {}
+        for t, name in enumerate(self.names):
+            # also count the matches patternDetect would use, i.e. skipping forward by the sequence length after each match
+            n_nonoverlapping = 0
+            next_start = 0
+            for p in positions[t]:
+                if p >= next_start:
+                    n_nonoverlapping += 1
+                    next_start = p + len(self.sequences[t])
+            results[name] = {'count': len(positions[t]), # all matches, including overlapping ones
+                             'n_nonoverlapping': n_nonoverlapping, # complete sequences counted as patternDetect would
+                             'positions': positions[t]} # index in the stream where each match starts
+        return results
+
+# Class for storing the key presses of one trial with their timestamps. The arrays are allocated once, before the trial starts
+class TapBuffer:
+    def __init__(self, capacity=1024):
+        self.keys = np.zeros(capacity, dtype=np.int8) # key pressed (1-4)
+        self.times = np.zeros(capacity, dtype=np.float64) # time of key press in seconds, from the keyboard event
+        self.n = 0 # number of key presses stored so far
+
+    # clear the buffer before a new trial (the arrays are re-used)
+    def reset(self):
+        self.n = 0
+
+    # store a key press
+    def add(self, tap, tapTime):
+        if self.n == len(self.keys):  # only happens if someone types > 30 keys per second for the whole trial
+            self.keys = np.concatenate([self.keys, np.zeros_like(self.keys)])
+            self.times = np.concatenate([self.times, np.zeros_like(self.times)])
+        self.keys[self.n] = tap
+        self.times[self.n] = tapTime
+        self.n += 1
+
+    # get the key presses and times stored so far (as copies, so the buffer can be re-used for the next trial)
+    def stream(self):
+        return self.keys[:self.n].copy()
+
+    def tapTimes(self, start=0):
+        return self.times[start:self.n].copy()
+
+# Function to find the correct sequences counted by patternDetect, i.e. the start of each complete match, skipping forward by the
+# sequence length after each match
+def sequenceMatchPositions(stream_in, targetSequence_in):
+    targ = np.array(list(map(int, list(targetSequence_in))), dtype=np.int8)
+    stream = np.asarray(stream_in, dtype=np.int8)
+    if len(stream) < len(targ):
+        return np.zeros(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(stream, len(targ))
+    matches = np.flatnonzero((windows == targ).all(axis=1))
+    positions = []
+    next_start = 0
+    for p in matches:
+        if p >= next_start:
+            positions.append(p)
+            next_start = p + len(targ)
+    return np.array(positions, dtype=np.int64)
+
+# Function for analysing the timing of the key presses in one trial
+def tapTiming(stream_in, tapTimes_in, targetSequence_in):
+    '''
+    Returns a dictionary of timing measures for one trial (all times in seconds):
+    - iti: the inter-tap intervals, i.e. the time between each key press and the one before it
+    - transition_latency: {'4-1': mean interval, ...} the mean interval for every pair of consecutive key presses in the trial
+    - sequence_durations: time from the first to the last key press of each correct sequence (within-sequence speed)
+    - sequence_transitions: array of (number of correct sequences x sequence length - 1) intervals within each correct sequence,
+      e.g. the 4->1, 1->3, 3->2 and 2->4 intervals of each correct 41324
+    '''
+    stream = np.asarray(stream_in, dtype=np.int8)
+    times = np.asarray(tapTimes_in, dtype=np.float64)
+    seq_len = len(targetSequence_in)
+    iti = np.diff(times)
+
+    # mean latency of every transition: code each pair of key presses as a single number (e.g. 4->1 = 41) and group by it
+    transition_latency = {}
+    if len(iti):
+        codes = stream[:-1].astype(np.int64) * 10 + stream[1:]
+        counts = np.bincount(codes, minlength=100)
+        sums = np.bincount(codes, weights=iti, minlength=100)
+        for code in np.flatnonzero(counts):
+            transition_latency['%i-%i' % (code // 10, code % 10)] = float(sums[code] / counts[code])
+
+    # within-sequence intervals for each correct sequence
+    starts = sequenceMatchPositions(stream, targetSequence_in)
+    if len(starts) and seq_len > 1:
+        sequence_transitions = iti[starts[:, None] + np.arange(seq_len - 1)] # interval between taps k and k + 1 of each sequence
+    else:
+        sequence_transitions = np.zeros((0, max(seq_len - 1, 0)))
+    sequence_durations = sequence_transitions.sum(axis=1)
+
+    return {'iti': iti, 'transition_latency': transition_latency,
+            'sequence_durations': sequence_durations, 'sequence_transitions': sequence_transitions}
+
+# Function to summarise the timing of every trial in a finger tapping output file (a dataframe with stream, tap_times and
+# target_sequence columns, as saved by the task). Returns one row per trial
+def tapTimingSummary(trials_df):
+    rows = []
+    for r in range(len(trials_df)):
+        trial = trials_df.iloc[r]
+        stream = trial['stream']
+        times = trial['tap_times']
+        if isinstance(stream, str):  # stream and tap_times are stored as stringified lists in the csv files
+            stream = parseStream(stream)
+        if isinstance(times, str):
+            times = np.array(times.strip().strip('[]').replace(',', ' ').split(), dtype=np.float64)
+        targ = str(trial['target_sequence'])
+        timing = tapTiming(stream, times, targ)
+        row = {'trial': trial['trial'] if 'trial' in trial else r + 1,
+               'n_taps': len(stream),
+               'iti_mean': np.mean(timing['iti']) if len(timing['iti']) else np.nan,
+               'iti_median': np.median(timing['iti']) if len(timing['iti']) else np.nan,
+               'iti_sd': np.std(timing['iti'], ddof=1) if len(timing['iti']) > 1 else np.nan,
+               'n_sequences': len(timing['sequence_durations']),
+               'sequence_duration_mean': np.mean(timing['sequence_durations']) if len(timing['sequence_durations']) else np.nan,
+               'sequence_duration_median': np.median(timing['sequence_durations']) if len(timing['sequence_durations']) else np.nan}
+        # mean latency of each transition within the target sequence, e.g. latency_4-1, latency_1-3 ...
+        for k in range(len(targ) - 1):
+            col = 'latency_%s-%s_%i' % (targ[k], targ[k + 1], k + 1) # numbered, as the same transition can appear twice in a sequence
+            row[col] = np.mean(timing['sequence_transitions'][:, k]) if len(timing['sequence_transitions']) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,398 @@
+"""
+Title: Shared psychopy components for the finger tapping and word learning tasks
+Author: Julia Wood, the University of Queensland, Australia
+Developed in Psychopy v2022.1.1
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import collections
+import time
+import numpy as np
+import pandas as pd
+from psychopy import visual, core, event
+from pyglet.window import key
+
+# Class for collecting key presses during the finger tapping task
+class KeyDispatcher(key.KeyStateHandler):
+    '''
+    Collects ALL key presses that have arrived since the last check, in the order they were pressed, so that fast presses within
+    the same screen refresh are neither lost nor delayed until later frames. Times come from the psychtoolbox keyboard (kb).
+
+    It is also the pyglet key state handler for the window (replacing the plain key.KeyStateHandler), and uses the pyglet key press
+    events as an independent count of the presses, so that any presses missed by the keyboard can be reported.
+    It keeps a count of how many presses were shown in each screen refresh (coalesced), which is saved to the log after each trial.
+    '''
+    def __init__(self, win, kb, keyList):
+        super().__init__()
+        self.kb = kb
+        self.keyList = keyList
+        self.pygletKeys = set(getattr(key, '_' + k if k.isdigit() else k.upper()) for k in keyList) # e.g. '1' is key._1, 'end' is key.END
+        self.resetStats()
+        win.winHandle.push_handlers(self)  # receive the pyglet key events for this window
+
+    # clear the key buffer and the counts before a new trial
+    def clearEvents(self):
+        self.kb.clearEvents()
+        self.resetStats()
+
+    def resetStats(self):
+        self.presses_per_frame = collections.Counter() # number of frames (value) that showed n key presses (key)
+        self.n_collected = 0 # presses collected from the keyboard
+        self.n_pyglet = 0 # presses seen by pyglet
+
+    # pyglet key press event (called by the window when it processes its events)
+    def on_key_press(self, symbol, modifiers):
+        super().on_key_press(symbol, modifiers)  # update the key state
+        if symbol in self.pygletKeys:
+            self.n_pyglet += 1
+
+    # get all key presses since the last check as a list of (key name, time) in the order they were pressed
+    def poll(self):
+        presses = [(keyPress.name, keyPress.rt) for keyPress in self.kb.getKeys(keyList=self.keyList, waitRelease=False)]
+        self.n_collected += len(presses)
+        return presses
+
+    # record how many key presses were shown in the screen refresh that was just displayed
+    def frameShown(self, n_presses):
+        self.presses_per_frame[n_presses] += 1
+
+    # summary of the key presses for the log file
+    def report(self):
+        coalesced = sum(f for n, f in self.presses_per_frame.items() if n > 1)
+        return ('%i key presses collected (%i seen by pyglet) over %i frames; %i frames showed more than one key press (max %i)'
+                % (self.n_collected, self.n_pyglet, sum(self.presses_per_frame.values()), coalesced, max(self.presses_per_frame, default=0)))
+
+# Class for the markers that increment across the screen during the finger tapping task
+class MarkerArray:
+    '''
+    Draws all of the markers as a single ElementArrayStim, with an opacity for each marker (0 = hidden, 1 = shown), rather than one
+    visual.Circle per marker. The whole row of markers is then one draw call per refresh however many are shown, and turning a
+    marker on or off only changes one value in the opacity array.
+    '''
+    def __init__(self, win, positions, radius=15, color='white'):
+        self.visible = np.zeros(len(positions)) # opacity of each marker
+        self.stim = visual.ElementArrayStim(win, units='pix', nElements=len(positions), xys=positions, sizes=2 * radius,
+                                            elementTex=None, elementMask='circle', texRes=128, colors=color, colorSpace='named',
+                                            opacities=self.visible)
+
+    def __len__(self):
+        return len(self.visible)
+
+    # turn one marker on or off
+    def setVisible(self, k, visible):
+        self.visible[k] = visible
+        self.stim.opacities = self.visible  # tell psychopy the opacities have changed (applied at the next draw)
+
+    # turn all markers off
+    def hideAll(self):
+        self.visible[:] = 0
+        self.stim.opacities = self.visible
+
+    def setAutoDraw(self, value):
+        self.stim.setAutoDraw(value)
+
+    def draw(self):
+        self.stim.draw()
+
+# Class for the countdown timer shown in words (e.g. 'thirty', 'twenty nine' ...) during the finger tapping rest periods
+class CountdownDisplay:
+    '''
+    Creates one TextStim for every whole second of the countdown when the task is set up, so the text layout is done once, before
+    the experiment starts. During the countdown the displayed stimulus is only swapped when the whole second changes.
+    It also counts the refreshes that missed their deadline (took longer than win.refreshThreshold) during the countdown.
+    The wording is the same as the countdown showed before: it was num2words(np.ceil(timeLeft)), and num2words words a whole float
+    (e.g. 30.0) as the whole number ('thirty'), so each second was already shown as one word from 'thirty' down to 'one'.
+    '''
+    def __init__(self, win, seconds, **textArgs):
+        from num2words import num2words
+        self.win = win
+        self.timerStims = {}
+        for n in range(1, seconds + 1):
+            self.timerStims[n] = visual.TextStim(win=win, text=num2words(n), **textArgs) # text layout happens here, not during the task
+        self.current = None
+
+    # start a new countdown
+    def start(self, timeLeft):
+        self.n_frames = 0 # refreshes during this countdown
+        self.n_late = 0 # refreshes that missed their deadline
+        self.lastFrameT = None
+        self.update(timeLeft)
+
+    # call once per refresh, before win.flip(), with the time left on the countdown timer
+    def update(self, timeLeft):
+        n = min(max(int(np.ceil(timeLeft)), 1), len(self.timerStims)) # whole seconds left (shown as 'one' until the end)
+        if n != self.current:  # only change the text when the whole second changes
+            if self.current is not None:
+                self.timerStims[self.current].setAutoDraw(False)
+            self.timerStims[n].setAutoDraw(True)
+            self.current = n
+        # check the time since the last refresh (win.lastFrameT is the time of the most recent flip)
+        if self.lastFrameT is not None and self.win.lastFrameT != self.lastFrameT:
+            self.n_frames += 1
+            if self.win.lastFrameT - self.lastFrameT > self.win.refreshThreshold:
+                self.n_late += 1
+        self.lastFrameT = self.win.lastFrameT
+
+    # stop showing the countdown
+    def stop(self):
+        if self.current is not None:
+            self.timerStims[self.current].setAutoDraw(False)
+            self.current = None
+
+    # summary of the countdown frame timing for the log file
+    def report(self):
+        return '%i of %i refreshes missed their deadline during the countdown' % (self.n_late, self.n_frames)
+
+# Class for keeping ready-made text stimuli for the words of a session, e.g. the cue words of the word learning task
+class StimulusCache:
+    '''
+    prepare() creates one TextStim for each word (the text layout is done here), e.g. while an instruction screen is showing.
+    draw() (or get()) then only has to look up the ready-made stimulus of a word, so nothing is laid out just before the flip that shows it.
+    A word that was not prepared is created when it is first looked up (and counted as a miss). At most maxSize stimuli are kept: the least
+    recently used are removed first, so a large word bank does not use up the graphics memory.
+    The time taken to create each stimulus (setup) and to look up each word (onset) is recorded for report().
+    '''
+    def __init__(self, win, maxSize=256, **textArgs):
+        self.win = win
+        self.maxSize = maxSize
+        self.textArgs = textArgs
+        self.stims = collections.OrderedDict() # word: TextStim, least recently used first
+        self.resetStats()
+
+    def resetStats(self):
+        self.setupTimes = [] # seconds to create each stimulus
+        self.onsetTimes = [] # seconds to look up and draw each word
+        self.misses = 0 # words drawn that had not been prepared
+
+    def __len__(self):
+        return len(self.stims)
+
+    # create the stimulus of a word (if it is not in the cache yet) and mark it as the most recently used
+    def _get(self, word):
+        stim = self.stims.get(word)
+        if stim is None:
+            t0 = core.getTime()
+            stim = visual.TextStim(win=self.win, text=word, **self.textArgs)
+            self.setupTimes.append(core.getTime() - t0)
+            self.stims[word] = stim
+            if len(self.stims) > self.maxSize:
+                self.stims.popitem(last=False)
+        else:
+            self.stims.move_to_end(word)
+        return stim
+
+    # create the stimuli of all the words that will be needed (only the last maxSize are kept)
+    def prepare(self, words):
+        for word in words:
+            self._get(str(word))
+
+    # the ready-made stimulus of a word, e.g. to pass to FrameScheduler.present()
+    def get(self, word):
+        t0 = core.getTime()
+        word = str(word)
+        if word not in self.stims:
+            self.misses += 1
+        stim = self._get(word)
+        self.onsetTimes.append(core.getTime() - t0)
+        return stim
+
+    # draw the stimulus of a word (call before win.flip())
+    def draw(self, word):
+        self.get(word).draw()
+
+    # summary of the setup and onset costs for the log file
+    def report(self):
+        setup = 1000 * np.array(self.setupTimes)
+        onset = 1000 * np.array(self.onsetTimes)
+        return ('%i stimuli created (%.2f ms each, %.1f ms in total); %i words looked up (%.3f ms mean, %.3f ms max), %i not prepared'
+                % (len(setup), setup.mean() if len(setup) else 0, setup.sum(), len(onset), onset.mean() if len(onset) else 0,
+                   onset.max() if len(onset) else 0, self.misses))
+
+# Class for showing stimuli for a number of screen refreshes rather than a number of seconds
+class FrameScheduler:
+    '''
+    present() draws the stimuli and flips the window on every refresh for as many refreshes as the exposure lasts (at the measured
+    refresh rate), so the exposure is locked to the refreshes instead of to core.wait(), and the keys in keyList are checked on every
+    refresh. It returns the flip time of the first refresh showing the stimuli (the true onset) and the key pressed (or None).
+    The offset of a stimulus is the onset of whatever is presented after it, e.g. present() with no stimuli to blank the screen.
+    flip: the function that flips the window, called with the intended flip time (e.g. frameTimer.flip, so every refresh is recorded)
+    '''
+    def __init__(self, win, flip=None, keyList=('end',), measure=True):
+        self.win = win
+        self.flip = flip or (lambda intended: win.flip())  # win.flip() takes clearBuffer, not the intended time
+        self.keyList = list(keyList)
+        rate = win.getActualFrameRate(nIdentical=20, nMaxFrames=240, nWarmUpFrames=10) if measure else None  # None if the rate was unstable
+        self.framePeriod = 1.0 / rate if rate else win.monitorFramePeriod
+        self.measured = bool(rate)
+
+    # number of refreshes closest to an exposure of seconds (at least 1)
+    def frames(self, seconds):
+        return max(1, int(round(seconds / self.framePeriod)))
+
+    # show stimuli (objects with a draw() method) for seconds (or for frames refreshes). Returns (onset time, key pressed or None).
+    # Stops early if a key in keyList is pressed, so the caller can quit straight away
+    def present(self, stims=(), seconds=None, frames=None):
+        n = frames if frames is not None else self.frames(seconds)
+        onset = None
+        for frame in range(n):
+            for stim in stims:
+                stim.draw()
+            flipTime = self.flip(self.framePeriod)  # each screen is meant to be shown for one refresh
+            if onset is None:
+                onset = flipTime if flipTime is not None else core.getTime()
+            keys = event.getKeys(self.keyList) if self.keyList else []
+            if keys:
+                return onset, keys[0]
+        return onset, None
+
+    # the refresh rate for the log file
+    def report(self):
+        return '%.2f Hz (%s), %.3f ms per refresh' % (1.0 / self.framePeriod, 'measured' if self.measured else 'reported by the window', 1000 * self.framePeriod)
+
+# Class for waiting for a mouse click without keeping a CPU core busy, e.g. while the participant answers a cue word of the recall task
+class ClickWaiter:
+    '''
+    wait() sleeps between checks, instead of checking the mouse, the keyboard and the microphone over and over (which keeps a whole
+    CPU core busy and can starve the audio thread of psychtoolbox). It wakes up:
+    - at least every maxLatency seconds to process the window events, so a click is detected at most maxLatency after it arrives
+      (the sleeps are shortened by how late the operating system usually wakes up)
+    - when a task is due, e.g. tasks=[(0.02, mic.poll)] calls mic.poll() every 20ms
+    Mouse presses are received as pyglet events of the window (on_mouse_press), with the time each event was processed.
+    The wake ups, the longest time between them and the CPU time used while waiting are recorded for report().
+    '''
+    def __init__(self, win, maxLatency=0.005, keyList=('end',)):
+        self.win = win
+        self.maxLatency = maxLatency
+        self.keyList = list(keyList)
+        self.presses = collections.deque() # times of the mouse presses not collected yet
+        self.oversleep = 0.0 # how much longer than asked time.sleep() usually takes
+        win.winHandle.push_handlers(on_mouse_press=self._onMousePress)  # receive the pyglet mouse events for this window
+        self.resetStats()
+
+    def resetStats(self):
+        self.n_waits = 0
+        self.n_wakeups = 0
+        self.waitTime = 0.0 # seconds spent waiting
+        self.cpuTime = 0.0 # CPU seconds used by the process while waiting
+        self.maxGap = 0.0 # longest time between two wake ups
+
+    # pyglet mouse press event (called by the window when it processes its events)
+    def _onMousePress(self, x, y, button, modifiers):
+        self.presses.append(core.getTime())
+
+    # wait for a mouse click (pressed after the wait started) or a key in keyList, running the tasks (interval in seconds, function)
+    # when they are due. Returns ('click', time of the click) or (key name, time of the key press)
+    def wait(self, tasks=()):
+        self.presses.clear()
+        t0 = last = core.getTime()
+        cpu0 = time.process_time()
+        due = [t0 + interval for interval, function in tasks]
+        while True:
+            self.win.winHandle.dispatch_events()  # process the window events (calls _onMousePress for each mouse press)
+            now = core.getTime()
+            self.n_wakeups += 1
+            self.maxGap = max(self.maxGap, now - last)
+            last = now
+            if self.presses:
+                result = ('click', self.presses.popleft())
+                break
+            keys = event.getKeys(self.keyList) if self.keyList else []
+            if keys:
+                result = (keys[0], now)
+                break
+            for j, (interval, function) in enumerate(tasks):
+                if now >= due[j]:
+                    function()
+                    due[j] = now + interval
+            sleep = min([self.maxLatency] + [d - core.getTime() for d in due]) - self.oversleep
+            if sleep > 0:
+                t = time.perf_counter()
+                time.sleep(sleep)
+                late = min(max(time.perf_counter() - t - sleep, 0), self.maxLatency / 2)  # one long delay (e.g. a busy OS) does not count fully
+                self.oversleep += 0.1 * (late - self.oversleep)  # sleep a little less if the OS usually wakes up late
+        self.n_waits += 1
+        self.waitTime += core.getTime() - t0
+        self.cpuTime += time.process_time() - cpu0
+        return result
+
+    # summary of the waits for the log file
+    def report(self):
+        return ('%i waits (%.1f s): %.0f wake ups per second, longest %.1f ms between wake ups (bound %.1f ms), %.1f%% CPU while waiting'
+                % (self.n_waits, self.waitTime, self.n_wakeups / self.waitTime if self.waitTime else 0, 1000 * self.maxGap,
+                   1000 * self.maxLatency, 100 * self.cpuTime / self.waitTime if self.waitTime else 0))
+
+# Class for recording the timing of every screen refresh (opt-in, e.g. to check the timing of a lab computer)
+class FrameTimer:
+    '''
+    Use frameTimer.flip() instead of win.flip() wherever the timing matters. With enabled=False it just calls win.flip().
+    The time each flip was requested and the time it happened are written to a ring buffer that is allocated once (capacity
+    refreshes), so nothing is allocated during a trial. startPhase() / endPhase() mark e.g. the rest period or the tapping of each
+    trial, and endPhase() summarises the refreshes of that phase (from the refreshes still in the buffer if there were more than
+    capacity). save() writes one row per phase to a csv file:
+    n_late              flips that missed the first refresh after they were requested (took longer than win.refreshThreshold)
+    n_long_intervals    intervals between flips longer than win.refreshThreshold (dropped frames when drawing on every refresh)
+    timing_error_max_ms largest difference between an interval and its intended duration, for flips given one (e.g. 5 s word pairs)
+    A phase started with eventDriven=True only flips when something changes (e.g. the tapping, which flips once for each batch of
+    key presses), so the intervals between its flips are the intervals between the events, not dropped frames: its interval columns
+    and n_long_intervals are left empty, and n_late (a flip that missed the first refresh after the key press) counts its dropped frames.
+    '''
+    def __init__(self, win, capacity=1 << 15, enabled=True):
+        self.win = win
+        self.enabled = enabled
+        self.capacity = capacity
+        self.requestTimes = np.zeros(capacity)
+        self.flipTimes = np.zeros(capacity)
+        self.intended = np.full(capacity, np.nan) # intended interval before each flip (NaN if none)
+        self.n = 0 # flips recorded so far
+        self.phase = None
+        self.phases = [] # summary of each completed phase
+
+    def startPhase(self, name, trial=None, eventDriven=False):
+        if not self.enabled:
+            return
+        self.endPhase()
+        self.phase = {'phase': name, 'trial': trial, 'event_driven': eventDriven, 'start': self.n}
+
+    # flip the window and record the time. intended: how long the previous screen was meant to be shown for (seconds)
+    def flip(self, intended=np.nan):
+        if not self.enabled:
+            return self.win.flip()
+        requestTime = core.getTime()
+        flipTime = self.win.flip()
+        i = self.n % self.capacity
+        self.requestTimes[i] = requestTime
+        self.flipTimes[i] = flipTime if flipTime is not None else core.getTime()
+        self.intended[i] = intended
+        self.n += 1
+        return flipTime
+
+    def endPhase(self):
+        if not self.enabled or self.phase is None:
+            return
+        start = max(self.phase.pop('start'), self.n - self.capacity)
+        idx = np.arange(start, self.n) % self.capacity
+        flips, waits = self.flipTimes[idx], self.flipTimes[idx] - self.requestTimes[idx]
+        intervals = np.diff(flips)
+        errors = np.abs(intervals - self.intended[idx][1:])
+        errors = errors[~np.isnan(errors)]
+        if self.phase['event_driven']:
+            intervals = intervals[:0]  # the intervals between the events, not the refreshes
+        threshold = self.win.refreshThreshold
+        self.phase.update({'n_frames': len(idx), 'n_late': int(np.sum(waits > threshold)), 'max_flip_wait_ms': 1000 * waits.max() if len(waits) else np.nan,
+                           'interval_mean_ms': 1000 * intervals.mean() if len(intervals) else np.nan,
+                           'interval_max_ms': 1000 * intervals.max() if len(intervals) else np.nan,
+                           'n_long_intervals': int(np.sum(intervals > threshold)) if not self.phase['event_driven'] else np.nan,
+                           'timing_error_max_ms': 1000 * errors.max() if len(errors) else np.nan})
+        self.phases.append(self.phase)
+        self.phase = None
+
+    # one row per phase, e.g. for the log file or the timing file
+    def summary(self):
+        self.endPhase()
+        frame = pd.DataFrame(self.phases)
+        if len(frame):
+            frame['n_long_intervals'] = frame['n_long_intervals'].astype('Int64')  # a count, empty for event-driven phases
+        return frame
+
+    def save(self, path):
+        if self.enabled:
+            self.summary().to_csv(path, index=False, float_format='%.3f')
@@ -0,0 +1,543 @@
+"""
+Title: Data saving for the finger tapping and word learning tasks
+Author: Julia Wood, the University of Queensland, Australia
+Developed in Psychopy v2022.1.1
+To recover the data from a session that crashed: python task_io_jw.py JOURNAL_FILE [OUTPUT_CSV]
+To index all of the log files in a data folder: python task_io_jw.py --index-logs DATA_DIR [OUTPUT_CSV]
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import glob
+import json
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+import time
+import zipfile
+import numpy as np
+import pandas as pd
+from tapping_analysis_jw import batchPatternDetect, parseStream, patternDetect
+
+# Function to convert numpy values to plain python values when writing json
+def _jsonDefault(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('Cannot save %r to the journal' % (value,))
+
+# Class for saving data as it is collected, so nothing is lost if the experiment is quit or crashes
+class TrialJournal:
+    '''
+    An append-only journal file with one json record per line, e.g.
+    {"type": "session", ...metaData...}                       written once at the start of the session
+    {"type": "taps", "trial": 3, "stream": [...], ...}         the key presses since the last checkpoint of a trial in progress
+    {"type": "trial", "trial": 3, "n_correct": 12.4, ...}      a complete trial (the same data as a row of the output csv)
+    {"type": "quit", "trial": 4, ...}                          the experiment was quit with the end key
+
+    Records are handed to a background thread that writes them, so append() never waits for the disk and can be called from the
+    frame loop. sync() writes everything to disk (flush and fsync) and is called at the end of each trial, during the rest screen.
+    compactJournal() converts the journal to the final csv. Trial records are matched by their sequence_type and trial number, so the
+    trials of different blocks are kept apart.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', buffering=1 << 16, encoding='utf-8')
+        self.records = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self._writer, name='TrialJournal', daemon=True)
+        self.thread.start()
+
+    # add a record to the journal (returns immediately)
+    def append(self, record):
+        if not self.closed:
+            self.records.put(record)
+
+    # write all records to disk. Waits until they are written, or timeout seconds, and returns True if they were
+    def sync(self, timeout=2.0):
+        if self.closed:
+            return True
+        done = threading.Event()
+        self.records.put(done)
+        return done.wait(timeout)
+
+    # write all records to disk and stop the writer thread
+    def close(self, timeout=5.0):
+        if self.closed:
+            return
+        self.sync(timeout)
+        self.closed = True
+        self.records.put(None)
+        self.thread.join(timeout)
+
+    # background thread: write records as they arrive
+    def _writer(self):
+        while True:
+            record = self.records.get()
+            if record is None:  # journal closed
+                self.file.close()
+                return
+            if isinstance(record, threading.Event):  # sync requested
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                record.set()
+            else:
+                self.file.write(json.dumps(record, default=_jsonDefault) + '\n')
+
+# Class to score, store and save the finished trials of the finger tapping task in a background thread, while the rest screen is showing
+class TrialWorker:
+    '''
+    submit() hands a finished trial (a dict with the trial details, 'target_sequence' and 'stream') to a background thread and returns
+    immediately, with its scores if they are already known (e.g. from the OnlineScorer that scored each key press during the trial).
+    For each trial, the thread:
+    - adds the scoreColumns (e.g. n_correct) to the trial, from the scores given, or by scoring the stream with patternDetect
+    - adds the trial to the column store (one list per column, so no dataframe is copied for each new trial)
+    - saves the trial to the journal (if given) and syncs the journal to disk
+    - calls onDone(trial, seconds) to report that the work is finished, e.g. to save a message to the log
+    wait() blocks until every trial submitted so far is done, and is called before the next trial starts (before the green screen).
+    frame() returns the stored trials as a dataframe with one row per trial.
+    '''
+    def __init__(self, journal=None, scoreColumns=('n_correct',), onDone=None):
+        self.journal = journal
+        self.scoreColumns = list(scoreColumns)
+        self.onDone = onDone
+        self.columns = {}
+        self.trials = queue.Queue()
+        self.lastDone = None  # set when the last trial submitted is done (trials are done in the order they are submitted)
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self._worker, name='TrialWorker', daemon=True)
+        self.thread.start()
+
+    # hand a finished trial to the background thread (returns immediately). scores: the scores of the stream (as returned by
+    # patternDetect), if they have already been calculated
+    def submit(self, trial, scores=None):
+        if self.closed:
+            raise RuntimeError('TrialWorker is closed')
+        self.lastDone = threading.Event()
+        self.trials.put((trial, scores, self.lastDone))
+
+    # wait until every trial submitted so far is done (or timeout seconds). Returns the time spent waiting, in seconds.
+    # If a trial could not be scored or saved, the error is raised here
+    def wait(self, timeout=None):
+        t0 = time.perf_counter()
+        if self.lastDone is not None and not self.lastDone.wait(timeout):
+            raise TimeoutError('Trials were not scored and saved within %s seconds' % timeout)
+        if self.error is not None:
+            raise self.error
+        return time.perf_counter() - t0
+
+    # True if every trial submitted so far is done
+    def done(self):
+        return self.lastDone is None or self.lastDone.is_set()
+
+    # the stored trials (call wait() first to include every trial submitted)
+    def frame(self):
+        return pd.DataFrame({name: list(values) for name, values in self.columns.items()})
+
+    # finish the trials submitted so far and stop the background thread. If a trial could not be scored or saved, the error is raised here
+    def close(self, timeout=5.0):
+        if self.closed:
+            return
+        self.closed = True
+        self.trials.put(None)
+        self.thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    # background thread: score, store and save the trials as they arrive
+    def _worker(self):
+        while True:
+            item = self.trials.get()
+            if item is None:  # worker closed
+                return
+            trial, output, done = item
+            t0 = time.perf_counter()
+            try:
+                if output is None:  # not scored yet: correct sequences, errors and accuracy
+                    output = patternDetect(trial['stream'], trial['target_sequence'])
+                trial.update({name: output[name] for name in self.scoreColumns})
+                for name, value in trial.items():
+                    self.columns.setdefault(name, []).append(value)
+                if self.journal is not None:
+                    self.journal.append(dict(trial, type='trial'))  # save the trial to the journal
+                    self.journal.sync()  # and make sure it is written to disk
+                if self.onDone is not None:
+                    self.onDone(trial, time.perf_counter() - t0)
+            except Exception as e:
+                self.error = e
+            done.set()
+
+# Class for saving audio recordings (e.g. of the recall task) in a background thread, so the task never waits for the disk
+class AudioWriter:
+    '''
+    submit() hands a recording (any object with a save(path) method, e.g. the AudioClip returned by mic.getRecording()) to a
+    background thread, which encodes and writes the file. The recording itself is passed on, not copied.
+    At most maxQueued recordings wait to be written: if the disk falls that far behind, submit() blocks until there is room
+    (and returns how long it blocked), so the recordings never use up the memory.
+    process(clip, info), if given, is called by the background thread before each recording is written, and returns the recording
+    to write, e.g. to detect the speech in it and trim the silence (if it fails, the recording is written as it is).
+    For each file, the time it waited in the queue and the time to write it are recorded, and onDone(path, seconds, error, info) is
+    called, e.g. to save a message to the log (info is passed on from submit(), e.g. the phase and trial the recording belongs to). A file that could not be written does not stop the others (see report()).
+    flush() waits until every recording submitted so far is written, and close() flushes and stops the thread (e.g. in quitExp).
+    '''
+    def __init__(self, maxQueued=8, onDone=None, process=None):
+        self.onDone = onDone
+        self.process = process
+        self.clips = queue.Queue(maxsize=maxQueued)
+        self.lastDone = None  # set when the last recording submitted is written (they are written in the order they are submitted)
+        self.queueTimes = [] # seconds each file waited to be written
+        self.writeTimes = [] # seconds to encode and write each file
+        self.processTimes = [] # seconds to process each recording (if process is given)
+        self.failed = [] # (path, error) of the files that could not be written
+        self.notProcessed = [] # (path, error) of the recordings written as they were, because process failed
+        self.closed = False
+        self.thread = threading.Thread(target=self._writer, name='AudioWriter', daemon=True)
+        self.thread.start()
+
+    # hand a recording to the background thread. Returns the time spent waiting for room in the queue, in seconds (0 unless the
+    # writer is maxQueued files behind)
+    def submit(self, clip, path, info=None):
+        if self.closed:
+            raise RuntimeError('AudioWriter is closed')
+        t0 = time.perf_counter()
+        self.lastDone = threading.Event()
+        self.clips.put((clip, path, info, t0, self.lastDone))
+        return time.perf_counter() - t0
+
+    # wait until every recording submitted so far is written (or timeout seconds). Returns True if they were all written in time
+    def flush(self, timeout=None):
+        return self.lastDone is None or self.lastDone.wait(timeout)
+
+    # write the recordings submitted so far and stop the background thread
+    def close(self, timeout=30.0):
+        if self.closed:
+            return True
+        self.closed = True
+        flushed = self.flush(timeout)
+        self.clips.put(None)
+        self.thread.join(timeout)
+        return flushed
+
+    # summary of the files written for the log file
+    def report(self):
+        queued = 1000 * np.array(self.queueTimes)
+        write = 1000 * np.array(self.writeTimes)
+        processed = 1000 * np.array(self.processTimes)
+        return ('%i audio files written (queued %.1f ms mean, %.1f ms max; written in %.1f ms mean, %.1f ms max), %i failed%s%s'
+                % (len(write) - len(self.failed), queued.mean() if len(queued) else 0, queued.max() if len(queued) else 0, write.mean() if len(write) else 0,
+                   write.max() if len(write) else 0, len(self.failed), ': %s' % '; '.join('%s (%s)' % f for f in self.failed) if self.failed else '',
+                   '; processed in %.1f ms mean, %.1f ms max, %i not processed' % (processed.mean(), processed.max(), len(self.notProcessed))
+                   if len(processed) else ''))
+
+    # background thread: write the recordings as they arrive
+    def _writer(self):
+        while True:
+            item = self.clips.get()
+            if item is None:  # writer closed
+                return
+            clip, path, info, submitTime, done = item
+            t0 = time.perf_counter()
+            self.queueTimes.append(t0 - submitTime)
+            if self.process is not None:
+                try:
+                    clip = self.process(clip, info)
+                except Exception as e:
+                    self.notProcessed.append((path, e))
+                self.processTimes.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+            error = None
+            try:
+                clip.save(path)
+            except Exception as e:
+                error = e
+                self.failed.append((path, e))
+            self.writeTimes.append(time.perf_counter() - t0)
+            del clip, item  # the recording is no longer needed once it is written
+            if self.onDone is not None:
+                try:
+                    self.onDone(path, self.writeTimes[-1], error, info)
+                except Exception:
+                    pass
+            done.set()
+
+# Class for the log file of each participant, written by a background thread so that logging never waits for the disk
+class TaskLog:
+    '''
+    log() hands each message to a background thread, which writes them in batches and flushes the files after each batch.
+    Every message is written to two files:
+    logFile                     the human-readable log, in the same format as before, e.g. 'Trial: 3// logged at 95seconds'
+    logFile without .txt + .jsonl  one json record per message, e.g.
+                                {"time": 95.123456, "wall_time": 1660000000.1, "phase": "tapping", "trial": 3, "message": "Trial: 3"}
+    time is the experiment clock (seconds since the start, to the microsecond), and phase / trial are set with setPhase(). Messages
+    about an earlier trial (e.g. from a background thread, once the next trial has started) pass their own phase and trial to log().
+    flush() waits until everything logged so far is on disk, and close() is called when the experiment ends or is quit.
+    '''
+    def __init__(self, logFile, clock=None, batchSize=256):
+        self.logFile = logFile
+        self.jsonFile = os.path.splitext(logFile)[0] + '.jsonl'
+        self.clock = clock
+        self.batchSize = batchSize
+        self.phase = None
+        self.trial = None
+        self.text = open(logFile, 'a', encoding='utf-8')
+        self.json = open(self.jsonFile, 'a', encoding='utf-8')
+        self.records = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self._writer, name='TaskLog', daemon=True)
+        self.thread.start()
+
+    # set the phase (e.g. 'rest', 'tapping', 'recall') and trial recorded with each message
+    def setPhase(self, phase, trial=None):
+        self.phase = phase
+        self.trial = trial
+
+    # log a message (returns immediately). With timeStamp=0, the human-readable line has no timestamp (as before).
+    # phase / trial: the phase and trial the message is about, if not the current ones (see setPhase)
+    def log(self, message, timeStamp=1, phase=None, trial=None):
+        if self.closed:
+            return
+        if phase is None:
+            phase, trial = self.phase, self.trial
+        t = self.clock.getTime() if self.clock is not None else time.perf_counter()
+        self.records.put({'time': round(t, 6), 'wall_time': round(time.time(), 6), 'phase': phase, 'trial': trial,
+                          'message': message, 'timestamped': timeStamp != 0})
+
+    # wait until everything logged so far is written to disk (or timeout seconds). Returns True if it was
+    def flush(self, timeout=2.0):
+        if self.closed:
+            return True
+        done = threading.Event()
+        self.records.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if self.closed:
+            return
+        self.flush(timeout)
+        self.closed = True
+        self.records.put(None)
+        self.thread.join(timeout)
+
+    # background thread: write the messages in batches
+    def _writer(self):
+        while True:
+            batch = [self.records.get()]
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is None or isinstance(record, threading.Event):
+                    continue
+                self.text.write(record['message'])
+                if record['timestamped']:
+                    self.text.write('// logged at %iseconds' % record['time'])
+                self.text.write('\n')
+                self.json.write(json.dumps(record, default=_jsonDefault) + '\n')
+            self.text.flush()
+            self.json.flush()
+            for record in batch:
+                if isinstance(record, threading.Event):  # flush requested
+                    os.fsync(self.text.fileno())
+                    os.fsync(self.json.fileno())
+                    record.set()
+            if None in batch:  # log closed
+                self.text.close()
+                self.json.close()
+                return
+
+LOG_TIMESTAMP = re.compile(r'^(.*)// logged at (-?\d+)seconds$')
+LOG_HEADER = re.compile(r'^(experiment|researcher|location|date|participant|session|session time|participant allocation): (.*)$')
+
+# Function to read a human-readable log file into a dataframe with one row per message. The session details at the top of each
+# session (experiment, participant, session, date ...) are added as columns to every message of that session
+def readLog(path):
+    rows = []
+    header = {}
+    session = 0
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for n, line in enumerate(f, 1):
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('.....'):
+                continue
+            match = LOG_HEADER.match(line)
+            if match:
+                if match.group(1) == 'experiment':  # the first line of a new session
+                    session += 1
+                    header = {}
+                header[match.group(1).replace(' ', '_')] = match.group(2)
+                continue
+            match = LOG_TIMESTAMP.match(line)
+            message, logged = (match.group(1), float(match.group(2))) if match else (line, np.nan)
+            rows.append({'file': path, 'line': n, 'log_session': session, **header, 'message': message, 'logged_at_s': logged})
+    return pd.DataFrame(rows)
+
+# Function to index all log files in a data folder (both tasks, including practice logs) into one dataframe
+def indexLogs(data_dir):
+    paths = sorted(glob.glob(os.path.join(data_dir, '**', 'P*_log.txt'), recursive=True))
+    frames = [readLog(path) for path in paths]
+    frames = [f for f in frames if len(f)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# Function to read all records from a journal file. A line that was only partly written when the experiment crashed is skipped
+def readJournal(path):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                pass
+    return records
+
+# Function to convert a journal to a dataframe with one row per complete trial (the final csv).
+# With includePartial=True, trials that were started but not completed (e.g. quit or crashed) are included too, using the key
+# presses from their checkpoints, and a trial_complete column says which trials were complete
+def compactJournal(path, includePartial=False):
+    trials = {}  # complete trials, by (sequence type, trial), so the trials of different blocks are kept apart
+    partial = {}  # key presses recorded for trials in progress
+    blocks = {}  # order the blocks first appear in the journal
+    for record in readJournal(path):
+        kind = record.pop('type', None)
+        if kind not in ('trial', 'taps', 'quit'):
+            continue
+        key = (blocks.setdefault(record.get('sequence_type'), len(blocks)), record['trial'])
+        if kind == 'trial':
+            trials[key] = record
+        else:
+            p = partial.setdefault(key, {'sequence_type': record.get('sequence_type'), 'trial': record['trial'], 'stream': [], 'tap_times': []})
+            p['stream'].extend(record.get('stream', []))
+            p['tap_times'].extend(record.get('tap_times', []))
+    rows = [trials[k] for k in sorted(trials)]
+    if includePartial:
+        for row in rows:
+            row['trial_complete'] = True
+        for k in sorted(partial):
+            if k not in trials:
+                rows.append(dict(partial[k], trial_complete=False))
+    return pd.DataFrame(rows)
+
+# Function to save the tap streams (and tap times) of many trials in a compact binary file (an uncompressed numpy .npz file).
+# Instead of one stringified list per trial, all key presses are stored in one array, with the position where each trial starts
+def saveStreams(path, trials_df, metaData=None, packing='uint8'):
+    '''
+    The file contains:
+    taps        all key presses, one byte each (packing='uint8'), or 4 key presses per byte (packing='2bit', keys must be 1-4)
+    offsets     trial r's key presses are taps[offsets[r]:offsets[r + 1]]
+    tap_times   time of every key press (NaN for trials saved without times)
+    trial_*     one array per other column of trials_df (participant, trial, target_sequence, n_correct ...)
+    metadata    metaData (e.g. the session details) as a json string
+    '''
+    streams = [parseStream(s) if isinstance(s, str) else np.asarray(s, dtype=np.uint8) for s in trials_df['stream']]
+    lengths = np.array([len(s) for s in streams], dtype=np.int64)
+    offsets = np.zeros(len(streams) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    taps = np.concatenate(streams).astype(np.uint8) if len(streams) else np.zeros(0, dtype=np.uint8)
+    arrays = {'format': np.array('tap streams v1'), 'packing': np.array(packing), 'offsets': offsets}
+    if packing == '2bit':
+        if len(taps) and (taps.min() < 1 or taps.max() > 4):
+            raise ValueError('2bit packing can only store keys 1-4')
+        codes = np.zeros(-(-len(taps) // 4) * 4, dtype=np.uint8) # pad to a multiple of 4
+        codes[:len(taps)] = taps - 1
+        arrays['taps'] = codes[0::4] | (codes[1::4] << 2) | (codes[2::4] << 4) | (codes[3::4] << 6)
+    elif packing == 'uint8':
+        arrays['taps'] = taps
+    else:
+        raise ValueError('packing must be uint8 or 2bit')
+    if 'tap_times' in trials_df.columns:
+        times = np.full(len(taps), np.nan)
+        for r, t in enumerate(trials_df['tap_times']):
+            if isinstance(t, str):
+                t = t.strip().strip('[]').replace(',', ' ').split()
+            if isinstance(t, (list, np.ndarray)) and len(t) == lengths[r]:
+                times[offsets[r]:offsets[r + 1]] = np.asarray(t, dtype=np.float64)
+        arrays['tap_times'] = times
+    for col in trials_df.columns:
+        if col not in ('stream', 'tap_times'):
+            values = trials_df[col].to_numpy()
+            arrays['trial_' + col] = values if values.dtype.kind in 'biuf' else values.astype(str) # numbers as they are, anything else as text
+    arrays['metadata'] = np.array(json.dumps(metaData or {}, default=_jsonDefault))
+    np.savez(path, **arrays) # uncompressed, so StreamStore can memory-map the arrays
+
+# Function to memory-map one array of an uncompressed .npz file, so it is read from disk only when it is used
+def _mmapNpzArray(path, name):
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        local_header = f.read(30) # zip local file header, followed by the file name and extra field
+        name_len, extra_len = struct.unpack('<HH', local_header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype.hasobject:
+            return None
+        data_offset = f.tell()
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=shape, order='F' if fortran_order else 'C')
+
+# Class for reading a file written by saveStreams (for a single session or a whole cohort)
+class StreamStore:
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with np.load(path) as npz:
+            names = list(npz.files)
+            self.packing = str(npz['packing'])
+            self.offsets = npz['offsets']
+            self.metadata = json.loads(str(npz['metadata']))
+            self.trials = pd.DataFrame({name[len('trial_'):]: npz[name] for name in names if name.startswith('trial_')})
+            big = ['taps'] + (['tap_times'] if 'tap_times' in names else [])
+            arrays = {name: (_mmapNpzArray(path, name) if mmap else None) for name in big}
+            for name in big:  # read into memory if memory mapping was not requested (or is not possible)
+                if arrays[name] is None:
+                    arrays[name] = npz[name]
+        self.tap_times = arrays.get('tap_times')
+        n_taps = int(self.offsets[-1])
+        if self.packing == '2bit':  # unpack to one key per byte (this copies the key presses into memory)
+            packed = np.asarray(arrays['taps'])
+            self.taps = (np.stack([packed & 3, (packed >> 2) & 3, (packed >> 4) & 3, packed >> 6], axis=1).ravel()[:n_taps] + 1).astype(np.uint8)
+        else:
+            self.taps = arrays['taps'] # memory-mapped: only read from disk when used
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # key presses of trial r
+    def stream(self, r):
+        return self.taps[self.offsets[r]:self.offsets[r + 1]]
+
+    # re-score every trial with batchPatternDetect, straight from the (memory-mapped) key press array
+    def score(self, targetColumn='target_sequence'):
+        scores = pd.DataFrame(index=range(len(self)), columns=['n_correct', 'errors', 'accuracy'], dtype=np.float64)
+        targets = self.trials[targetColumn].astype(str).values
+        for targ in np.unique(targets):
+            res = batchPatternDetect(self.taps, targ, offsets=self.offsets)
+            rows = targets == targ
+            for col in scores.columns:
+                scores.loc[rows, col] = res[col][rows]
+        return scores
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('Usage: python task_io_jw.py JOURNAL_FILE [OUTPUT_CSV]\n       python task_io_jw.py --index-logs DATA_DIR [OUTPUT_CSV]')
+    if sys.argv[1] == '--index-logs':
+        dataDir = sys.argv[2] if len(sys.argv) > 2 else 'data'
+        outFile = sys.argv[3] if len(sys.argv) > 3 else os.path.join(dataDir, 'log_index.csv')
+        logs = indexLogs(dataDir)
+        logs.to_csv(outFile, index=False)
+        print('%i messages from %i log files saved to %s' % (len(logs), logs['file'].nunique() if len(logs) else 0, outFile))
+        sys.exit()
+    journalFile = sys.argv[1]
+    outFile = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(journalFile)[0] + '_recovered.csv'
+    compactJournal(journalFile, includePartial=True).to_csv(outFile)
+    print('Data from %s saved to %s' % (journalFile, outFile))
@@ -0,0 +1,5 @@
+# The task modules are kept in the folder above the tests (they are not a package), so it is added to the import path
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
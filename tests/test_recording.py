@@ -0,0 +1,51 @@
+"""
+Tests of the whole block recording file of recording_jw.py (without a microphone). Run with: python -m pytest
+"""
+import os
+import wave
+import numpy as np
+from recording_jw import HEADER_SIZE, SessionRecording, cutClips
+
+def test_recording_grows_and_is_cut_down_on_close(tmp_path):
+    path = str(tmp_path / 'P1_RECALL_RECORDING.npy')
+    recording = SessionRecording(path, sampleRate=1000, growSeconds=2, maxSeconds=10)
+    assert os.path.getsize(path) == HEADER_SIZE + 2000 * 4 # only growSeconds of room to start with, not maxSeconds
+    assert np.load(path).shape == (2000, 1)
+    samples = np.linspace(-1, 1, 7500, dtype=np.float32)
+    for i in range(0, 7500, 700): # chunks that cross the end of the file
+        recording.write(samples[i:i + 700], i)
+    assert len(recording.samples) == 8000 and recording.n == 7500
+    assert os.path.getsize(path) == HEADER_SIZE + 8000 * 4
+    recording.startTime = 100.0
+    recording.close()
+    assert os.path.getsize(path) == HEADER_SIZE + 7500 * 4
+    np.testing.assert_array_equal(np.load(path)[:, 0], samples)
+
+def test_recording_drops_samples_after_max_seconds(tmp_path):
+    recording = SessionRecording(str(tmp_path / 'r.npy'), sampleRate=1000, growSeconds=4, maxSeconds=10)
+    recording.write(np.zeros(12000))
+    assert (recording.n, recording.n_dropped, len(recording.samples)) == (10000, 2000, 10000)
+
+def test_recording_round_trip_and_clips(tmp_path):
+    path = str(tmp_path / 'r.npy')
+    recording = SessionRecording(path, sampleRate=1000, growSeconds=1)
+    recording.startTime = 10.0
+    recording.write(np.sin(np.arange(3000) / 10.0) / 2)
+    assert recording.mark(1, 'cue_onset', 10.5) == 500
+    assert recording.mark(1, 'click', 12.0) == 2000
+    recording.mark(2, 'cue_onset', 12.5) # quit before the click
+    clip = recording.itemClip(1)
+    recording.close()
+    opened = SessionRecording.open(path)
+    assert (opened.sampleRate, opened.n, opened.startTime) == (1000, 3000, 10.0)
+    assert opened.markers == [(1, 'cue_onset', 10.5, 500), (1, 'click', 12.0, 2000), (2, 'cue_onset', 12.5, 2500)]
+    np.testing.assert_array_equal(opened.itemClip(1).samples, clip.samples)
+    paths = cutClips(path)
+    assert [os.path.basename(p) for p in paths] == ['r_item01.wav']
+    with wave.open(paths[0]) as f:
+        assert (f.getframerate(), f.getnframes()) == (1000, 1500)
+
+def test_empty_recording(tmp_path):
+    path = str(tmp_path / 'r.npy')
+    SessionRecording(path).close()
+    assert np.load(path).shape == (0, 1)
@@ -0,0 +1,56 @@
+"""
+Tests of re-scoring the finger tapping output files with rescore_fingertapping_jw.py. Run with: python -m pytest
+"""
+import os
+import pandas as pd
+import rescore_fingertapping_jw as rescore
+from rescore_fingertapping_jw import findOutputFiles, rescoreFile
+
+# Function to write a finger tapping output file, as saved by the task (stream stored as a stringified list)
+def writeOutput(data_dir, streams, n_correct, name='P1_AJX_S1_pm-a.csv'):
+    p_dir = os.path.join(data_dir, 'P1')
+    os.makedirs(p_dir, exist_ok=True)
+    path = os.path.join(p_dir, name)
+    pd.DataFrame({'participant': 1, 'session': 1, 'target_sequence': '41324', 'sequence_type': 'sequence_1',
+                  'trial': range(1, len(streams) + 1), 'stream': [str(s) for s in streams], 'n_correct': n_correct}).to_csv(path)
+    return path
+
+# Function to run the script on a data folder with one worker process, recording which files were re-scored
+def runRescore(data_dir, monkeypatch):
+    rescored = []
+    monkeypatch.setattr(rescore, 'rescoreFile', lambda path, file_hash: rescored.append(os.path.basename(path)) or rescoreFile(path, file_hash))
+    rescore.main(['--data-dir', data_dir, '--jobs', '1'])
+    return pd.read_csv(os.path.join(data_dir, 'rescored_summary.csv'), dtype={'target_sequence': str}), rescored
+
+def test_stored_n_correct_that_differs_is_flagged(tmp_path, monkeypatch):
+    writeOutput(str(tmp_path), [[4, 1, 3, 2, 4, 4, 1, 3, 2, 4], [4, 1, 3, 2, 4, 1]], [2, 3])
+    summary, rescored = runRescore(str(tmp_path), monkeypatch)
+    assert list(summary['n_correct']) == [2, 1]
+    assert list(summary['n_correct_mismatch']) == [False, True]
+
+def test_unchanged_file_is_skipped_and_modified_file_is_rescored(tmp_path, monkeypatch):
+    data_dir = str(tmp_path)
+    path = writeOutput(data_dir, [[4, 1, 3, 2, 4]], [1])
+    writeOutput(data_dir, [[4, 1, 3, 2, 4]], [1], name='P1_AJX_S2_am-a.csv')
+    summary, rescored = runRescore(data_dir, monkeypatch)
+    assert rescored == ['P1_AJX_S1_pm-a.csv', 'P1_AJX_S2_am-a.csv']
+    summary, rescored = runRescore(data_dir, monkeypatch)  # same size, mtime and hash
+    assert rescored == [] and list(summary['n_correct']) == [1, 1]
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))  # e.g. copied: new mtime, same contents
+    summary, rescored = runRescore(data_dir, monkeypatch)
+    assert rescored == []
+    writeOutput(data_dir, [[4, 1, 3, 2, 4, 4, 1, 3, 2, 4]], [2])  # new data
+    summary, rescored = runRescore(data_dir, monkeypatch)
+    assert rescored == ['P1_AJX_S1_pm-a.csv']
+    assert list(summary.sort_values('source_file')['n_correct']) == [2, 1] and not summary['n_correct_mismatch'].any()
+
+def test_find_output_files_skips_other_csv_files(tmp_path):
+    p_dir = tmp_path / 'P1'
+    p_dir.mkdir()
+    names = ['P1_AJX_S1_pm-a.csv', 'P1_AJX_S1_pm-a_2.csv', 'P1_S1_am_PRACTICE.csv', 'P1_AJX_S1_pm-a_quitExp.csv', 'P1_AJX_S1_pm-a_quitExp_2.csv',
+             'P1_AJX_S1_pm-a_frame_timing.csv', 'P1_S1_am_PRACTICE_frame_timing_3.csv', 'P1_AJX_S1_pm-a_journal.jsonl', 'P1_AJX_log.txt']
+    for name in names:
+        (p_dir / name).write_text('')
+    found = [os.path.basename(p) for p in findOutputFiles(str(tmp_path))]
+    assert found == ['P1_AJX_S1_pm-a.csv', 'P1_AJX_S1_pm-a_2.csv', 'P1_S1_am_PRACTICE.csv']
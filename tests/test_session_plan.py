@@ -0,0 +1,93 @@
+"""
+Tests of the session plans compiled by session_plan_jw.py before the window opens. Run with: python -m pytest
+"""
+import os
+import random
+import numpy as np
+import pytest
+from session_plan_jw import ALLOCATIONS, N_DUMMY, SESSION_TIMES, SHEETS, TAPPING_SCHEDULE, compileTappingPlan, compileWordPlan, shuffleWords
+from word_bank_jw import WordBank
+
+# Function to make the session details entered in the first dialogue box
+def sessionDetails(allocation='AJX', session=1, sessionTime='pm-a', practice=False):
+    return {'participant': '12', 'session number': session, 'session time': sessionTime, 'practice mode': practice,
+            'use automated counter-balancing': allocation is not None, 'participant allocation': allocation}
+
+# Function to make a word bank with the layout of wordlists_audio.xlsx, with words that show which worksheet and row they are from
+def wordBank():
+    cue = [np.array(['CUE%i_%i' % (s, i) for i in range(n)]) for s, (name, n) in enumerate(SHEETS)]
+    recall = [np.array(['RECALL%i_%i' % (s, i) for i in range(n)]) for s, (name, n) in enumerate(SHEETS)]
+    return WordBank([name for name, n in SHEETS], cue, recall)
+
+@pytest.fixture(autouse=True)
+def inTmpDir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # the plans name their output files relative to the working directory
+
+def test_tapping_plan_automated():
+    plan = compileTappingPlan(sessionDetails('AJX', 1, 'pm-a'))
+    assert plan['allocation'] == 'AJX' and not plan['practice']
+    block, = plan['blocks']
+    assert (block['sequence_type'], block['target_sequence']) == ('sequence_1', '41324')
+    assert [t['trial'] for t in block['trials']] == list(range(1, 13))
+    assert [t['rest_seconds'] for t in block['trials']] == [10] + [30] * 11
+    assert all(t['tapping_seconds'] == 30 for t in block['trials'])
+    base = os.path.join('data', 'fingertapping', 'P12', 'P12_AJX_S1_pm-a')
+    assert plan['paths']['data'] == base + '.csv'
+    assert plan['paths']['journal'] == base + '_journal.jsonl'
+    assert plan['paths']['quit'] == base + '_quitExp.csv'
+
+@pytest.mark.parametrize('allocation', ALLOCATIONS)
+@pytest.mark.parametrize('session', [1, 2])
+@pytest.mark.parametrize('sessionTime', SESSION_TIMES)
+def test_tapping_plan_follows_schedule(allocation, session, sessionTime):
+    block, = compileTappingPlan(sessionDetails(allocation, session, sessionTime))['blocks']
+    sequenceType, nTrials = TAPPING_SCHEDULE[(ALLOCATIONS[allocation], session, sessionTime)]
+    assert block['sequence_type'] == sequenceType
+    assert len(block['trials']) == nTrials
+
+def test_tapping_plan_data_file_names_the_other_files():
+    dataFile = os.path.join('data', 'fingertapping', 'P12', 'P12_AJX_S1_pm-a_2.csv')
+    plan = compileTappingPlan(sessionDetails(), dataFile=dataFile)
+    assert plan['paths']['journal'] == dataFile[:-4] + '_journal.jsonl'
+    assert plan['paths']['frame_timing'] == dataFile[:-4] + '_frame_timing.csv'
+
+def test_tapping_plan_practice_and_manual():
+    plan = compileTappingPlan(sessionDetails(practice=True), nTrials=2)
+    assert plan['practice'] and plan['blocks'][0]['target_sequence'] == '12344' and len(plan['blocks'][0]['trials']) == 2
+    plan = compileTappingPlan(sessionDetails(None), sequenceType='sequence_2', nTrials=3)
+    assert plan['allocation'] == 'manual_selection' and plan['blocks'][0]['target_sequence'] == '42314'
+    with pytest.raises(ValueError):
+        compileTappingPlan(sessionDetails(None), sequenceType='sequence_2') # no number of trials
+    with pytest.raises(ValueError):
+        compileTappingPlan(sessionDetails('ZZZ'))
+
+def test_word_plan_learning_session():
+    plan = compileWordPlan(sessionDetails('AJX', 1, 'pm-a'), workbook=wordBank())
+    learning, recall = plan['blocks']
+    assert (learning['task'], learning['wordlist'], recall['task'], recall['wordlist']) == ('learning', 'wordlist_1', 'recall', 'wordlist_1')
+    assert recall['feedback']
+    # the word order is random, but the pairs stay matched, and every word pair is used once
+    assert sorted(learning['cue_words']) == sorted('CUE0_%i' % i for i in range(46))
+    assert all(c.replace('CUE', '') == r.replace('RECALL', '') for c, r in zip(learning['cue_words'], learning['recall_words']))
+    assert sorted(learning['dummy_cue_words']) == sorted('CUE3_%i' % i for i in range(N_DUMMY))
+    assert len(recall['audio_paths']) == 46
+    assert recall['audio_paths'][0] == '%s_%s_%s.wav' % (recall['paths']['audio_prefix'], recall['cue_words'][0], recall['recall_words'][0])
+    assert plan['paths']['data'] == os.path.join('data', 'wordlearning', 'P12', 'P12_AJX_S1_pm-a.csv')
+
+def test_word_plan_recall_session():
+    plan = compileWordPlan(sessionDetails('AKY', 2, 'am'))
+    block, = plan['blocks']
+    assert (block['task'], block['wordlist'], block['feedback']) == ('recall', 'wordlist_1', False)
+    assert 'cue_words' not in block # no workbook, so the word order is worked out later
+
+def test_word_plan_practice():
+    plan = compileWordPlan(sessionDetails(practice=True), taskType='word recall', workbook=wordBank())
+    block, = plan['blocks']
+    assert plan['paths']['data'] is None # practice sessions only save the word order and audio files
+    assert (block['wordlist'], len(block['cue_words'])) == ('wordlist_prac', 8)
+
+def test_shuffle_words_new_order_each_time():
+    plan = compileWordPlan(sessionDetails('AJX', 1, 'pm-b'))
+    first = list(shuffleWords(plan, wordBank(), random.Random(1))['blocks'][0]['cue_words'])
+    second = list(shuffleWords(plan, wordBank(), random.Random(2))['blocks'][0]['cue_words'])
+    assert sorted(first) == sorted(second) and first != second
@@ -0,0 +1,130 @@
+"""
+Tests of the stream scoring functions in tapping_analysis_jw.py. patternDetect is the reference: every other scorer must give the same
+n_correct, errors and accuracy for any stream. Run with: python -m pytest
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from tapping_analysis_jw import OnlineScorer, SequenceScanner, batchPatternDetect, patternDetect, tapTiming, tapTimingSummary
+
+TARGET = '41324'
+TARG = [4, 1, 3, 2, 4]
+
+# Function to make a random stream that looks like a participant's: mostly correct sequences, with wrong keys, repeated keys and
+# a partial sequence at the end
+def randomStream(rng, maxChunks=12):
+    stream = []
+    for c in range(rng.integers(0, maxChunks + 1)):
+        kind = rng.random()
+        if kind < 0.5:
+            stream += TARG
+        elif kind < 0.8:
+            stream += rng.integers(1, 5, rng.integers(1, 8)).tolist()
+        else:
+            stream += TARG[:rng.integers(1, len(TARG))]
+    return stream
+
+# Function to check that two sets of scores are the same (accuracy is NaN when n_correct is zero)
+def assertScoresEqual(scores, expected):
+    for col in ['n_correct', 'errors', 'accuracy']:
+        np.testing.assert_allclose(scores[col], expected[col], equal_nan=True, err_msg=col)
+
+@pytest.mark.parametrize('stream, n_correct, errors', [
+    (TARG * 3, 3, 0),
+    ([1] * 5 + TARG, 1, 1), # 5 contiguous errors count as one error
+    ([1] * 6 + TARG, 1, 2), # then one more for the leftover when the next sequence starts
+    ([1] * 10 + TARG, 1, 2),
+    ([1] * 11 + TARG, 1, 3),
+    (TARG + [4, 1, 3], 1.6, 0), # partial final sequence
+    (TARG + [2, 4, 1], 1.4, 1), # wrong key before the partial final sequence
+    (TARG + [2, 2], 1, 1), # wrong keys at the end of the stream
+])
+def test_pattern_detect_rules(stream, n_correct, errors):
+    scores = patternDetect(stream, TARGET)
+    assert scores['n_correct'] == pytest.approx(n_correct)
+    assert scores['errors'] == errors
+    assert scores['accuracy'] == pytest.approx(1 - errors / n_correct)
+
+def test_pattern_detect_no_correct_sequence():
+    assert np.isnan(patternDetect([1, 1, 1], TARGET)['accuracy'])
+
+@pytest.mark.parametrize('seed', range(5))
+def test_batch_matches_pattern_detect(seed):
+    rng = np.random.default_rng(seed)
+    streams = [randomStream(rng) for s in range(300)] + [[], [4], TARG[:4]]
+    expected = [patternDetect(s, TARGET) for s in streams]
+    scores = batchPatternDetect(streams, TARGET)
+    assertScoresEqual(scores, {col: [e[col] for e in expected] for col in ['n_correct', 'errors', 'accuracy']})
+
+def test_batch_with_offsets_matches_list():
+    rng = np.random.default_rng(1)
+    streams = [randomStream(rng) for s in range(50)]
+    flat = np.array([k for s in streams for k in s], dtype=np.int8)
+    offsets = np.cumsum([0] + [len(s) for s in streams])
+    assertScoresEqual(batchPatternDetect(flat, TARGET, offsets=offsets), batchPatternDetect(streams, TARGET))
+
+@pytest.mark.parametrize('seed', range(3))
+def test_online_scorer_matches_pattern_detect(seed):
+    rng = np.random.default_rng(seed)
+    scorer = OnlineScorer(TARGET)
+    for s in range(100):
+        stream = randomStream(rng)
+        scorer.reset()
+        assertScoresEqual(scorer.score(), patternDetect([], TARGET))
+        for i, tap in enumerate(stream):  # the scores so far must be right after every key press, not just at the end
+            scorer.addTap(tap)
+            assertScoresEqual(scorer.score(), patternDetect(stream[:i + 1], TARGET))
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sequence_scanner_matches_pattern_detect(seed):
+    rng = np.random.default_rng(seed)
+    targets = {'targ_seq_1': '41324', 'targ_seq_2': '42314', 'prac_seq': '12344', 'short': '44'}
+    scanner = SequenceScanner(targets)
+    for s in range(200):
+        stream = randomStream(rng)
+        results = scanner.scan(stream)
+        # every match, including overlapping ones, found by brute force
+        for name, seq in targets.items():
+            seq = list(map(int, seq))
+            positions = [i for i in range(len(stream) - len(seq) + 1) if stream[i:i + len(seq)] == seq]
+            assert results[name]['positions'] == positions
+            assert results[name]['count'] == len(positions)
+        # the complete sequences patternDetect counts (n_correct without the partial final sequence)
+        assert results['targ_seq_1']['n_nonoverlapping'] == int(patternDetect(stream, TARGET)['n_correct'])
+
+# a trial with two correct sequences and an error between them (the 2 at 2.0 s), and the time of each key press
+TIMED_STREAM = [4, 1, 3, 2, 4, 2, 4, 1, 3, 2, 4]
+TIMED_TAPS = [0.0, 0.2, 0.5, 0.9, 1.4, 2.0, 2.1, 2.4, 2.6, 2.9, 3.1]
+
+def test_tap_timing():
+    timing = tapTiming(TIMED_STREAM, TIMED_TAPS, TARGET)
+    np.testing.assert_allclose(timing['iti'], [0.2, 0.3, 0.4, 0.5, 0.6, 0.1, 0.3, 0.2, 0.3, 0.2])
+    assert timing['transition_latency'] == pytest.approx({'4-1': 0.25, '1-3': 0.25, '3-2': 0.35, '2-4': (0.5 + 0.1 + 0.2) / 3, '4-2': 0.6})
+    # only the intervals within each correct sequence, not the 4->2 and 2->4 around the error
+    np.testing.assert_allclose(timing['sequence_transitions'], [[0.2, 0.3, 0.4, 0.5], [0.3, 0.2, 0.3, 0.2]])
+    np.testing.assert_allclose(timing['sequence_durations'], [1.4, 1.0])
+
+def test_tap_timing_no_correct_sequence():
+    timing = tapTiming([1, 2, 3, 4], [0.0, 0.3, 0.5, 1.0], TARGET)
+    np.testing.assert_allclose(timing['iti'], [0.3, 0.2, 0.5])
+    assert timing['sequence_transitions'].shape == (0, 4) and len(timing['sequence_durations']) == 0
+
+def test_tap_timing_summary():
+    trials = pd.DataFrame({'trial': [1, 2],
+                           'stream': [str(TIMED_STREAM), '[1, 2, 3, 4]'], # as saved in the csv files
+                           'tap_times': [str(TIMED_TAPS), '[0.0, 0.3, 0.5, 1.0]'],
+                           'target_sequence': [TARGET, TARGET]})
+    summary = tapTimingSummary(trials)
+    assert list(summary['trial']) == [1, 2] and list(summary['n_taps']) == [11, 4] and list(summary['n_sequences']) == [2, 0]
+    row = summary.iloc[0]
+    iti = np.diff(TIMED_TAPS)
+    assert row['iti_mean'] == pytest.approx(iti.mean())
+    assert row['iti_median'] == pytest.approx(np.median(iti))
+    assert row['iti_sd'] == pytest.approx(np.std(iti, ddof=1))
+    assert row['sequence_duration_mean'] == pytest.approx(1.2) and row['sequence_duration_median'] == pytest.approx(1.2)
+    latencies = ['latency_4-1_1', 'latency_1-3_2', 'latency_3-2_3', 'latency_2-4_4']
+    np.testing.assert_allclose(row[latencies].astype(float), [0.25, 0.25, 0.35, 0.35])
+    # no correct sequences: the intervals are still summarised, the sequence measures are blank
+    row = summary.iloc[1]
+    assert row['iti_mean'] == pytest.approx(1.0 / 3)
+    assert np.isnan(row['sequence_duration_mean']) and row[latencies].isna().all()
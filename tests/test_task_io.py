@@ -0,0 +1,247 @@
+"""
+Tests of the data files written by task_io_jw.py: the trial journal (and recovering the data from it) and the binary stream file.
+Run with: python -m pytest
+"""
+import json
+import os
+import threading
+import wave
+import numpy as np
+import pandas as pd
+import pytest
+import task_io_jw
+from recording_jw import RecordingClip
+from tapping_analysis_jw import OnlineScorer, batchPatternDetect, patternDetect
+from task_io_jw import AudioWriter, StreamStore, TaskLog, TrialJournal, TrialWorker, compactJournal, readJournal, saveStreams
+
+# Function to write a journal as the finger tapping task does: the session, checkpoints of the key presses during each trial, then
+# the complete trial (written by the trial worker)
+def writeJournal(path, blocks, quitTrial=None):
+    journal = TrialJournal(path)
+    journal.append({'type': 'session', 'participant': '1'})
+    for sequenceType, trials in blocks:
+        for t in trials:
+            stream = [4, 1, 3, 2, 4] * t
+            journal.append({'type': 'taps', 'sequence_type': sequenceType, 'trial': t, 'stream': stream[:5], 'tap_times': [0.1] * 5})
+            if (sequenceType, t) == quitTrial:
+                journal.append({'type': 'quit', 'sequence_type': sequenceType, 'trial': t, 'stream': stream[5:], 'tap_times': [0.2] * (len(stream) - 5)})
+                journal.close()
+                return
+            journal.append({'type': 'taps', 'sequence_type': sequenceType, 'trial': t, 'stream': stream[5:], 'tap_times': [0.2] * (len(stream) - 5)})
+            journal.append({'type': 'trial', 'sequence_type': sequenceType, 'trial': t, 'stream': stream, 'n_correct': float(t),
+                            'tap_times': np.array([0.1] * len(stream))}) # numpy values are saved as lists
+    journal.close()
+
+def test_journal_round_trip(tmp_path):
+    path = str(tmp_path / 'P1_journal.jsonl')
+    writeJournal(path, [('sequence_1', [1, 2])])
+    records = readJournal(path)
+    assert [r['type'] for r in records] == ['session', 'taps', 'taps', 'trial', 'taps', 'taps', 'trial']
+    assert records[-1]['stream'] == [4, 1, 3, 2, 4] * 2
+    assert records[-1]['tap_times'] == [0.1] * 10
+
+def test_journal_skips_line_cut_off_by_crash(tmp_path):
+    path = str(tmp_path / 'P1_journal.jsonl')
+    writeJournal(path, [('sequence_1', [1])])
+    with open(path, 'a') as f:
+        f.write('{"type": "taps", "trial": 2, "str')
+    assert len(readJournal(path)) == 4
+    assert compactJournal(path)['trial'].tolist() == [1]
+
+def test_compact_journal_complete_trials(tmp_path):
+    path = str(tmp_path / 'P1_journal.jsonl')
+    writeJournal(path, [('sequence_1', [1, 2, 3])])
+    df = compactJournal(path)
+    assert df['trial'].tolist() == [1, 2, 3]
+    assert df['n_correct'].tolist() == [1.0, 2.0, 3.0]
+    assert 'trial_complete' not in df.columns
+
+def test_compact_journal_recovers_quit_trial(tmp_path):
+    path = str(tmp_path / 'P1_journal.jsonl')
+    writeJournal(path, [('sequence_1', [1, 2, 3])], quitTrial=('sequence_1', 3))
+    assert compactJournal(path)['trial'].tolist() == [1, 2]
+    df = compactJournal(path, includePartial=True)
+    assert df['trial'].tolist() == [1, 2, 3]
+    assert df['trial_complete'].tolist() == [True, True, False]
+    partial = df.iloc[2]
+    assert partial['stream'] == [4, 1, 3, 2, 4] * 3 # the key presses of every checkpoint, in order
+    assert partial['tap_times'] == [0.1] * 5 + [0.2] * 10
+
+def test_compact_journal_keeps_blocks_apart(tmp_path):
+    path = str(tmp_path / 'P1_journal.jsonl')
+    writeJournal(path, [('sequence_1', [1, 2]), ('practice', [1, 2])], quitTrial=('practice', 2))
+    df = compactJournal(path, includePartial=True)
+    assert list(zip(df['sequence_type'], df['trial'], df['trial_complete'])) == [('sequence_1', 1, True), ('sequence_1', 2, True),
+                                                                                ('practice', 1, True), ('practice', 2, False)]
+
+# Function to make the trials of a session, as in the output csv (streams and tap times as lists, or as saved in the csv file)
+def randomTrials(rng, n=20, asText=False):
+    streams = [rng.integers(1, 5, rng.integers(0, 200)).tolist() for r in range(n)] # including an odd length and empty streams
+    streams[0] = []
+    times = [np.round(np.cumsum(rng.random(len(s))), 6).tolist() for s in streams]
+    return pd.DataFrame({'participant': '1', 'trial': np.arange(1, n + 1), 'target_sequence': '41324', 'n_correct': rng.random(n) * 20,
+                         'stream': [str(s) if asText else s for s in streams], 'tap_times': [str(t) if asText else t for t in times]})
+
+@pytest.mark.parametrize('packing', ['uint8', '2bit'])
+@pytest.mark.parametrize('mmap', [True, False])
+@pytest.mark.parametrize('asText', [False, True])
+def test_streams_round_trip(tmp_path, packing, mmap, asText):
+    rng = np.random.default_rng(0)
+    trials = randomTrials(rng, asText=asText)
+    expected = randomTrials(np.random.default_rng(0))
+    path = str(tmp_path / 'streams.npz')
+    saveStreams(path, trials, metaData={'participant': '1', 'session': np.int64(2)}, packing=packing)
+    store = StreamStore(path, mmap=mmap)
+    assert len(store) == len(trials)
+    assert store.metadata == {'participant': '1', 'session': 2}
+    for r in range(len(store)):
+        assert store.stream(r).tolist() == expected['stream'][r]
+        np.testing.assert_array_equal(store.tap_times[store.offsets[r]:store.offsets[r + 1]], expected['tap_times'][r])
+    for col in ['participant', 'trial', 'target_sequence', 'n_correct']:
+        assert store.trials[col].tolist() == expected[col].tolist()
+
+def test_streams_2bit_is_smaller(tmp_path):
+    trials = randomTrials(np.random.default_rng(0), n=50).drop(columns='tap_times')
+    saveStreams(str(tmp_path / 'uint8.npz'), trials)
+    saveStreams(str(tmp_path / '2bit.npz'), trials, packing='2bit')
+    n_taps = sum(len(s) for s in trials['stream'])
+    assert StreamStore(str(tmp_path / '2bit.npz')).taps.tolist() == StreamStore(str(tmp_path / 'uint8.npz')).taps.tolist()
+    assert (tmp_path / 'uint8.npz').stat().st_size - (tmp_path / '2bit.npz').stat().st_size >= n_taps * 3 // 4 - 8
+
+def test_streams_2bit_rejects_other_keys(tmp_path):
+    trials = pd.DataFrame({'trial': [1], 'stream': [[1, 2, 5]]})
+    with pytest.raises(ValueError):
+        saveStreams(str(tmp_path / 'streams.npz'), trials, packing='2bit')
+
+def test_stream_store_score(tmp_path):
+    trials = randomTrials(np.random.default_rng(3))
+    trials.loc[::2, 'target_sequence'] = '42314'
+    path = str(tmp_path / 'streams.npz')
+    saveStreams(path, trials, packing='2bit')
+    scores = StreamStore(path).score()
+    for r, (stream, targ) in enumerate(zip(trials['stream'], trials['target_sequence'])):
+        expected = batchPatternDetect([stream], targ)
+        np.testing.assert_allclose(scores.loc[r].values.astype(float), [expected[c][0] for c in ['n_correct', 'errors', 'accuracy']], equal_nan=True)
+
+def test_task_log_phase_of_background_messages(tmp_path):
+    path = str(tmp_path / 'P1_log.txt')
+    log = TaskLog(path)
+    log.setPhase('tapping', 1)
+    log.log('Trial: 1')
+    log.setPhase('rest', 2)
+    # e.g. the trial worker reporting trial 1 once the next rest period has started
+    thread = threading.Thread(target=log.log, args=('Trial 1 complete',), kwargs={'phase': 'tapping', 'trial': 1})
+    thread.start()
+    thread.join()
+    log.log('Resting')
+    log.log('----', 0)
+    log.close()
+    with open(str(tmp_path / 'P1_log.jsonl')) as f:
+        records = [json.loads(line) for line in f]
+    assert [(r['message'], r['phase'], r['trial']) for r in records] == [('Trial: 1', 'tapping', 1), ('Trial 1 complete', 'tapping', 1),
+                                                                          ('Resting', 'rest', 2), ('----', 'rest', 2)]
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith('Trial: 1// logged at ') and lines[-1] == '----'
+
+# Function to make a finished trial, as handed to the trial worker by the task
+def finishedTrial(t, stream):
+    return {'participant': '1', 'target_sequence': '41324', 'sequence_type': 'sequence_1', 'trial': t, 'stream': stream,
+            'tap_times': [0.1 * k for k in range(len(stream))]}
+
+def test_trial_worker_scores_stores_and_saves_in_order(tmp_path):
+    path = str(tmp_path / 'P1_journal.jsonl')
+    journal = TrialJournal(path)
+    worker = TrialWorker(journal, scoreColumns=['n_correct', 'errors'])
+    streams = [[4, 1, 3, 2, 4] * t + [1] for t in (1, 2, 3)]
+    for t, stream in enumerate(streams, 1):
+        worker.submit(finishedTrial(t, stream))
+    assert worker.wait() >= 0 and worker.done()
+    df = worker.frame()
+    assert list(df.columns) == ['participant', 'target_sequence', 'sequence_type', 'trial', 'stream', 'tap_times', 'n_correct', 'errors']
+    assert df['trial'].tolist() == [1, 2, 3]
+    assert df['stream'].tolist() == streams
+    assert df['n_correct'].tolist() == [1, 2, 3] and df['errors'].tolist() == [1, 1, 1]
+    worker.close()
+    journal.close()
+    trials = [r for r in readJournal(path) if r['type'] == 'trial']
+    assert [(r['trial'], r['n_correct']) for r in trials] == [(1, 1), (2, 2), (3, 3)]
+
+def test_trial_worker_calls_on_done_once_trial_is_saved(tmp_path):
+    path = str(tmp_path / 'P1_journal.jsonl')
+    journal = TrialJournal(path)
+    done = []
+    # the trial is already on disk (the journal was synced) when onDone is called, on the worker's thread
+    onDone = lambda trial, seconds: done.append((trial['trial'], trial['n_correct'], seconds >= 0, threading.current_thread().name,
+                                                 [r['trial'] for r in readJournal(path) if r['type'] == 'trial']))
+    worker = TrialWorker(journal, onDone=onDone)
+    worker.submit(finishedTrial(1, [4, 1, 3, 2, 4]))
+    worker.wait()
+    assert done == [(1, 1, True, 'TrialWorker', [1])]
+    worker.submit(finishedTrial(2, [4, 1, 3, 2, 4] * 2))
+    worker.wait()
+    assert done[1] == (2, 2, True, 'TrialWorker', [1, 2])
+    worker.close()
+    journal.close()
+
+def test_trial_worker_uses_scores_of_online_scorer(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_io_jw, 'patternDetect', lambda *args: pytest.fail('trial scored again'))
+    journal = TrialJournal(str(tmp_path / 'P1_journal.jsonl'))
+    worker = TrialWorker(journal, scoreColumns=['n_correct', 'accuracy'])
+    stream = [4, 1, 3, 2, 4, 4, 1, 3]
+    scorer = OnlineScorer('41324')
+    for tap in stream:
+        scorer.addTap(tap)
+    worker.submit(finishedTrial(1, stream), scorer.score())
+    worker.wait()
+    worker.close()
+    journal.close()
+    expected = patternDetect(stream, '41324')
+    assert worker.frame()[['n_correct', 'accuracy']].values.tolist() == [[expected['n_correct'], expected['accuracy']]]
+
+def test_trial_worker_wait_raises_error_of_failed_trial(tmp_path):
+    def onDone(trial, seconds):
+        if trial['trial'] == 2:
+            raise OSError('disk full')
+    journal = TrialJournal(str(tmp_path / 'P1_journal.jsonl'))
+    worker = TrialWorker(journal, onDone=onDone)
+    worker.submit(finishedTrial(1, [4, 1, 3, 2, 4]))
+    worker.wait()
+    worker.submit(finishedTrial(2, [4, 1, 3, 2, 4]))
+    with pytest.raises(OSError, match='disk full'):
+        worker.wait()
+    with pytest.raises(OSError, match='disk full'):
+        worker.close()
+    journal.close()
+    with pytest.raises(RuntimeError):
+        worker.submit(finishedTrial(3, []))
+
+def test_trial_worker_close_raises_error_of_failed_trial(tmp_path):
+    journal = TrialJournal(str(tmp_path / 'P1_journal.jsonl'))
+    worker = TrialWorker(journal, onDone=lambda trial, seconds: 1 / 0)
+    worker.submit(finishedTrial(1, [4, 1, 3, 2, 4]))  # e.g. quit before the next trial: wait() is never called
+    with pytest.raises(ZeroDivisionError):
+        worker.close()
+    journal.close()
+    worker.close()  # already closed
+
+def test_audio_writer_processes_recordings_on_its_thread(tmp_path):
+    done = []
+    def process(clip, info):
+        info['thread'] = threading.current_thread().name
+        if info['item'] == 2:
+            raise ValueError('no speech detection')
+        return RecordingClip(clip.samples[:50], clip.sampleRate) # e.g. trimmed
+    writer = AudioWriter(onDone=lambda path, seconds, error, info: done.append((os.path.basename(path), error, info['item'])), process=process)
+    infos = [{'phase': 'recall', 'trial': 1, 'item': i} for i in (1, 2)]
+    for info in infos:
+        writer.submit(RecordingClip(np.zeros((100, 1), dtype=np.float32), 1000), str(tmp_path / ('item%i.wav' % info['item'])), info)
+    assert writer.close()
+    assert done == [('item1.wav', None, 1), ('item2.wav', None, 2)]
+    assert [info['thread'] for info in infos] == ['AudioWriter', 'AudioWriter']
+    frames = []
+    for i in (1, 2):
+        with wave.open(str(tmp_path / ('item%i.wav' % i))) as f:
+            frames.append(f.getnframes())
+    assert frames == [50, 100] # a recording that could not be processed is written as it is
+    assert '1 not processed' in writer.report()
@@ -0,0 +1,84 @@
+"""
+Tests of the voice onset and speech detection of voice_onset_jw.py on synthetic recordings. Run with: python -m pytest
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from voice_onset_jw import StreamingVAD, detectOnset, readWordOrder, responseTimes
+
+RATE = 44100
+
+# Function to make a recording: background noise, with a tone (the response) from onset to offset seconds
+def recording(seconds=3.0, onset=1.0, offset=1.8, seed=0):
+    samples = np.random.default_rng(seed).normal(0, 0.001, int(seconds * RATE)).astype(np.float32)
+    t = np.arange(int(onset * RATE), int(offset * RATE))
+    samples[t] += 0.3 * np.sin(2 * np.pi * 220 * t / RATE)
+    return samples
+
+@pytest.mark.parametrize('onset', [1.0, 0.5123, 1.4])
+def test_detect_onset_of_tone_after_silence(onset):
+    result = detectOnset(recording(onset=onset), RATE, hopMs=5)
+    assert result['onset_ms'] == pytest.approx(1000 * onset, abs=5)  # within one hop
+    assert result['confidence'] > 0.5 and result['flag'] == ''
+
+def test_detect_onset_no_speech():
+    result = detectOnset(recording(onset=0, offset=0), RATE)
+    assert np.isnan(result['onset_ms']) and result['confidence'] == 0 and result['flag'] == 'no speech'
+
+# Function to write a small word order file, as saved by the recall task
+def writeWordOrder(folder, **columns):
+    path = os.path.join(folder, 'P1_S2_RECALL_WORD_ORDER.csv')
+    pd.DataFrame(dict({'cue_word': ['DOG', 'SUN'], 'response_word': ['CAT', 'MOON'], 'cue_word_times': [10000.0, 20000.0],
+                       'mic_start_times': [10050.0, 20020.0]}, **columns)).to_csv(path)
+    return path
+
+def test_response_times_from_word_order_file(tmp_path):
+    path = writeWordOrder(str(tmp_path))
+    df = readWordOrder(path)
+    assert list(df['source_file']) == [path, path]
+    assert list(df['audio_path']) == [str(tmp_path / 'P1_S2_DOG_CAT.wav'), str(tmp_path / 'P1_S2_SUN_MOON.wav')]
+    df['onset_ms'] = [400.0, np.nan]
+    rt = responseTimes(df)['rt_ms']
+    # the recording starts at mic.start(), 50 ms after the cue onset
+    assert rt[0] == pytest.approx(450) and np.isnan(rt[1])
+
+def test_response_times_add_trimmed_silence(tmp_path):
+    df = readWordOrder(writeWordOrder(str(tmp_path), audio_file=['a.wav', 'b.wav'], trim_start_ms=[250.0, np.nan]))
+    assert list(df['audio_path']) == [str(tmp_path / 'a.wav'), str(tmp_path / 'b.wav')]
+    df['onset_ms'] = [400.0, 300.0]
+    # the silence trimmed from the start of the file is added back (none was trimmed from the second file)
+    np.testing.assert_allclose(responseTimes(df)['rt_ms'], [250 + 50 + 400, 20 + 300])
+
+def test_streaming_vad_finds_speech():
+    vad = StreamingVAD(RATE)
+    vad.feed(recording())
+    vad.finish()
+    assert len(vad.segments) == 1
+    assert vad.onsetMs == pytest.approx(1000, abs=10)
+    start, end = vad.segments[0]
+    assert end / RATE == pytest.approx(1.8, abs=0.02)
+    assert vad.trimBounds(3 * RATE) == (start - RATE // 4, end + RATE // 4)
+
+def test_streaming_vad_same_result_however_it_is_fed():
+    samples = recording()
+    whole = StreamingVAD(RATE)
+    whole.feed(samples)
+    whole.finish()
+    # fed in uneven pieces while waiting for the mouse click (at most maxBlocks blocks each), and the rest up to the click at the end
+    vad = StreamingVAD(RATE, maxBlocks=5)
+    fed = 0
+    rng = np.random.default_rng(1)
+    while fed < len(samples) // 2:
+        size = rng.integers(1, 3000)
+        vad.feed(samples[fed:fed + size])
+        fed += size
+    vad.feed(samples[fed:])
+    vad.finish()
+    assert vad.segments == whole.segments
+
+def test_streaming_vad_no_speech():
+    vad = StreamingVAD(RATE)
+    vad.feed(recording(onset=0, offset=0))
+    vad.finish()
+    assert vad.segments == [] and np.isnan(vad.onsetMs) and vad.trimBounds(3 * RATE) is None
@@ -0,0 +1,130 @@
+"""
+Tests of word_bank_jw.py: the workbook is only read again when it has changed, and the word lists drawn from a word store.
+Run with: python -m pytest
+"""
+import os
+import random
+import shutil
+import numpy as np
+import pytest
+import word_bank_jw
+from word_bank_jw import WordStore, cachePath, loadWordBank
+
+WORKBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'wordlists_audio.xlsx')
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / 'wordlists_audio.xlsx')
+    shutil.copyfile(WORKBOOK, path)
+    return path
+
+def test_cache_is_created_and_used(workbook):
+    bank = loadWordBank(workbook)
+    assert not bank.fromCache and os.path.exists(cachePath(workbook))
+    cached = loadWordBank(workbook)
+    assert cached.fromCache
+    assert cached.sheetNames == bank.sheetNames
+    for s in range(len(bank)):
+        assert cached.words(s) == bank.words(s)
+
+def test_cache_is_rebuilt_when_workbook_changes(workbook):
+    openpyxl = pytest.importorskip('openpyxl')
+    cue, recall = loadWordBank(workbook).words(0, 1)
+    book = openpyxl.load_workbook(workbook)
+    book.worksheets[0]['A1'] = 'CHANGEDWORD'
+    book.save(workbook)
+    bank = loadWordBank(workbook)
+    assert not bank.fromCache
+    assert bank.words(0, 1) == (['CHANGEDWORD'], recall)
+    assert loadWordBank(workbook).fromCache
+
+def test_copied_workbook_is_checked_by_hash(workbook, monkeypatch):
+    loadWordBank(workbook)
+    stat = os.stat(workbook)
+    os.utime(workbook, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9)) # e.g. copied to the lab computer: same contents, new mtime
+    hashes = []
+    fileHash = word_bank_jw.fileHash
+    monkeypatch.setattr(word_bank_jw, 'fileHash', lambda path: hashes.append(path) or fileHash(path))
+    assert loadWordBank(workbook).fromCache
+    assert len(hashes) == 1
+    assert loadWordBank(workbook).fromCache # the new mtime was saved in the cache, so the contents are not hashed again
+    assert len(hashes) == 1
+
+def test_damaged_or_old_cache_is_rebuilt(workbook, monkeypatch):
+    loadWordBank(workbook)
+    with open(cachePath(workbook), 'wb') as f:
+        f.write(b'not a cache file')
+    assert not loadWordBank(workbook).fromCache
+    assert loadWordBank(workbook).fromCache
+    monkeypatch.setattr(word_bank_jw, 'CACHE_VERSION', word_bank_jw.CACHE_VERSION + 1)
+    assert not loadWordBank(workbook).fromCache
+    assert not loadWordBank(workbook, rebuild=True).fromCache
+
+LAYOUT = [('wordlist_1', 20), ('wordlist_2', 20), ('wordlist_prac', 4), ('wordlist1_dummy', 3)]
+MATCHED = ['wordlist_1', 'wordlist_2']
+
+# Function to make the norms of n word pairs: every frequency is different, so the strata are known
+def norms(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {'CUE%03i' % i: (float(f), float(c), float(a)) for i, (f, c, a) in
+            enumerate(zip(rng.permutation(n), rng.normal(4, 1, n), rng.random(n)))}
+
+@pytest.fixture
+def store(tmp_path):
+    store = WordStore(str(tmp_path / 'wordbank.sqlite'))
+    store.addPairs('main', [(cue, 'RECALL' + cue[3:]) + values for cue, values in norms(200).items()])
+    store.addPairs('other', [('OTHER%03i' % i, 'WORD%03i' % i) for i in range(50)])
+    yield store
+    store.close()
+
+def test_same_seed_draws_same_lists(store):
+    bank = store.sampleBank(LAYOUT, 12, matched=MATCHED, bank='main')
+    assert bank.sheetNames == [name for name, n in LAYOUT]
+    again = store.sampleBank(LAYOUT, 12, matched=MATCHED, bank='main')
+    for name, n in LAYOUT:
+        assert len(bank.words(name)[0]) == n
+        assert bank.words(name) == again.words(name)
+    assert store.sampleBank(LAYOUT, 13, matched=MATCHED, bank='main').words('wordlist_1') != bank.words('wordlist_1')
+
+def test_no_pair_is_used_twice(store):
+    bank = store.sampleBank(LAYOUT, 12, matched=MATCHED, bank='main')
+    cues = [cue for name, n in LAYOUT for cue in bank.words(name)[0]]
+    assert len(set(cues)) == len(cues) == sum(n for name, n in LAYOUT)
+    assert all(cue.startswith('CUE') for cue in cues)  # only from the bank asked for
+    for name, n in LAYOUT:
+        assert [recall[6:] for recall in bank.words(name)[1]] == [cue[3:] for cue in bank.words(name)[0]]  # pairs kept together
+
+def test_sample_covers_every_stratum(store):
+    ids = store.sample(40, random.Random(1), bank='main', strata='frequency', nStrata=4)
+    frequency = np.array([p['frequency'] for p in store.pairs(ids)])
+    assert len(set(ids)) == 40
+    assert np.bincount((frequency // 50).astype(int), minlength=4).tolist() == [10, 10, 10, 10]  # frequencies 0-199, 50 per stratum
+
+def test_matched_lists_have_closer_norm_means_than_random_split(store):
+    values = norms(200)
+    bank = store.sampleBank(LAYOUT, 12, matched=MATCHED, bank='main')
+    lists = [np.array([values[cue] for cue in bank.words(name)[0]]) for name in MATCHED]
+    sd = np.array(list(values.values())).std(axis=0)
+    # largest difference between the list means, in standard deviations of each norm
+    difference = lambda a, b: np.max(np.abs(a.mean(axis=0) - b.mean(axis=0)) / sd)
+    pairs = np.concatenate(lists)
+    rng = np.random.default_rng(0)
+    random_splits = [difference(*np.split(pairs[rng.permutation(len(pairs))], 2)) for r in range(100)]
+    assert difference(*lists) < np.median(random_splits)
+
+def test_draw_from_large_bank_reads_random_ids(tmp_path):
+    store = WordStore(str(tmp_path / 'wordbank.sqlite'))
+    store.addPairs('other', [('OTHER%04i' % i, 'WORD%04i' % i, float(i)) for i in range(500)])
+    store.addPairs('big', [('CUE%04i' % i, 'RECALL%04i' % i, float(i % 100)) for i in range(3000)])  # many more pairs than are drawn
+    store.addPairs('other', [('OTHER%04i' % i, 'WORD%04i' % i, float(i)) for i in range(500, 1000)])
+    ids = store.sample(2, random.Random(5), bank='big', strata=None)
+    assert ids == store.sample(2, random.Random(5), bank='big', strata=None)
+    assert all(p['cue'].startswith('CUE') for p in store.pairs(ids)) and len(set(ids)) == 2
+    assert not set(store.sample(2, random.Random(5), bank='big', strata=None, exclude=ids)) & set(ids)
+    # one pair from each half of the frequencies
+    assert sorted(p['frequency'] < 50 for p in store.pairs(store.sample(2, random.Random(6), bank='big', nStrata=2))) == [False, True]
+    drawn = [store.pairs(store.sample(1, random.Random(seed), strata=None))[0]['cue'] for seed in range(200)]  # from all banks
+    assert any(cue.startswith('CUE') for cue in drawn) and any(cue.startswith('OTHER') for cue in drawn)
+    cues = sorted(int(cue[3:]) for cue in drawn if cue.startswith('CUE'))
+    assert cues[0] < 300 and cues[-1] > 2700  # from the whole bank, not just its first pairs
+    store.close()
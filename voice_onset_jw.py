@@ -0,0 +1,258 @@
+"""
+Title: Voice onset (response time) detection for the recall recordings of the word learning task
+Author: Julia Wood, the University of Queensland, Australia
+Finds every *_RECALL_WORD_ORDER.csv file written by word_learning_task_audio_jw.py, detects the voice onset in the .wav file of every
+cue word and writes one summary csv: the rows of the word order files, with the voice onset, the response time from the cue onset and
+a confidence score for each recording. Recordings with a low confidence (e.g. a cough or an 'umm' before the response, or a noisy
+recording) are flagged in the review column, so they can be checked by hand.
+The onset is the start of the first stretch of sound that is loud enough for long enough (an energy envelope with thresholds that
+adapt to the noise floor of each recording), extended back over the quieter start of the word (e.g. a fricative, found with the zero
+crossing rate).
+StreamingVAD detects speech while the task is recording (see wordRecall in word_learning_task_audio_jw.py).
+Usage: python voice_onset_jw.py [--data-dir data/wordlearning] [--output FILE] [--jobs N] [--min-confidence 0.5]
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import argparse
+import glob
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Function to read a .wav file as mono float32 samples in -1..1. Returns (samples, sample rate)
+def readWav(path):
+    try:
+        with wave.open(path, 'rb') as f:
+            rate, width, channels = f.getframerate(), f.getsampwidth(), f.getnchannels()
+            data = f.readframes(f.getnframes())
+    except wave.Error:  # e.g. 32 bit float files, which the wave module cannot read
+        import soundfile
+        samples, rate = soundfile.read(path, dtype='float32', always_2d=True)
+        return samples.mean(axis=1), rate
+    if width == 1:
+        samples = (np.frombuffer(data, np.uint8).astype(np.float32) - 128) / 128
+    elif width == 3:
+        b = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8).astype(np.float32) / (1 << 23)
+    else:
+        samples = np.frombuffer(data, '<i%i' % width).astype(np.float32) / float(1 << (8 * width - 1))
+    return samples.reshape(-1, channels).mean(axis=1), rate
+
+# Function to calculate the energy (dB) and zero crossing rate of overlapping frames of a recording, all frames at once.
+# Returns (energy, zcr, frame start times in seconds)
+def envelope(samples, rate, frameMs=10, hopMs=5):
+    frame, hop = max(int(rate * frameMs / 1000), 2), max(int(rate * hopMs / 1000), 1)
+    samples = np.asarray(samples, dtype=np.float32)
+    samples = samples - samples.mean() if len(samples) else samples  # remove any DC offset of the microphone
+    if len(samples) < frame:
+        samples = np.pad(samples, (0, frame - len(samples)))
+    windows = np.lib.stride_tricks.sliding_window_view(samples, frame)[::hop]
+    energy = 10 * np.log10(np.mean(windows ** 2, axis=1) + 1e-12)
+    zcr = np.mean(np.signbit(windows[:, 1:]) != np.signbit(windows[:, :-1]), axis=1)
+    return energy, zcr, np.arange(len(windows)) * hop / rate
+
+# Function to find the voice onset of a recording. Returns a dict with
+# onset_ms    start of the response, from the start of the recording (NaN if no speech was found)
+# confidence  0 (no speech found, or only just above the noise) to 1 (a clear response in a quiet recording)
+# snr_db      loudness of the response above the noise floor of the recording
+# flag        why the confidence was reduced ('' if it was not)
+def detectOnset(samples, rate, frameMs=10, hopMs=5, minSpeechMs=60, minRiseDb=10, zcrThreshold=0.25):
+    energy, zcr, times = envelope(samples, rate, frameMs, hopMs)
+    noise = np.percentile(energy, 10)  # the quietest frames are the noise floor (most of each recording is silence)
+    snr = np.percentile(energy, 99) - noise
+    high = noise + max(minRiseDb, 0.4 * snr)  # thresholds adapt to the noise floor and the loudness of each recording
+    low = noise + max(minRiseDb / 2, 0.2 * snr)
+    loud = energy > high
+    # the first stretch of loud frames that lasts at least minSpeechMs
+    run = max(int(round(minSpeechMs / hopMs)), 1)
+    if len(loud) >= run:
+        starts = np.flatnonzero(np.convolve(loud, np.ones(run, dtype=int), 'valid') == run)
+    else:
+        starts = np.zeros(0, dtype=int)
+    if not len(starts) or snr < minRiseDb:
+        return {'onset_ms': np.nan, 'confidence': 0.0, 'snr_db': snr, 'flag': 'no speech'}
+    first = starts[0]
+    # extend back over the quieter start of the word: frames above the low threshold, or noisy (fricative) frames above the noise
+    voiced = (energy > low) | ((zcr > zcrThreshold) & (energy > noise + minRiseDb / 4))
+    quiet = np.flatnonzero(~voiced[:first])
+    onset = quiet[-1] + 1 if len(quiet) else 0
+    confidence, flags = float(np.clip((snr - minRiseDb) / 20, 0, 1)), []
+    if snr < minRiseDb + 10:
+        flags.append('low snr')
+    if loud[:onset].any():  # a short burst of sound before the response, e.g. a click, a cough or an 'umm'
+        confidence *= 0.4
+        flags.append('sound before onset')
+    if onset == 0:  # there was already sound at the start of the recording
+        confidence *= 0.4
+        flags.append('sound at start')
+    # the response starts after the end of the last quiet frame (the first voiced frame can start up to one frame length before it)
+    onset_ms = 1000 * (times[onset - 1] + max(int(rate * frameMs / 1000), 2) / rate) if onset else 0.0
+    return {'onset_ms': onset_ms, 'confidence': confidence, 'snr_db': snr, 'flag': ', '.join(flags)}
+
+# Class for detecting speech while a response is being recorded (e.g. in the loop waiting for the mouse click)
+class StreamingVAD:
+    '''
+    feed() takes the new samples of a recording as they arrive and processes them in fixed blocks of blockMs. The noise floor is the
+    median energy of the first noiseMs, and then follows the quiet blocks. Speech starts after minSpeechMs of blocks riseDb above the
+    noise floor (or riseDb / 2 with a high zero crossing rate, e.g. a fricative), and ends after hangoverMs below it.
+    At most maxBlocks blocks are processed by each call of feed() (the rest at the next call), so a call never takes longer than
+    maxBlocks blocks, however long it has been since the last one. finish() processes the rest, e.g. once the recording has stopped.
+    segments: [start, end] sample numbers (from the first sample fed) of the speech found so far (end is None while speech continues)
+    '''
+    def __init__(self, rate, blockMs=10, noiseMs=100, riseDb=12, minSpeechMs=60, hangoverMs=300, maxBlocks=50, zcrThreshold=0.25):
+        self.rate = rate
+        self.block = max(int(rate * blockMs / 1000), 2)
+        self.noiseBlocks = max(int(round(noiseMs / blockMs)), 1)
+        self.minBlocks = max(int(round(minSpeechMs / blockMs)), 1)
+        self.hangBlocks = max(int(round(hangoverMs / blockMs)), 1)
+        self.riseDb = riseDb
+        self.maxBlocks = maxBlocks
+        self.zcrThreshold = zcrThreshold
+        self.reset()
+
+    # start again for the next recording
+    def reset(self):
+        self.pending = np.zeros(0, dtype=np.float32) # samples fed but not processed yet
+        self.processed = 0 # samples processed so far
+        self.noiseEnergies = []
+        self.noise = None
+        self.loudRun = 0
+        self.quietRun = 0
+        self.segments = []
+
+    # the start of the first speech segment in ms (NaN if none yet)
+    @property
+    def onsetMs(self):
+        return 1000 * self.segments[0][0] / self.rate if self.segments else np.nan
+
+    # process new samples (a 1d array, e.g. a view of the recording): at most maxBlocks blocks now, the rest at the next call
+    def feed(self, samples, maxBlocks=None):
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        self.pending = np.concatenate([self.pending, samples]) if len(self.pending) else samples
+        k = min(len(self.pending) // self.block, maxBlocks or self.maxBlocks)
+        if k:
+            blocks = self.pending[:k * self.block].reshape(k, self.block)
+            self.pending = self.pending[k * self.block:]
+            blocks = blocks - blocks.mean(axis=1, keepdims=True)
+            energy = 10 * np.log10(np.mean(blocks ** 2, axis=1) + 1e-12)
+            zcr = np.mean(np.signbit(blocks[:, 1:]) != np.signbit(blocks[:, :-1]), axis=1)
+            for e, z in zip(energy, zcr):
+                self._block(e, z)
+        return self.segments
+
+    # process every sample fed so far and end the last speech segment, e.g. once the recording has stopped
+    def finish(self):
+        while len(self.pending) >= self.block:
+            self.feed(np.zeros(0, dtype=np.float32), maxBlocks=len(self.pending) // self.block)
+        if self.segments and self.segments[-1][1] is None:
+            self.segments[-1][1] = self.processed - self.quietRun * self.block
+        return self.segments
+
+    # update the speech state with the energy and zero crossing rate of one block
+    def _block(self, energy, zcr):
+        start = self.processed
+        self.processed += self.block
+        if self.noise is None:  # still measuring the noise floor
+            self.noiseEnergies.append(energy)
+            if len(self.noiseEnergies) == self.noiseBlocks:
+                self.noise = float(np.median(self.noiseEnergies))
+            return
+        rise = energy - self.noise
+        loud = rise > self.riseDb or (rise > self.riseDb / 2 and zcr > self.zcrThreshold)
+        if not loud and rise < self.riseDb / 4:
+            self.noise += 0.05 * (energy - self.noise)  # follow slow changes of the background noise
+        speaking = bool(self.segments) and self.segments[-1][1] is None
+        if loud:
+            self.loudRun += 1
+            self.quietRun = 0
+            if not speaking and self.loudRun >= self.minBlocks:
+                self.segments.append([start - (self.loudRun - 1) * self.block, None])
+        else:
+            self.loudRun = 0
+            self.quietRun += 1
+            if speaking and self.quietRun >= self.hangBlocks:
+                self.segments[-1][1] = self.processed - self.quietRun * self.block
+
+    # the part of a recording of n samples to keep when the silence before and after the speech is trimmed, as (start, stop) sample
+    # numbers with padMs of silence either side. None if no speech was found (the whole recording is kept)
+    def trimBounds(self, n, padMs=250):
+        if not self.segments:
+            return None
+        pad = int(self.rate * padMs / 1000)
+        end = self.segments[-1][1] if self.segments[-1][1] is not None else n
+        return max(self.segments[0][0] - pad, 0), min(end + pad, n)
+
+# Function to detect the voice onset of one .wav file (run in a worker process)
+def analyseClip(path):
+    if not os.path.exists(path):
+        return {'onset_ms': np.nan, 'confidence': 0.0, 'snr_db': np.nan, 'flag': 'no audio file', 'clip_ms': np.nan}
+    try:
+        samples, rate = readWav(path)
+    except Exception as e:
+        return {'onset_ms': np.nan, 'confidence': 0.0, 'snr_db': np.nan, 'flag': 'unreadable: %s' % e, 'clip_ms': np.nan}
+    return dict(detectOnset(samples, rate), clip_ms=1000 * len(samples) / rate)
+
+# Function to find all recall word order files in the data directory (not the _quitExp files)
+def findWordOrderFiles(data_dir):
+    folders = os.path.join(data_dir, 'P*', 'audio_recall_files', 'S*_*')
+    return sorted(glob.glob(os.path.join(folders, '*_RECALL_WORD_ORDER.csv')) + glob.glob(os.path.join(folders, '*_RECALL_WORD_ORDER_[0-9]*.csv')))
+
+# Function to read a word order file, with the path of the .wav file of each row. The file name is stored in the audio_file column
+# (files saved before it was added: worked out from the cue and response words, as the task names them)
+def readWordOrder(path):
+    df = pd.read_csv(path, index_col=0)
+    folder = os.path.dirname(path)
+    if 'audio_file' in df.columns:
+        df['audio_path'] = [os.path.join(folder, f) for f in df['audio_file']]
+    else:
+        prefix = os.path.basename(path).rsplit('_RECALL_WORD_ORDER', 1)[0]
+        df['audio_path'] = [os.path.join(folder, '%s_%s_%s.wav' % (prefix, c, r)) for c, r in zip(df['cue_word'], df['response_word'])]
+    df.insert(0, 'source_file', path)
+    return df
+
+# Function to add the response time from the cue onset. The recording of each cue word starts at mic.start(), just after the cue onset
+# (the difference is mic_start_times - cue_word_times), or exactly at the cue onset if the whole block was recorded (cue_onset_sample).
+# If the silence before the response was trimmed from the file, the trimmed part (trim_start_ms) is added back.
+# The start up latency of the microphone is not included
+def responseTimes(df):
+    offset = df['mic_start_times'] - df['cue_word_times'] if {'mic_start_times', 'cue_word_times'} <= set(df.columns) else 0
+    if 'cue_onset_sample' in df.columns:
+        offset = np.where(df['cue_onset_sample'].notna(), 0, offset)
+    if 'trim_start_ms' in df.columns:
+        offset = offset + df['trim_start_ms'].fillna(0)
+    df['rt_ms'] = df['onset_ms'] + offset
+    return df
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detect the voice onset of every recall recording and write a summary csv.')
+    parser.add_argument('--data-dir', default='data' + os.path.sep + 'wordlearning', help='folder containing the P* participant folders')
+    parser.add_argument('--output', default=None, help='summary csv to write (default: voice_onsets.csv in the data folder)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--min-confidence', type=float, default=0.5, help='recordings with a lower confidence are flagged for review')
+    args = parser.parse_args(argv)
+    output = args.output or os.path.join(args.data_dir, 'voice_onsets.csv')
+    t0 = time.perf_counter()
+
+    files = findWordOrderFiles(args.data_dir)
+    if not files:
+        print('No recall word order files found in %s' % args.data_dir)
+        return
+    rows = pd.concat([readWordOrder(path) for path in files], ignore_index=True)
+    clips = list(rows['audio_path'])
+    if args.jobs > 1 and len(clips) > 1:  # the recordings are spread across all cores
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(analyseClip, clips, chunksize=max(1, len(clips) // (4 * args.jobs))))
+    else:
+        results = [analyseClip(path) for path in clips]
+    summary = responseTimes(pd.concat([rows, pd.DataFrame(results)], axis=1))
+    summary['review'] = summary['confidence'] < args.min_confidence
+    summary.to_csv(output, index=False, float_format='%.3f')
+
+    print('%i word order files, %i recordings: voice onset found in %i, %i flagged for review (confidence < %.2f)'
+          % (len(files), len(summary), summary['onset_ms'].notna().sum(), summary['review'].sum(), args.min_confidence))
+    print('Summary saved to %s (%.2f s)' % (output, time.perf_counter() - t0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+Title: Word bank for the word learning task
+Author: Julia Wood, the University of Queensland, Australia
+The word pairs in wordlists_audio.xlsx are read once and saved in a cache file next to the workbook (wordlists_audio_wordbank.npz),
+which loads in a few milliseconds instead of parsing the workbook every time. The cache is rebuilt automatically when the workbook
+changes: its size and modification time are checked first, and if these have changed, the hash of its contents.
+To compare the load times: python benchmarks_jw.py wordbank
+For larger studies, word pairs with norms (frequency, concreteness, association) can be kept in a word store (SQLite), from which each
+participant gets their own balanced sample of word lists (set WORD_STORE in session_plan_jw.py), e.g.
+    python word_bank_jw.py import pairs.csv --store wordbank.sqlite       (csv columns: cue, recall, frequency, concreteness, association)
+    python word_bank_jw.py sample --store wordbank.sqlite --participant 12
+See my GitHub for further details: https://github.com/jrwood21
+"""
+import hashlib
+import os
+import zipfile
+import numpy as np
+
+CACHE_VERSION = 1 # increase if the layout of the cache file changes, so old cache files are rebuilt
+
+# Function to get a hash of a file's contents, used to check whether a file (e.g. the workbook) has really changed when its mtime has changed.
+# Also used by rescore_fingertapping_jw.py for the output files
+def fileHash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# the cache file of a workbook, e.g. wordlists_audio_wordbank.npz
+def cachePath(workbook):
+    return os.path.splitext(workbook)[0] + '_wordbank.npz'
+
+# Class holding the word pairs of every worksheet of the workbook: the cue words (column A) and matching recall words (column B)
+class WordBank:
+    def __init__(self, sheetNames, cueWords, recallWords, source=None):
+        self.sheetNames = list(sheetNames)
+        self.cueWords = cueWords # one array of words for each worksheet
+        self.recallWords = recallWords
+        self.source = source # the workbook the words were read from
+        self.fromCache = False # True if the words were loaded from the cache file
+
+    def __len__(self):
+        return len(self.sheetNames)
+
+    # the first n_items word pairs of a worksheet (by number or name), as lists of cue words and matching recall words
+    def words(self, sheet, n_items=None):
+        s = self.sheetNames.index(sheet) if isinstance(sheet, str) else sheet
+        return self.cueWords[s][:n_items].tolist(), self.recallWords[s][:n_items].tolist()
+
+    # save the word bank to a cache file, with the size, modification time and hash of the workbook it was read from
+    def save(self, path, stat, source_hash):
+        arrays = {'version': np.array(CACHE_VERSION), 'sheet_names': np.array(self.sheetNames, dtype=str),
+                  'source_size': np.array(stat.st_size), 'source_mtime_ns': np.array(stat.st_mtime_ns), 'source_hash': np.array(source_hash)}
+        for s in range(len(self)):
+            arrays['cue_%i' % s] = self.cueWords[s]
+            arrays['recall_%i' % s] = self.recallWords[s]
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path) # so a half-written cache file is never read
+
+# Function to read the word pairs of every worksheet from the workbook (slow: only used when the cache needs to be rebuilt)
+def readWorkbook(workbook):
+    import openpyxl
+    book = openpyxl.load_workbook(workbook, read_only=True)
+    sheetNames, cueWords, recallWords = [], [], []
+    for sheet in book.worksheets:
+        rows = [row for row in sheet.iter_rows(max_col=2, values_only=True)]
+        while rows and (not rows[-1] or rows[-1][0] is None):  # ignore empty rows at the end of the sheet
+            rows.pop()
+        sheetNames.append(sheet.title)
+        cueWords.append(np.array(['' if row[0] is None else str(row[0]) for row in rows], dtype=str))
+        recallWords.append(np.array(['' if len(row) < 2 or row[1] is None else str(row[1]) for row in rows], dtype=str))
+    book.close()
+    return WordBank(sheetNames, cueWords, recallWords, source=workbook)
+
+# Function to load the word bank of a workbook from its cache file, or read the workbook (and save the cache) if the cache is missing,
+# out of date or unreadable. With rebuild=True, the workbook is always read again
+def loadWordBank(workbook='wordlists_audio.xlsx', cacheFile=None, rebuild=False):
+    cacheFile = cacheFile or cachePath(workbook)
+    stat = os.stat(workbook)
+    source_hash = None
+    bank = None
+    if not rebuild and os.path.exists(cacheFile):
+        try:
+            with np.load(cacheFile) as cache:
+                if int(cache['version']) == CACHE_VERSION and int(cache['source_size']) == stat.st_size:
+                    mtimeChanged = int(cache['source_mtime_ns']) != stat.st_mtime_ns
+                    if mtimeChanged:  # only the mtime changed (e.g. file was copied)?
+                        source_hash = fileHash(workbook)
+                    if not mtimeChanged or str(cache['source_hash']) == source_hash:
+                        n = len(cache['sheet_names'])
+                        bank = WordBank(cache['sheet_names'].tolist(), [cache['cue_%i' % s] for s in range(n)],
+                                        [cache['recall_%i' % s] for s in range(n)], source=workbook)
+                        bank.fromCache = True
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            pass  # the cache file is damaged: read the workbook again
+    if bank is not None:
+        if source_hash is not None:  # record the new mtime, so the hash is not needed next time
+            bank.save(cacheFile, stat, source_hash)
+        return bank
+    bank = readWorkbook(workbook)
+    try:
+        bank.save(cacheFile, stat, source_hash or fileHash(workbook))
+    except OSError:
+        pass  # e.g. the folder is read-only: the task still runs, the workbook is just read again next time
+    return bank
+
+NORMS = ['frequency', 'concreteness', 'association'] # word pair norms stored in the word store (blank if unknown)
+
+# Class for a large word bank stored in an SQLite file, with an index on each norm, e.g. wordbank.sqlite. Pairs are grouped into banks
+# (e.g. one per source, or one per worksheet of an imported workbook). Word lists are drawn from it with sample() and sampleBank(),
+# which use the indexes to read only the pairs that are drawn, never the whole bank
+class WordStore:
+    def __init__(self, path):
+        import sqlite3
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS pairs (id INTEGER PRIMARY KEY, bank TEXT NOT NULL, cue TEXT NOT NULL, recall TEXT NOT NULL, '
+                        + ', '.join('%s REAL' % norm for norm in NORMS) + ')')
+        self.db.execute('CREATE INDEX IF NOT EXISTS pairs_bank ON pairs (bank)')
+        for norm in NORMS:  # for drawing from one bank, or from all banks
+            self.db.execute('CREATE INDEX IF NOT EXISTS pairs_%s ON pairs (bank, %s)' % (norm, norm))
+            self.db.execute('CREATE INDEX IF NOT EXISTS pairs_%s_all ON pairs (%s)' % (norm, norm))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    # add word pairs to a bank: rows of (cue, recall) or (cue, recall, frequency, concreteness, association)
+    def addPairs(self, bank, rows):
+        rows = [tuple(row[:2]) + tuple(row[2:2 + len(NORMS)]) + (None,) * (2 + len(NORMS) - len(row)) for row in rows]
+        with self.db:
+            self.db.executemany('INSERT INTO pairs (bank, cue, recall, %s) VALUES (?, ?, ?, %s)' % (', '.join(NORMS), ', '.join('?' * len(NORMS))),
+                                [(bank,) + row for row in rows])
+        return len(rows)
+
+    # import every worksheet of a workbook (columns: cue, recall and optionally frequency, concreteness, association) into a bank
+    # named after the worksheet, or all worksheets into one bank
+    def importWorkbook(self, workbook, bank=None):
+        import openpyxl
+        book = openpyxl.load_workbook(workbook, read_only=True)
+        n = 0
+        for sheet in book.worksheets:
+            rows = [row for row in sheet.iter_rows(max_col=2 + len(NORMS), values_only=True) if row and row[0] is not None]
+            n += self.addPairs(bank or sheet.title, [(str(row[0]), str(row[1])) + tuple(row[2:]) for row in rows])
+        book.close()
+        return n
+
+    # import a csv file with a header row: cue, recall and optionally frequency, concreteness, association
+    def importCsv(self, path, bank):
+        import csv
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = [(r['cue'], r['recall']) + tuple(float(r[norm]) if r.get(norm) not in (None, '') else None for norm in NORMS)
+                    for r in csv.DictReader(f)]
+        return self.addPairs(bank, rows)
+
+    # number of pairs in each bank
+    def banks(self):
+        return dict(self.db.execute('SELECT bank, COUNT(*) FROM pairs GROUP BY bank ORDER BY bank'))
+
+    # the WHERE clause (and its arguments) selecting the pairs of a bank (all banks if bank is None), optionally only those with a norm
+    # between low and high (high excluded)
+    def _where(self, bank=None, norm=None, low=None, high=None):
+        where, args = ['1'], []
+        if bank is not None:
+            where.append('bank = ?')
+            args.append(bank)
+        if norm is not None:
+            where.append('%s IS NOT NULL' % norm)
+            if low is not None:
+                where.append('%s >= ?' % norm)
+                args.append(low)
+            if high is not None:
+                where.append('%s < ?' % norm)
+                args.append(high)
+        return ' AND '.join(where), args
+
+    # Function to draw k pair ids at random from the pairs selected by where (in bank, if given). If there are many more pairs than are
+    # needed, a random id between the first and last id of the selected pairs is drawn for each pair, and the first selected pair from that
+    # id on is read from the primary key (or from the bank index, which is ordered by id within each bank), so only the pairs drawn are
+    # read. Otherwise the ids of all selected pairs are read from the index (which is quicker than many single reads).
+    # Pairs in exclude (ids) are skipped
+    def _draw(self, k, rng, where, args, order, exclude=(), bank=None):
+        count = self.db.execute('SELECT COUNT(*) FROM pairs WHERE ' + where, args).fetchone()[0]
+        if count <= 1000 * k:
+            ids = [r[0] for r in self.db.execute('SELECT id FROM pairs WHERE %s ORDER BY %s' % (where, order), args) if r[0] not in exclude]
+            if len(ids) < k:
+                raise ValueError('Not enough word pairs to draw %i (%i available)' % (k, len(ids)))
+            return rng.sample(ids, k)
+        table = 'pairs INDEXED BY pairs_bank' if bank is not None else 'pairs NOT INDEXED' # walk the ids in order, not a norm index
+        first = self.db.execute('SELECT id FROM %s WHERE %s ORDER BY id LIMIT 1' % (table, where), args).fetchone()[0]
+        last = self.db.execute('SELECT id FROM %s WHERE %s ORDER BY id DESC LIMIT 1' % (table, where), args).fetchone()[0]
+        sql = 'SELECT id FROM %s WHERE %s AND id >= ? ORDER BY id LIMIT 1' % (table, where)
+        drawn = []
+        for attempt in range(1000 * k):  # at most 1 in 1000 of the pairs are needed, so this is never used up unless exclude is huge
+            pair_id = self.db.execute(sql, args + [rng.randint(first, last)]).fetchone()[0]
+            if pair_id not in exclude and pair_id not in drawn:
+                drawn.append(pair_id)
+                if len(drawn) == k:
+                    return drawn
+        raise ValueError('Not enough word pairs to draw %i (%i drawn)' % (k, len(drawn)))
+
+    # boundaries of n equal-sized strata of a norm (using the index, so only n values are read)
+    def _strataEdges(self, norm, n, bank=None):
+        where = ('bank = ? AND ' if bank is not None else '') + '%s IS NOT NULL' % norm
+        args = [bank] if bank is not None else []
+        count = self.db.execute('SELECT COUNT(*) FROM pairs WHERE ' + where, args).fetchone()[0]
+        if count == 0:
+            return [], 0
+        return [self.db.execute('SELECT %s FROM pairs WHERE %s ORDER BY %s LIMIT 1 OFFSET ?' % (norm, where, norm), args + [count * s // n]).fetchone()[0]
+                for s in range(1, n)], count
+
+    # the pairs with the given ids, as a list of dicts in the same order as ids
+    def pairs(self, ids):
+        rows = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            sql = 'SELECT id, cue, recall, %s FROM pairs WHERE id IN (%s)' % (', '.join(NORMS), ', '.join('?' * len(chunk)))
+            for row in self.db.execute(sql, chunk):
+                rows[row[0]] = dict(zip(['id', 'cue', 'recall'] + NORMS, row))
+        return [rows[i] for i in ids]
+
+    # Function to draw n pairs at random from a bank, balanced across the strata of a norm (the same number of pairs from each stratum,
+    # e.g. from the lowest, middle and highest frequency pairs). Pairs in exclude (ids) are never drawn. Returns the ids
+    def sample(self, n, rng, bank=None, strata='frequency', nStrata=4, exclude=()):
+        exclude = set(exclude)
+        edges, count = self._strataEdges(strata, nStrata, bank) if strata else ([], 0)
+        if not strata or count < n:  # norm unknown (for too many pairs): simple random sample
+            where, args = self._where(bank)
+            return self._draw(n, rng, where, args, 'id', exclude, bank)
+        edges = sorted(set(edges))  # fewer strata if many pairs have the same value
+        nStrata = len(edges) + 1
+        bounds = [None] + edges + [None]
+        drawn = []
+        for s in range(nStrata):
+            need = n // nStrata + (1 if s < n % nStrata else 0)
+            where, args = self._where(bank, strata, bounds[s], bounds[s + 1])
+            drawn += self._draw(need, rng, where, args, '%s, id' % strata, exclude, bank)
+        return drawn
+
+    # Function to draw the word lists of one participant as a WordBank with one sheet per list. layout is a list of (name, number of pairs)
+    # in sheet order. The matched lists are drawn together, balanced across the strata of the first norm. Pairs with similar values of the
+    # first norm are then shared out between the lists so that the means of all norms stay as close as possible across the lists.
+    # The other lists (e.g. practice and dummy word pairs) are drawn at random. No pair is used twice. With the same seed
+    # (e.g. participantSeed), the same lists are drawn every time
+    def sampleBank(self, layout, seed, matched=(), bank=None, norms=NORMS, nStrata=4):
+        import itertools
+        import random
+        rng = random.Random(seed)
+        lists = {}
+        matched = [name for name, n_items in layout if name in matched]
+        if matched:
+            sizes = dict(layout)
+            pairs = self.pairs(self.sample(sum(sizes[name] for name in matched), rng, bank, norms[0] if norms else None, nStrata))
+            # each norm as z-scores (0 if unknown), so the norms count equally when the lists are balanced
+            values = np.array([[np.nan if p[norm] is None else p[norm] for norm in norms] for p in pairs], dtype=float).reshape(len(pairs), len(norms))
+            z = np.nan_to_num((values - np.nanmean(values, axis=0)) / (np.nanstd(values, axis=0) + 1e-12)) if len(norms) else values
+            order = np.lexsort(z[:, ::-1].T) if len(norms) else np.arange(len(pairs)) # by the first norm (then the next ...)
+            lists = {name: [] for name in matched}
+            sums = {name: np.zeros(len(norms)) for name in matched}
+            start = 0
+            while start < len(order):  # pairs with similar values of the first norm, one for each list that is not full yet
+                notFull = [name for name in matched if len(lists[name]) < sizes[name]]
+                chunk = order[start:start + len(notFull)]
+                start += len(chunk)
+                # give them to the lists so that the sums of the norms stay as close as possible across the lists
+                best = min(itertools.permutations(notFull, len(chunk)),
+                           key=lambda names: sum(np.var([sums[m] + sum(z[c] for c, n in zip(chunk, names) if n == m) for m in matched], axis=0)))
+                for c, name in zip(chunk, best):
+                    lists[name].append(pairs[c])
+                    sums[name] = sums[name] + z[c]
+        used = [p['id'] for ps in lists.values() for p in ps]
+        for name, n_items in layout:
+            if name not in lists:
+                lists[name] = self.pairs(self.sample(n_items, rng, bank, None, exclude=used))
+                used += [p['id'] for p in lists[name]]
+        names = [name for name, n_items in layout]
+        return WordBank(names, [np.array([p['cue'] for p in lists[name]], dtype=str) for name in names],
+                        [np.array([p['recall'] for p in lists[name]], dtype=str) for name in names], source=self.path)
+
+# Function to get the random seed of a participant, so the same word lists are drawn in every session
+def participantSeed(participant):
+    return int(hashlib.sha1(('participant %s' % participant).encode('utf-8')).hexdigest()[:12], 16)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Word bank for the word learning task: the cached workbook, or a large word store (SQLite).')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('cache', help='rebuild the cache file of a workbook')
+    p.add_argument('workbook', nargs='?', default='wordlists_audio.xlsx')
+    p = sub.add_parser('import', help='import word pairs from a workbook (.xlsx) or csv file into a word store')
+    p.add_argument('source')
+    p.add_argument('--store', default='wordbank.sqlite')
+    p.add_argument('--bank', default=None, help='bank name (default: the worksheet names of a workbook, the file name of a csv file)')
+    p = sub.add_parser('info', help='number of word pairs in each bank of a word store')
+    p.add_argument('--store', default='wordbank.sqlite')
+    p = sub.add_parser('sample', help="draw a participant's word lists from a word store")
+    p.add_argument('--store', default='wordbank.sqlite')
+    p.add_argument('--participant', required=True)
+    p.add_argument('--bank', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'cache':
+        bank = loadWordBank(args.workbook, rebuild=True)
+        print('%i worksheets of %s saved to %s' % (len(bank), args.workbook, cachePath(args.workbook)))
+        return
+    store = WordStore(args.store)
+    if args.command == 'import':
+        if args.source.endswith('.csv'):
+            n = store.importCsv(args.source, args.bank or os.path.splitext(os.path.basename(args.source))[0])
+        else:
+            n = store.importWorkbook(args.source, args.bank)
+        print('%i word pairs imported into %s' % (n, args.store))
+    elif args.command == 'info':
+        for bank, n in store.banks().items():
+            print('%-24s %8i pairs' % (bank, n))
+    elif args.command == 'sample':
+        from session_plan_jw import SHEETS, MATCHED_LISTS
+        bank = store.sampleBank(SHEETS, participantSeed(args.participant), matched=MATCHED_LISTS, bank=args.bank)
+        for name in bank.sheetNames:
+            cue_words, recall_words = bank.words(name)
+            print('%s (%i pairs): %s' % (name, len(cue_words), ', '.join('%s-%s' % pair for pair in zip(cue_words, recall_words))))
+    store.close()
+
+if __name__ == '__main__':
+    main()
@@ -8,95 +8,109 @@ See my GitHub for further details: https://github.com/jrwood21
 
 # import useful modules
 import time
-import pandas as pd
-import numpy as np
 import os
-import openpyxl
-import random
-import psychtoolbox
-from psychopy import prefs, visual, event, core, gui
+from psychopy import prefs, core, gui
 prefs.hardware['audioLib'] = 'PTB' # change the audio library to psychtoolbox for best latencies
 prefs.hardware['audioLatencyMode'] = 3 # set the latency mode to high precision 
 prefs.hardware['audioDriver'] = 'Primary Sound'
-from psychopy import sound # must import sound after changing sound prefs above
-
-micDevice = sound.Microphone.getDevices()[0] # define mic device explicitly
+from startup_jw import warmImports
+from session_plan_jw import compileWordPlan, participantWordBank, shuffleWords, makeDirs, uniq_path # the counter-balancing schedule, word order and output files of each session
+# only the modules needed for the dialogue boxes are imported before they are shown. The data modules are imported in the background
+# while the operator fills in the dialogue boxes, and the display and sound modules once the session details are known (see below)
+warmImports(['numpy', 'pandas', 'word_bank_jw', 'task_io_jw'])
 
 os.chdir(os.path.abspath(''))  # change working directory to script directory
 globalClock = core.Clock()  # create timer to track the time since experiment started
-mic=sound.Microphone(channels=1, streamBufferSecs=10, device=micDevice) # buffersecs is the length of the mic recording. Use mic.poll() below to extend recording time
 
 ### set up some useful functions ###
 # Function to save messages to a log file recording everything the exp is doing
-def saveToLog(logString, timeStamp=1):
-    f = open(logFile, 'a')  # open our log file in append mode 
-    f.write(logString)  # write the text
-    if timeStamp != 0:  # if timestamp has not been turned off
-        f.write('// logged at %iseconds' % globalClock.getTime())  # write a timestamp (very coarse)
-    f.write('\n')  # create new line
-    f.close()  # close and save the log file
+def saveToLog(logString, timeStamp=1, phase=None, trial=None):
+    taskLog.log(logString, timeStamp, phase, trial)  # written to the log file by a background thread, so the task never waits for the disk
+
+# Function to log each recall audio file once it is written (called by the AudioWriter thread), with the phase and trial of the recording
+def audioSaved(path, seconds, error, info):
+    if error is None:
+        saveToLog('Audio file written in %.1f ms: %s' % (1000 * seconds, path), phase=info['phase'], trial=info['trial'])
+    else:
+        saveToLog('Problem writing audio file %s: %s' % (path, error), phase=info['phase'], trial=info['trial'])
+
+# Function to detect the speech in a recall recording, and trim the silence before and after it (if selected). Called by the AudioWriter
+# thread before the recording is written, so the next cue word never waits for it. info holds the speech detection of the recording
+# (see StreamingVAD in voice_onset_jw.py) and the number of samples it was already fed while waiting for the mouse click
+def analyseRecording(clip, info):
+    vad = info['vad']
+    samples = clip.samples.reshape(len(clip.samples), -1)[:, 0]
+    vad.feed(samples[min(info['vad_fed'], len(samples)):]) # the rest of the recording, up to the mouse click
+    vad.finish()
+    bounds = vad.trimBounds(len(samples)) if info['trim'] else None # keep the speech (with 250ms either side), if any was found
+    info['vad_onset_ms'] = vad.onsetMs
+    info['trim_start_ms'] = 1000 * bounds[0] / vad.rate if bounds else 0
+    saveToLog('Cue word %i: speech detected from %.0f ms (%i speech segments)%s' % (info['item'], vad.onsetMs, len(vad.segments),
+              ', %.0f ms of silence trimmed from the start' % info['trim_start_ms'] if bounds else ''), phase=info['phase'], trial=info['trial'])
+    if bounds and hasattr(clip, 'sampleRateHz'): # psychopy's AudioClip (a recording of one cue word)
+        clip = sound.AudioClip(clip.samples[bounds[0]:bounds[1]], sampleRateHz=clip.sampleRateHz)
+    elif bounds: # a clip of the whole block recording
+        from recording_jw import RecordingClip
+        clip = RecordingClip(clip.samples[bounds[0]:bounds[1]], clip.sampleRate)
+    return clip
 
 # An exit function to initiate if end key is pressed
 def quitExp():
-    if 'logFile' in globals():  # if a log file has been created
+    if globals().get('recorder') is not None:  # save the whole block recording and the clips cut from it so far
+        recorder.close()
+    if 'audioWriter' in globals() and not audioWriter.close():  # write the recordings that are still queued
+        saveToLog('Not all audio files were written before quitting')
+    if 'taskLog' in globals():  # if a log file has been created
         saveToLog('User aborted experiment')
         saveToLog('..........................................', 0)
+        taskLog.close()  # make sure everything logged so far is written to the log file
+    if 'frameTimer' in globals() and frameTimer.enabled:  # if frame timing was recorded, save it
+        frameTimer.save(uniq_path(plan['paths']['frame_timing']))
     if 'win' in globals():  # if a window has been created
         win.close()  # close the window
     core.quit()  # quit the program
 
-# define function to check if a filename exists. If yes, iterate to get the next available file number (avoid overwriting)
-def uniq_path(path):
-    fn, ext = os.path.splitext(path)
-    counter = 2
-    while os.path.exists(path):
-        path = fn + "_" + str(counter) + ext
-        counter += 1
-    return path
-
-# function to convert workbooks to ordered word lists
-def asWordLists(sheet, n_items):
-    cue_words = [] # store cue words and matching recall words in lists
-    recall_words = []
-    stim_order = [] # create a counter to use for randomisation of wordpair presentation order
-    ix = 0 # create counter
-    for rowx in sheet.iter_rows(max_row=n_items): 
-        cue_words.append(rowx[0].value) # read cue word
-        recall_words.append(rowx[1].value) # read in matching recall word
-        stim_order.append(ix) # generate list of numbers the length of number of rows
-        ix += 1
-    return cue_words, recall_words, stim_order
-
-# Function to generate random word lists from ordered word lists
-def randomWordLists(cue_words, recall_words, stim_order, num_items):
-    random.seed()
-    random.shuffle(stim_order) # shuffle number list to randomise order of presentation
-    cue_words_2 = [] # create randomised cue and recall word lists to use in experiment (but pairs remain matched)
-    recall_words_2 = []
-    for i in range(num_items): 
-        cue_words_2.append(cue_words[stim_order[i]]) # generate cue words in randomised order
-        recall_words_2.append(recall_words[stim_order[i]]) # generate recall words in randomised order
-    return cue_words_2, recall_words_2
-
-# Function to display wordlists
-def displayWordListPairs(num_words, cue_wordlist, recall_wordlist):
+# Function to get the microphone. The audio devices are looked up the first time it is needed (the recall task), not when the script starts
+def getMic():
+    global mic
+    if 'mic' not in globals():
+        micDevice = sound.Microphone.getDevices()[0] # define mic device explicitly
+        mic = sound.Microphone(channels=1, streamBufferSecs=10, device=micDevice) # buffersecs is the length of the mic recording. Use mic.poll() below to extend recording time
+    return mic
+
+# Function to start recording a whole recall block into one memory-mapped file (if selected in the first dialogue box), with a marker
+# at every cue onset and mouse click, instead of starting and stopping the microphone for every cue word (see recording_jw.py)
+def startRecorder(path):
+    global recorder
+    from recording_jw import ContinuousRecorder, SessionRecording
+    micDevice = sound.Microphone.getDevices()[0] # the same mic device as getMic
+    recorder = ContinuousRecorder(SessionRecording(path, sampleRate=48000, channels=1), device=micDevice.deviceIndex, writer=audioWriter)
+    recorder.start()
+    return recorder
+
+# Function to display wordlists. Each pair is shown for 5 seconds and followed by a 100ms blank screen, counted in screen refreshes
+# (see FrameScheduler in task_components_jw.py). Returns the flip times at which each pair appeared and disappeared
+def displayWordListPairs(num_words, cue_wordlist, recall_wordlist, phase='word pairs'):
+    frameTimer.startPhase(phase, task_attempt_number)  # record the timing of each word pair (if selected)
+    onset_times, offset_times = [], []
     for i in range(num_words):
-        if event.getKeys(['end']):  # checks for quit routine
-            quitExp()  
-        cueWordListText.setText(cue_wordlist[i]) # iterate over cue words and set the text
-        recallWordListText.setText(recall_wordlist[i]) # iterate over matching recall words and set the text
-        cueWordListText.setAutoDraw(False) # set autodraw to false, otherwise text will display in ALL frames
-        recallWordListText.setAutoDraw(False)
-        cueWordListText.draw()
-        recallWordListText.draw()
-        win.flip() # display the text
-        core.wait(5) # show text for 5 seconds
-        win.flip() # blank the screen
-        core.wait(0.1) # wait 100ms
-
-# Function to run word learning phase of task
-def wordLearning(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
+        pair = [cueWordListText.get(cue_wordlist[i]), recallWordListText.get(recall_wordlist[i])] # the (ready-made) cue and recall words
+        onset, key = scheduler.present(pair, seconds=5) # show text for 5 seconds
+        if key:  # checks for quit routine on every refresh
+            quitExp()
+        offset, key = scheduler.present(seconds=0.1) # blank the screen for 100ms
+        if key:
+            quitExp()
+        onset_times.append(onset)
+        offset_times.append(offset)
+    frameTimer.endPhase()
+    return onset_times, offset_times
+
+# Function to run word learning phase of task. Runs a learning block of the session plan (see compileWordPlan in session_plan_jw.py)
+def wordLearning(block):
+    wordlist_type = block['wordlist_type']
     ## Intro screen ##
+    taskLog.setPhase('learning', task_attempt_number)  # phase recorded with each log message
     saveToLog('Presenting word learning task introduction screen') # save info to log
     win.setColor('#000000', colorSpace='hex')  # set background colour to black
     win.flip()  # blank the screen first
@@ -104,6 +118,12 @@ def wordLearning(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
         'TASK INSTRUCTIONS \n\nOver the next 5 minutes, you will be shown a slide show of word pairs. Each word pair will be displayed for 5 seconds. The words in each pair are related to each other. \nFor example, PLANET and MARS. \n\nPlease try to memorise each of the word pairs as best you can, as you will be asked to recall these word pairs in a later task. \n\nTo help you memorise each word pair, please associate each of the word pairs with a story. \nFor example, MARS is the fourth PLANET from the Sun. \n\nPress the spacebar when you are ready to commence the task.')
     generalText.draw() # draw the text
     win.flip()  # show the text in the window
+    # create the stimuli of every word pair while the participant reads the instructions
+    cueWordListText.resetStats()
+    recallWordListText.resetStats()
+    shown = not metaData['practice mode'] # the word list itself is not shown in practice mode (only the dummy word pairs)
+    cueWordListText.prepare(block['dummy_cue_words'] + (block['cue_words'] if shown else []))
+    recallWordListText.prepare(block['dummy_recall_words'] + (block['recall_words'] if shown else []))
     event.waitKeys(keyList=["space"])  # wait for a spacebar press before continuing
     if ((task_attempt_number > 1) and (event.getKeys(['end']))): # include option to save data on attempts >1, in case use accidentally selected option to re-enter loop
         res['pc30_trial_num'] = task_attempt_number - 1
@@ -115,37 +135,17 @@ def wordLearning(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
     core.wait(2)
     saveToLog('Running word learning task with wordlist %s' % (wordlist_type))  # save info to log
     
-    wordlist_book = openpyxl.load_workbook(workbook) # read in word lists from xlsx document
-    if wordlist == 'wordlist_1':
-        wordlist_sheet = wordlist_book.worksheets[0] # specify which xlsx sheet to use
-    elif wordlist == 'wordlist_2':
-        wordlist_sheet = wordlist_book.worksheets[1]
-    elif wordlist == 'wordlist_prac':
-        wordlist_sheet = wordlist_book.worksheets[2]
-    
-    ### create word lists and randomise them (pairwise)
-    c_words, r_words, s_order = asWordLists(sheet=wordlist_sheet, n_items=46)
-    rand_c_words, rand_r_words = randomWordLists(cue_words=c_words, recall_words=r_words, stim_order=s_order, num_items=46)
-    
-    #### import dummy word lists and convert to lists, then randomise order (pairwise)
-    if wordlist == 'wordlist_1':
-        dummy_wordlist1_sheet = wordlist_book.worksheets[3]
-    elif wordlist == 'wordlist_2':
-        dummy_wordlist1_sheet = wordlist_book.worksheets[4]
-    elif wordlist == 'wordlist_prac': # prac word list defined as a dummy word list
-        dummy_wordlist1_sheet = wordlist_book.worksheets[2]
-    dummy_c_words, dummy_r_words, dummy_s_order = asWordLists(sheet=dummy_wordlist1_sheet, n_items=8)
-    rdum_c_words, rdum_r_words = randomWordLists(cue_words=dummy_c_words, recall_words=dummy_r_words, stim_order=dummy_s_order, num_items=8)
-    rand_dummy_c_words = rdum_c_words[0:4] # only select the first 4
-    rand_dummy_r_words = rdum_r_words[0:4]
+    # the word pairs and dummy word pairs were put in random order (pairwise) when the session plan was compiled
+    rand_c_words, rand_r_words = block['cue_words'], block['recall_words']
+    rand_dummy_c_words = block['dummy_cue_words'][0:4] # only select the first 4
+    rand_dummy_r_words = block['dummy_recall_words'][0:4]
     
-    # export word pair presentation order to csv
-    pair_order = np.arange(1,47,1)
+    # export word pair presentation order to csv (the onset and offset times are added once the word pairs have been shown)
+    pair_order = np.arange(1, len(rand_c_words) + 1, 1)
     pres_order_df = pd.DataFrame({'presentation_order': pair_order,
                                   'cue_word': rand_c_words,
                                   'response_word': rand_r_words})
-    pres_path = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_LEARNING_WORD_ORDER.csv'
-    pres_path = uniq_path(pres_path)
+    pres_path = uniq_path(block['paths']['word_order'])
     pres_order_df.to_csv(pres_path)
     saveToLog('Learning word presentation order saved to %s' % (pres_path))
 
@@ -153,16 +153,23 @@ def wordLearning(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
     win.flip() 
     
     # display 4 x dummy word pairs in random order for 5s each with 100ms ISI
-    displayWordListPairs(num_words=4, cue_wordlist=rand_dummy_c_words, recall_wordlist=rand_dummy_r_words)
+    displayWordListPairs(num_words=4, cue_wordlist=rand_dummy_c_words, recall_wordlist=rand_dummy_r_words, phase='dummy word pairs')
     
     if not metaData['practice mode']: # if it is not practice mode, display the test word pair list in random order
-        displayWordListPairs(num_words=46, cue_wordlist=rand_c_words, recall_wordlist=rand_r_words) 
+        onset_times, offset_times = displayWordListPairs(num_words=len(rand_c_words), cue_wordlist=rand_c_words, recall_wordlist=rand_r_words)
+        pres_order_df['onset_time'] = onset_times # flip times (seconds, psychopy clock) of the refreshes that showed and removed each pair
+        pres_order_df['offset_time'] = offset_times
+        pres_order_df['duration_ms'] = 1000 * (pres_order_df['offset_time'] - pres_order_df['onset_time'])
+        pres_order_df.to_csv(pres_path)
+        saveToLog('Learning word presentation times added to %s (%.1f to %.1f ms per pair)' % (pres_path, pres_order_df['duration_ms'].min(), pres_order_df['duration_ms'].max()))
     
-    rand_dummy_c_words = rdum_c_words[4:8] # now select the last 4 dummy word pairs from randomised list
-    rand_dummy_r_words = rdum_r_words[4:8]
+    rand_dummy_c_words = block['dummy_cue_words'][4:8] # now select the last 4 dummy word pairs from randomised list
+    rand_dummy_r_words = block['dummy_recall_words'][4:8]
     
     # display 4 x dummy word pairs in random order for 5s each with 100ms ISI
-    displayWordListPairs(num_words=4, cue_wordlist=rand_dummy_c_words, recall_wordlist=rand_dummy_r_words)
+    displayWordListPairs(num_words=4, cue_wordlist=rand_dummy_c_words, recall_wordlist=rand_dummy_r_words, phase='dummy word pairs')
+    saveToLog('Cue word stimuli: %s' % cueWordListText.report())  # setup and onset cost of the word stimuli
+    saveToLog('Recall word stimuli: %s' % recallWordListText.report())
     
     # gather all relevant data for this trial in a dictionary
     if not metaData['practice mode']:  
@@ -190,9 +197,15 @@ def wordLearning(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
      
     return store_out
     
-# Function to execute cued recall task only
-def wordRecall(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
+# Function to execute cued recall task only. Runs a recall block of the session plan (see compileWordPlan in session_plan_jw.py)
+def wordRecall(block):
+    wordlist_type = block['wordlist_type']
     ## Intro screen ##
+    taskLog.setPhase('recall', task_attempt_number)  # phase recorded with each log message
+    continuous = metaData['record whole recall block']
+    trim = metaData['trim silence from recordings']
+    if not continuous:
+        mic = getMic()  # set up the microphone (only the first time)
     saveToLog('Presenting word recall task introduction screen') # save info to log
     win.setColor('#000000', colorSpace='hex')  # set background colour to black
     win.flip()  # blank the screen first
@@ -200,34 +213,21 @@ def wordRecall(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
         'TASK INSTRUCTIONS\n\nOne word from each of the word pairs you viewed earlier will now be presented to you on the computer screen. Only a single word will be shown at once. \n\nFor each word presented to you, please try to recall the matching word from its pair. Say your answer out loud.  \n\nIf you cannot recall the matching word, please advise the experimenter that you would like to skip to the next word.  \n\nPress the spacebar when you are ready to commence the task.')
     generalText.draw() # draw the text
     win.flip()  # show the text in the window
+    # create the stimuli of every cue and recall word while the participant reads the instructions
+    cueWordListText_recall.resetStats()
+    recallWordListText_recall.resetStats()
+    clickWaiter.resetStats()
+    cueWordListText_recall.prepare(block['cue_words'])
+    recallWordListText_recall.prepare(block['recall_words'])
     event.waitKeys(keyList=["space"])  # wait for a spacebar press before continuing
     event.clearEvents()  # clear the event buffer
     win.flip()  # blank the screen first
     core.wait(2)
     saveToLog('Running word recall task with wordlist %s' % (wordlist_type))  # save info to log
     
-    # check that the file directory for this participant's audio files is set up:
-    audio_dir = p_dir + os.path.sep + 'audio_recall_files'
-    if not os.path.isdir(audio_dir):
-        os.mkdir(audio_dir)
-    audio_ses_dir = audio_dir + os.path.sep + 'S' + str(metaData['session number']) + '_' + str(metaData['session time'])
-    if not os.path.isdir(audio_ses_dir):
-        os.mkdir(audio_ses_dir)
-    
-    wordlist_book = openpyxl.load_workbook(workbook) # read in word lists from xlsx document
-    if wordlist == 'wordlist_1':
-        wordlist_sheet = wordlist_book.worksheets[0] # specify which sheet to use
-        n_words = 46
-    elif wordlist == 'wordlist_2':
-        wordlist_sheet = wordlist_book.worksheets[1]
-        n_words = 46
-    elif wordlist == 'wordlist_prac':
-        wordlist_sheet = wordlist_book.worksheets[2]
-        n_words = 8
-    
-    ### create word lists and randomise (pairwise)
-    c_words, r_words, s_order = asWordLists(sheet=wordlist_sheet, n_items=n_words)
-    rand_c_words, rand_r_words = randomWordLists(cue_words=c_words, recall_words=r_words, stim_order=s_order, num_items=n_words)
+    # the word pairs were put in random order (pairwise), and the audio file names worked out, when the session plan was compiled
+    rand_c_words, rand_r_words = block['cue_words'], block['recall_words']
+    n_words = len(rand_c_words)
     
     win.setColor('#000000', colorSpace='hex') # set the background colour to black and clear the screen
     win.flip() 
@@ -246,77 +246,144 @@ def wordRecall(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
     cue_word_times = []
     mic_start_times = []
     mic_stop_times = []
+    # flip times (seconds, psychopy clock) of the refreshes that showed and removed each cue word and each feedback word
+    cue_onset_times = []
+    cue_offset_times = []
+    feedback_onset_times = []
+    feedback_offset_times = []
+    # sample numbers of the cue onset and mouse click of each cue word in the whole block recording (if selected)
+    cue_onset_samples = []
+    click_samples = []
+    # the speech detection of each recording, with the start of the speech (ms from the start of the recording) and the silence
+    # trimmed from its start, once the recording has been written (see analyseRecording)
+    recordings = []
+    
+    # Function to export the recall word presentation order and times so far
+    def recallOrder():
+        n = len(order)
+        pad = lambda times: times + [np.nan] * (n - len(times)) # times not recorded yet for the last word
+        return pd.DataFrame({'order': order,
+                             'cue_word': cue_word,
+                             'response_word': response_word,
+                             'audio_file': [os.path.basename(path) for path in block['audio_paths'][:n]], # for voice_onset_jw.py
+                             'recall_loop_start_time': recall_loop_start_times,
+                             'text_draw_times': text_draw_times,
+                             'cue_word_times': pad(cue_word_times),
+                             'mic_start_times': pad(mic_start_times),
+                             'mic_stop_times': pad(mic_stop_times),
+                             'cue_onset_time': pad(cue_onset_times),
+                             'cue_offset_time': pad(cue_offset_times),
+                             'feedback_onset_time': pad(feedback_onset_times),
+                             'feedback_offset_time': pad(feedback_offset_times),
+                             'cue_onset_sample': pad(cue_onset_samples),
+                             'click_sample': pad(click_samples),
+                             'vad_onset_ms': pad([r.get('vad_onset_ms', np.nan) for r in recordings]),
+                             'trim_start_ms': pad([r.get('trim_start_ms', np.nan) for r in recordings])})
+    
+    # Function to save the data so far and quit, if the user hits the 'end' key
+    def quitRecall():
+        if continuous: # hand on the clips still waiting for their last samples
+            recorder.close()
+            globals()['recorder'] = None
+        audioWriter.flush(30) # the speech detected in the recordings so far
+        list_path = uniq_path(block['paths']['word_order_quit'])
+        recallOrder().to_csv(list_path)
+        saveToLog('User quit the experiment. In-progress recall word presentation order and time data saved to %s' % (list_path))
+        quitExp()  # quit the experiment
+    
+    # Function to poll the microphone while waiting for the mouse click (and detect speech in the new samples of the whole block recording)
+    vad, vad_fed = None, 0 # speech detection of the current recording, and the sample of the whole block recording fed to it so far
+    def pollMic():
+        nonlocal vad_fed
+        if continuous:
+            n_recorded = recorder.poll()
+            if n_recorded > vad_fed: # detect speech in the new samples (a view of the recording), a few blocks at a time
+                vad.feed(recorder.recording.samples[vad_fed:n_recorded, 0])
+                vad_fed = n_recorded
+        else:
+            mic.poll()
+    
+    if continuous:  # the microphone is started once, before the first cue word
+        recording_path = uniq_path(block['paths']['recording'])
+        startRecorder(recording_path)
+        saveToLog('Recording the whole recall block to %s' % recording_path)
     
     # display each cue word on it's own (random order), then display matching recall word after a mouse click
     for i in range (n_words):
         order.append(i+1)
-        cueWordListText_recall.setText(rand_c_words[i]) # set the cue word
         cue_word.append(rand_c_words[i])
-        recallWordListText_recall.setText(rand_r_words[i]) # set the recall word
         response_word.append(rand_r_words[i])
-        cueWordListText_recall.setAutoDraw(False) # set autodraw to false, otherwise text will display in ALL frames
-        recallWordListText_recall.setAutoDraw(False)
         
         recall_loop_start_times.append(time.perf_counter_ns()/1000000) # get system time in milliseconds
-        cueWordListText_recall.draw()
+        cueWordListText_recall.draw(rand_c_words[i]) # draw the (ready-made) cue word
         text_draw_times.append(time.perf_counter_ns()/1000000)
-        win.flip() # display the cue word
+        cue_onset = frameTimer.flip() # display the cue word
         cue_word_times.append(time.perf_counter_ns()/1000000)
-        mic.start()
+        cue_onset_times.append(cue_onset if cue_onset is not None else core.getTime())
+        if continuous:
+            cue_onset_samples.append(recorder.mark(i+1, 'cue_onset', cue_onset_times[-1])) # the sample recorded at the cue onset
+            vad = StreamingVAD(recorder.recording.sampleRate) # a new one for each recording, as the last one may still be in use by the audio writer
+            vad_fed = max(vad_fed, cue_onset_samples[-1]) # the speech detection starts at the cue onset
+        else:
+            mic.start()
         mic_start_times.append(time.perf_counter_ns()/1000000)
         
-        buttons = myMouse.getPressed(getTime=False) # check for mouse clicks
-        while buttons == [0,0,0]: # while there are no mouse clicks
-            buttons = myMouse.getPressed(getTime=False) # keep checking for mouse clicks
-            mic.poll()
-            if buttons != [0,0,0]: # when a mouse click is registered
-                mic.stop()
-                mic_stop_times.append(time.perf_counter_ns()/1000000)
-                audioclip = mic.getRecording()
-                audio_path = audio_ses_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_' + str(rand_c_words[i]) + '_' + str(rand_r_words[i]) + '.wav'
-                audio_path = uniq_path(audio_path)
-                audioclip.save(audio_path)
-                break # exit the loop
-            if event.getKeys(['end']):  # if the user hits the 'end' key
-                mic_stop_times.append(np.nan)
-                lists_to_df = pd.DataFrame({'order': order, # export word pair presentation order so far
-                            'cue_word': cue_word,
-                            'response_word': response_word,
-                            'recall_loop_start_time': recall_loop_start_times,
-                            'text_draw_times': text_draw_times,
-                            'cue_word_times': cue_word_times,
-                            'mic_start_times': mic_start_times,
-                            'mic_stop_times': mic_stop_times})
-                list_path = audio_ses_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_RECALL_WORD_ORDER_quitExp.csv'
-                list_path = uniq_path(list_path)
-                lists_to_df.to_csv(list_path)
-                saveToLog('User quit the experiment. In-progress recall word presentation order and time data saved to %s' % (list_path))
-                quitExp()  # quit the experiment
-        win.flip() # blank the screen
-        core.wait(0.1)
-        if (metaData['session time'] == 'pm-b') or (metaData['session time'] == 'am'):
-            core.wait(1.5)
+        # wait for a mouse click, polling the microphone every 20ms, without keeping a CPU core busy (see ClickWaiter in task_components_jw.py)
+        response, click_time = clickWaiter.wait(tasks=[(0.02, pollMic)])
+        if response != 'click':  # if the user hits the 'end' key
+            mic_stop_times.append(np.nan)
+            quitRecall()
+        # the rest of the speech detection (and the trimming) is done by the audio writer thread, before the recording is written (see
+        # analyseRecording). The phase and trial are logged with each audio file, which is written in the background
+        recordings.append({'phase': 'recall', 'trial': task_attempt_number, 'item': i+1, 'trim': trim})
+        if continuous:
+            click_samples.append(recorder.mark(i+1, 'click', click_time))
+            mic_stop_times.append(time.perf_counter_ns()/1000000)
+            recordings[-1].update(vad=vad, vad_fed=vad_fed - cue_onset_samples[-1]) # the samples up to the click are fed once they are recorded
+            recorder.saveClip(cue_onset_samples[-1], click_samples[-1], block['audio_paths'][i], recordings[-1]) # cut from the recording once its last sample is in
+        else:
+            mic.stop()
+            mic_stop_times.append(time.perf_counter_ns()/1000000)
+            audioclip = mic.getRecording() # the microphone samples are only available once it has stopped
+            recordings[-1].update(vad=StreamingVAD(audioclip.sampleRateHz), vad_fed=0)
+            blocked = audioWriter.submit(audioclip, block['audio_paths'][i], recordings[-1]) # written to the file in the background
+            if blocked > 0.001:
+                saveToLog('Waited %.1f ms for the audio writer queue' % (1000 * blocked))
+        # blank the screen for 100ms (recall only sessions (pm-b or am): another 1.5sec), counted in screen refreshes
+        cue_offset, key = scheduler.present(seconds=0.1 if block['feedback'] else 1.6)
+        cue_offset_times.append(cue_offset)
+        if key:
+            quitRecall()
         event.clearEvents()
         
-        if metaData['session time'] == 'pm-a': # if it is the learning phase of the pm session
-            recallWordListText_recall.draw() # provide accuracy feedback after each cue word
-            win.flip() 
-            core.wait(2.5) # display accuracy feedback for 2.5sec
-            win.flip()
-            core.wait(0.1)
+        if block['feedback']: # if it is the learning phase of the pm session
+            # provide accuracy feedback after each cue word, for 2.5sec
+            feedback_onset, key = scheduler.present([recallWordListText_recall.get(rand_r_words[i])], seconds=2.5)
+            feedback_onset_times.append(feedback_onset)
+            if key:
+                quitRecall()
+            feedback_offset, key = scheduler.present(seconds=0.1)
+            feedback_offset_times.append(feedback_offset)
+            if key:
+                quitRecall()
             event.clearEvents()
+        else:
+            feedback_onset_times.append(np.nan)
+            feedback_offset_times.append(np.nan)
     
-    lists_to_df = pd.DataFrame({'order': order, # export recall word presentation to csv
-                                'cue_word': cue_word,
-                                'response_word': response_word,
-                                'recall_loop_start_time': recall_loop_start_times,
-                                'text_draw_times': text_draw_times,
-                                'cue_word_times': cue_word_times,
-                                'mic_start_times': mic_start_times,
-                                'mic_stop_times': mic_stop_times})
-    list_path = audio_ses_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '_RECALL_WORD_ORDER.csv'
-    list_path = uniq_path(list_path)
-    lists_to_df.to_csv(list_path)
+    if continuous:  # stop the microphone and save the markers (the last clips are handed to the audio writer)
+        recorder.close()
+        saveToLog('Whole block recording: %s' % recorder.report())
+        globals()['recorder'] = None
+    if not audioWriter.flush(30): # make sure every recording of this block has been written
+        saveToLog('Not all audio files were written within 30 seconds')
+    saveToLog('Audio files: %s' % audioWriter.report())
+    saveToLog('Mouse click waits: %s' % clickWaiter.report())
+    saveToLog('Cue word stimuli: %s' % cueWordListText_recall.report())  # setup and onset cost of the word stimuli
+    if block['feedback']:
+        saveToLog('Recall word stimuli: %s' % recallWordListText_recall.report())
+    list_path = uniq_path(block['paths']['word_order'])
+    recallOrder().to_csv(list_path)
     saveToLog('Recall word presentation order and time data saved to %s' % (list_path))
 
     # gather all relevant data for this trial in a dictionary
@@ -338,6 +405,16 @@ def wordRecall(wordlist, wordlist_type, workbook="wordlists_audio.xlsx"):
     
     return store_out
 
+# Function to run all blocks of the session plan in order, e.g. learning then recall
+def runBlocks(plan):
+    results = []
+    for block in plan['blocks']:
+        if block['task'] == 'learning':
+            results.append(wordLearning(block))
+        else:
+            results.append(wordRecall(block))
+    return pd.concat(results, ignore_index=True)
+
 ### Collect and store metadata about the experiment session ###
 expName = 'Paired associate word learning task'  # define experiment name
 date = time.strftime("%d %b %Y %H:%M:%S", time.localtime())  # get date and time
@@ -346,23 +423,21 @@ metaData = {'participant': '',
             'session time': ['pm-a', 'pm-b', 'am'],
             'practice mode': False,
             'use automated counter-balancing': True,
+            'record frame timing': False,
+            'record whole recall block': False,
+            'trim silence from recordings': False,
             'researcher': 'JW',
             'location': '304, Seddon North, UQ, Brisbane'}  # set up info for infoBox gui
 infoBox = gui.DlgFromDict(dictionary=metaData,
                           title=expName,
                           order=['participant', 'session number', 'session time',
-                                 'practice mode','use automated counter-balancing'])  # display gui to get info from user
+                                 'practice mode','use automated counter-balancing', 'record frame timing', 'record whole recall block', 'trim silence from recordings'])  # display gui to get info from user
 if not infoBox.OK:  # if user hit cancel
     quitExp()  # quit
 
-# check if participant dir exists, and if not, create one:
-if not os.path.isdir('data'):
-    os.mkdir('data')
-if not os.path.isdir('data' + os.path.sep + 'wordlearning'):
-    os.mkdir('data' + os.path.sep + 'wordlearning')
-p_dir = 'data' + os.path.sep + 'wordlearning' + os.path.sep + 'P' + str(metaData['participant'])
-if not os.path.isdir(p_dir):
-    os.mkdir(p_dir)
+import numpy as np
+import pandas as pd
+from task_io_jw import AudioWriter, TaskLog
 
 if not metaData['practice mode']:  # if this is not practice mode:
     if metaData['use automated counter-balancing']:  # AND the user has chosen to use automated counter-balancing
@@ -373,6 +448,7 @@ if not metaData['practice mode']:  # if this is not practice mode:
         metaData.update({'participant allocation': cb['participant allocation']})
         if not infoBox.OK:  # if user hit cancel
             quitExp()  # quit
+        planOptions = {}  # the tasks and word lists come from the counter-balancing schedule
     
     elif not metaData['use automated counter-balancing']: # OR if the user will manually select task and word list
         wl_dict = {'use word list number': ['wordlist_1', 'wordlist_2'],
@@ -384,44 +460,9 @@ if not metaData['practice mode']:  # if this is not practice mode:
                          'task type': '%s' % wl_dict['use task type']})
         if not infoBox.OK:  # if user hit cancel
             quitExp()  # quit
-    
-    # build filename for this participant's data
-    fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '.csv'
-
-    if os.path.exists(fileName):  # check user knows sessions already exist for this participant's current session and time:
-        myDlg = gui.Dlg()
-        myDlg.addText( # inform user that files will be stored under a different name
-            "This participant has existing files for this session time in the directory! Click ok to continue or cancel to abort. \n\n NOTE: if you choose to continue, files will be stored under a different file name.")
-        myDlg.show()  # show dialog and wait for OK or Cancel
-        if not myDlg.OK:  # if the user pressed cancel
-            quitExp()
-        fileName = uniq_path(fileName) # redefine file name by appending a number to prevent overwriting
-
-    metaData.update({'expName': expName, 'date': date})  # record the info in the metaData
-    
-    # check if logfile exists for this participant. If not, create one:
-    logFile = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_" + str(metaData['participant allocation']) +'_log.txt'
-    if not os.path.exists(logFile):
-        with open(logFile, 'w') as fp:
-            pass
-
-    # save metaData to log
-    saveToLog('..........................................', 0)
-    saveToLog('experiment: %s' % (metaData['expName']), 0)
-    saveToLog('researcher: %s' % (metaData['researcher']), 0)
-    saveToLog('location: %s' % (metaData['location']), 0)
-    saveToLog('date: %s' % (metaData['date']), 0)
-    saveToLog('participant: %s' % (metaData['participant']), 0)
-    saveToLog('session: %s' % (metaData['session number']), 0)
-    saveToLog('session time: %s' % (metaData['session time']), 0)
-    saveToLog('participant allocation: %s' % (metaData['participant allocation']), 0)
-
-else:  # if it is practice mode, set up practice log file & ask user to select task type
-    logFile = p_dir + os.path.sep + 'P' + str(metaData['participant']) + '_practice_log.txt'
-    if not os.path.exists(logFile):
-        with open(logFile, 'w') as fp:
-            pass
+        planOptions = {'taskType': wl_dict['use task type'], 'wordlist': wl_dict['use word list number']}
 
+else:  # if it is practice mode, ask user to select task type
     prac_dict = {'use task type': ['word learning', 'word recall']}
     infoBox = gui.DlgFromDict(dictionary=prac_dict,
                               title='Select task type to run experiment')  # display gui to get info from user
@@ -430,32 +471,71 @@ else:  # if it is practice mode, set up practice log file & ask user to select t
                      'task type': '%s' % prac_dict['use task type']})
     if not infoBox.OK:  # if user hit cancel
         quitExp()  # quit
-    
-    # save metaData to log
-    saveToLog('..........................................', 0)
-    saveToLog('experiment: %s' % (expName), 0)
-    saveToLog('researcher: %s' % (metaData['researcher']), 0)
-    saveToLog('location: %s' % (metaData['location']), 0)
-    saveToLog('date: %s' % (date), 0)
-    saveToLog('participant: %s' % (metaData['participant']), 0)
-    saveToLog('session: %s' % (metaData['session number']), 0)
-    saveToLog('session time: %s' % (metaData['session time']), 0)
-    saveToLog('participant allocation: %s' % (metaData['participant allocation']), 0)
+    planOptions = {'taskType': prac_dict['use task type']}
+
+# work out the whole session (tasks, random word order, audio file names and output files) before the window opens,
+# so nothing is read from the word list workbook or looked up during the task
+wordBank = participantWordBank(metaData['participant'], 'wordlists_audio.xlsx') # word lists from the xlsx document (read once and cached), or from the word store (see WORD_STORE in session_plan_jw.py)
+plan = compileWordPlan(metaData, workbook=wordBank, **planOptions)
+makeDirs(plan)  # check if participant dir (and audio dirs) exist, and if not, create them
+
+# is this an existing participant? If so we will create a new file name to store the data under
+if not metaData['practice mode'] and os.path.exists(plan['paths']['data']):  # check user knows sessions already exist for this participant's current session and time:
+    myDlg = gui.Dlg()
+    myDlg.addText( # inform user that files will be stored under a different name
+        "This participant has existing files for this session time in the directory! Click ok to continue or cancel to abort. \n\n NOTE: if you choose to continue, files will be stored under a different file name.")
+    myDlg.show()  # show dialog and wait for OK or Cancel
+    if not myDlg.OK:  # if the user pressed cancel
+        quitExp()
+    plan = compileWordPlan(metaData, dataFile=uniq_path(plan['paths']['data']), workbook=wordBank, **planOptions) # redefine file name by appending a number to prevent overwriting
+fileName = plan['paths']['data']
+
+metaData.update({'expName': expName, 'date': date})  # record the info in the metaData
+
+# check if logfile exists for this participant. If not, create one:
+taskLog = TaskLog(plan['paths']['log'], globalClock)  # open the log file (created if it does not exist)
+audioWriter = AudioWriter(maxQueued=8, onDone=audioSaved, process=analyseRecording)  # recall recordings are analysed and written to their files in a background thread
+
+# save metaData to log
+saveToLog('..........................................', 0)
+saveToLog('experiment: %s' % (metaData['expName']), 0)
+saveToLog('researcher: %s' % (metaData['researcher']), 0)
+saveToLog('location: %s' % (metaData['location']), 0)
+saveToLog('date: %s' % (metaData['date']), 0)
+saveToLog('participant: %s' % (metaData['participant']), 0)
+saveToLog('session: %s' % (metaData['session number']), 0)
+saveToLog('session time: %s' % (metaData['session time']), 0)
+saveToLog('participant allocation: %s' % (metaData['participant allocation']), 0)
     
 ### Prepare stimuli etc ###
+import psychtoolbox
+from psychopy import visual, event
+from psychopy import sound # must import sound after changing sound prefs above
+from task_components_jw import ClickWaiter, FrameScheduler, FrameTimer, StimulusCache
+from voice_onset_jw import StreamingVAD
+
 win = visual.Window(size=(1920, 1080), fullscr=False, screen=0, allowGUI=False, allowStencil=False, ### CHANGE SCREEN SIZE TO MATCH YOUR MONITOR
                     monitor='testMonitor', color=(-1,-1,-1), colorSpace='rgb', units='pix') # setup the Window
 generalText = visual.TextStim(win=win, ori=0, name='generalText', text='', font=u'Arial', pos=[0, 0], height=35,
                               wrapWidth=920, color=(1,1,1), colorSpace='rgb', opacity=1, depth=0.0)  # general text settings
-cueWordListText = visual.TextStim(win=win, ori=0, name='cueWordListText', text='', font=u'Arial', pos=[-250, 0], height=50,
+# the word stimuli are created for each task while its instructions are showing (see StimulusCache in task_components_jw.py)
+cueWordListText = StimulusCache(win=win, ori=0, name='cueWordListText', font=u'Arial', pos=[-250, 0], height=50,
                                wrapWidth=None, color=(1,1,1), colorSpace='rgb', opacity=1, depth=0.0)  # cue word list text settings
-recallWordListText = visual.TextStim(win=win, ori=0, name='recallWordListText', text='', font=u'Arial', pos=[250, 0], height=50,
+recallWordListText = StimulusCache(win=win, ori=0, name='recallWordListText', font=u'Arial', pos=[250, 0], height=50,
                                wrapWidth=None, color=(1,1,1), colorSpace='rgb', opacity=1, depth=0.0)  # recall word list text settings
-cueWordListText_recall = visual.TextStim(win=win, ori=0, name='cueWordListText', text='', font=u'Arial', pos=[0, 0], height=50,
+cueWordListText_recall = StimulusCache(win=win, ori=0, name='cueWordListText', font=u'Arial', pos=[0, 0], height=50,
                                wrapWidth=None, color=(1,1,1), colorSpace='rgb', opacity=1, depth=0.0)  # cue word list text settings
-recallWordListText_recall = visual.TextStim(win=win, ori=0, name='recallWordListText', text='', font=u'Arial', pos=[0, 0], height=50,
+recallWordListText_recall = StimulusCache(win=win, ori=0, name='recallWordListText', font=u'Arial', pos=[0, 0], height=50,
                                wrapWidth=None, color=(-1, -0.215686274509804, -1), colorSpace='rgb', opacity=1, depth=0.0)  # recall word list text settings - set text to darkgreen
 
+# records the time of every word pair presentation, if selected in the first dialogue box
+frameTimer = FrameTimer(win, enabled=metaData['record frame timing'])
+# the word pairs, cue words and feedback are shown for a number of screen refreshes at the measured refresh rate
+scheduler = FrameScheduler(win, flip=frameTimer.flip)
+saveToLog('Refresh rate: %s' % scheduler.report())
+# the recall task waits for each mouse click by sleeping between checks, and detects a click within 5ms of the window receiving it
+clickWaiter = ClickWaiter(win, maxLatency=0.005)
+
 saveToLog('Set up complete') # save info to log
 ### set-up complete ###
 
@@ -463,96 +543,44 @@ saveToLog('Set up complete') # save info to log
 recall_accuracy = 0 # set participant's accuracy score to 0 until redefined after recall task
 task_attempt_number = 1 # set participant's task attempt number to 1 until redefined after multiple attempts
 
-if metaData['practice mode']:  # if user has chosen practice mode
-    if prac_dict['use task type'] == 'word learning':
-        res = wordLearning(wordlist='wordlist_prac', wordlist_type='practice')  # run practice wordlist
-    elif prac_dict['use task type'] == 'word recall':
-        res = wordRecall(wordlist='wordlist_prac', wordlist_type='practice')
-
-elif not metaData['practice mode']: # if it is NOT practice mode
-    if not metaData['use automated counter-balancing']: # and the word list has been manually selected
-        if wl_dict['use word list number'] == 'wordlist_1':
-            man_wordlist_type = 'one'
-        elif wl_dict['use word list number'] == 'wordlist_2':
-            man_wordlist_type = 'two'
-
-        # EITHER run LEARNING task once with word list manually selected
-        if wl_dict['use task type'] == 'word learning':
-            res = wordLearning(wordlist=wl_dict['use word list number'], wordlist_type=man_wordlist_type)
-        
-        # OR run word RECALL task once with word list manually selected
-        elif wl_dict['use task type'] == 'word recall':
-            res = wordRecall(wordlist=wl_dict['use word list number'], wordlist_type=man_wordlist_type) 
-
-    # OR if automated counter balancing selected:
-    elif metaData['use automated counter-balancing']: 
-        while recall_accuracy == 0: # while the participant's score is less than 30%:
-            
-            ####### X ORDER
-            if ((metaData['participant allocation'] == 'AJX') or (metaData['participant allocation'] == 'BJX') or (metaData['participant allocation'] == 'AKX') or (metaData['participant allocation'] == 'BKX')):
-                # session 1
-                if int(metaData['session number']) == 1:
-                    if metaData['session time'] == 'pm-a':
-                        res1 = wordLearning(wordlist='wordlist_1', wordlist_type='one')  # wordlist 1
-                        res2 = wordRecall(wordlist='wordlist_1', wordlist_type='one') # wordlist 1
-                        res = res1.append(res2, ignore_index=True)
-                    elif metaData['session time'] == 'pm-b' or 'am':
-                        res = wordRecall(wordlist='wordlist_1', wordlist_type='one') # wordlist 1
-                # session 2
-                elif int(metaData['session number']) == 2:
-                    if metaData['session time'] == 'pm-a':
-                        res1 = wordLearning(wordlist='wordlist_2', wordlist_type='two')  # wordlist 2
-                        res2 = wordRecall(wordlist='wordlist_2', wordlist_type='two') # wordlist 2
-                        res = res1.append(res2, ignore_index=True)
-                    elif metaData['session time'] == 'pm-b' or 'am':
-                        res = wordRecall(wordlist='wordlist_2', wordlist_type='two') # wordlist 2
-
-            ####### Y ORDER
-            elif ((metaData['participant allocation'] == 'AJY') or (metaData['participant allocation'] == 'BJY') or (metaData['participant allocation'] == 'AKY') or (metaData['participant allocation'] == 'BKY')):
-                # session 1
-                if int(metaData['session number']) == 1:
-                    if metaData['session time'] == 'pm-a':
-                        res1 = wordLearning(wordlist='wordlist_2', wordlist_type='two')  # wordlist 2
-                        res2 = wordRecall(wordlist='wordlist_2', wordlist_type='two') # wordlist 2
-                        res = res1.append(res2, ignore_index=True)
-                    elif metaData['session time'] == 'pm-b' or 'am':
-                        res = wordRecall(wordlist='wordlist_2', wordlist_type='two') # wordlist 2
-                # session 2
-                elif int(metaData['session number']) == 2:
-                    if metaData['session time'] == 'pm-a':
-                        res1 = wordLearning(wordlist='wordlist_1', wordlist_type='one')  # wordlist 1
-                        res2 = wordRecall(wordlist='wordlist_1', wordlist_type='one') # wordlist 1
-                        res = res1.append(res2, ignore_index=True)
-                    elif metaData['session time'] == 'pm-b' or 'am':
-                        res = wordRecall(wordlist='wordlist_1', wordlist_type='one') # wordlist 1
-
-            # ask user if at least 30% accuracy achieved:
-            myDlg = gui.Dlg(title='Recall accuracy check')
-            myDlg.addText('Did the participant achieve at least 30% accuracy?')
-            myDlg.addField('answer', choices=['no', 'yes'])
-            myDlg.addText('NOTE: if this is a recall session only (pm-b or am), select YES to exit and record final result')
-            acc_dat = myDlg.show() # show dialogue box gui
-            if not myDlg.OK: # if user hit cancel
-                quitExp() # quit
-
-            if acc_dat[0] == 'no': # if the user selects NO, re-run the appropriate learning tasks
-                task_attempt_number = task_attempt_number + 1
-                recall_accuracy = 0
-            elif acc_dat[0] == 'yes': # if >30% accuracy achieved, exit the loop
-                res['pc30_trial_num'] = task_attempt_number # save task attempt number where participant achieved >30% in csv and logfile
-                if metaData['session time'] == 'pm-a':
-                    saveToLog('At least 30 percent recall accuracy achieved on attempt number %s' % (task_attempt_number), 0) 
-                elif metaData['session time'] == 'pm-b' or 'am':
-                    saveToLog('Single trial of word recall task completed with no accuracy feedback provided', 0)
-                recall_accuracy = 1
-                break
-
-            # include option to quit, in case of looping error
-            if event.getKeys(['end']): 
-                quitExp()
+if metaData['practice mode'] or not metaData['use automated counter-balancing']:  # practice mode, or task and word list manually selected
+    res = runBlocks(plan)  # run the task once
+
+# OR if automated counter balancing selected:
+elif metaData['use automated counter-balancing']: 
+    while recall_accuracy == 0: # while the participant's score is less than 30%:
+        if task_attempt_number > 1: # each attempt presents the word pairs in a new random order
+            plan = shuffleWords(plan, wordBank)
+        res = runBlocks(plan)  # the tasks and word lists of this session (see WORD_SCHEDULE in session_plan_jw.py)
+
+        # ask user if at least 30% accuracy achieved:
+        myDlg = gui.Dlg(title='Recall accuracy check')
+        myDlg.addText('Did the participant achieve at least 30% accuracy?')
+        myDlg.addField('answer', choices=['no', 'yes'])
+        myDlg.addText('NOTE: if this is a recall session only (pm-b or am), select YES to exit and record final result')
+        acc_dat = myDlg.show() # show dialogue box gui
+        if not myDlg.OK: # if user hit cancel
+            quitExp() # quit
+
+        if acc_dat[0] == 'no': # if the user selects NO, re-run the appropriate learning tasks
+            task_attempt_number = task_attempt_number + 1
+            recall_accuracy = 0
+        elif acc_dat[0] == 'yes': # if >30% accuracy achieved, exit the loop
+            res['pc30_trial_num'] = task_attempt_number # save task attempt number where participant achieved >30% in csv and logfile
+            if metaData['session time'] == 'pm-a':
+                saveToLog('At least 30 percent recall accuracy achieved on attempt number %s' % (task_attempt_number), 0) 
+            else:
+                saveToLog('Single trial of word recall task completed with no accuracy feedback provided', 0)
+            recall_accuracy = 1
+            break
+
+        # include option to quit, in case of looping error
+        if event.getKeys(['end']): 
+            quitExp()
 
 
 ## End screen ##
+taskLog.setPhase('end')
 saveToLog('Presenting end screen')  # save info to log
 win.setColor('#000000', colorSpace='hex')  # set background colour to black
 win.flip()
@@ -587,7 +615,7 @@ while True:
         myDlg.addText("Unable to store data. Try closing open excel files and then click ok. Press cancel to attempt data storage to new file.")
         myDlg.show()  # show dialog and wait for OK or Cancel
         if not myDlg.OK:  # if the user pressed cancel
-            fileName = p_dir + os.path.sep + 'P' + str(metaData['participant']) + "_ProblemSaving_" + str(metaData['participant allocation']) + '_S' + str(metaData['session number']) + '_' + str(metaData['session time']) + '.csv'
+            fileName = plan['paths']['problem']
             saveToLog('Attempting to save data with different filename: %s' %fileName) # save info to log
             try:
                 res.to_csv(fileName)
@@ -598,9 +626,16 @@ while True:
                 saveToLog('Major error: Data could not be saved') # save info to log
                 quitExp() # quit the experiment
 
+if frameTimer.enabled:  # save the frame timing summary (one row for each set of word pairs)
+    timingFileName = uniq_path(plan['paths']['frame_timing'])
+    frameTimer.save(timingFileName)
+    saveToLog('Frame timing saved with file name: %s' % timingFileName) # save info to log
+
 t = globalClock.getTime() # get run time of experiment
 saveToLog('Total experiment runtime was %i seconds' % t) # record runtime to log
 saveToLog('..........................................', 0)
+audioWriter.close()
+taskLog.close()  # make sure everything is written to the log file
 
 # Shut down:
 core.quit()